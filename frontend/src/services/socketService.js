@@ -6,6 +6,7 @@ import { socketio_port } from '../../../../../sites/common_site_config.json'
 let socket = null; // Єдиний екземпляр сокету
 const connected = ref(false);
 const currentOfficeIdForRoom = ref(null); // Зберігаємо ID офісу для поточної кімнати
+const lastSeq = ref(null); // Номер останньої обробленої події кімнати офісу (поле `seq`)
 const office_room = (office_name) => "qms_office:" + office_name;
 // Функція для отримання URL сокет-сервера
 function getSocketUrl() {
@@ -117,9 +118,7 @@ export function useSocket() {
 
         // Загальний обробник для всіх подій (корисно для дебагу)
         socket.onAny((eventName, ...args) => {
-            if (eventName !== 'display_board_pong_ack') { // Щоб не засмічувати консоль понгами, якщо вони часті
-                console.log(`[SocketService DEBUG] Event received - Name: '${eventName}', Args:`, args);
-            }
+            console.log(`[SocketService DEBUG] Event received - Name: '${eventName}', Args:`, args);
         });
 
 
@@ -154,6 +153,25 @@ export function useSocket() {
         }
     };
 
+    // Базовий номер події з відповіді API (get_display_data / get_live_data)
+    const setBaselineSeq = (seq) => {
+        lastSeq.value = typeof seq === 'number' ? seq : null;
+    };
+
+    // Перевіряє `seq` події офісу. Повертає false для вже врахованих (застарілих) подій.
+    // Якщо між подіями є пропуск - викликає onGap, щоб клієнт перезавантажив дані.
+    const checkSequence = (message, onGap) => {
+        if (!message || typeof message.seq !== 'number') return true;
+        if (lastSeq.value !== null && message.seq <= lastSeq.value) return false;
+        const hasGap = lastSeq.value !== null && message.seq > lastSeq.value + 1;
+        lastSeq.value = message.seq;
+        if (hasGap) {
+            console.warn(`[SocketService] Sequence gap detected (got ${message.seq}). Resyncing.`);
+            if (onGap) onGap();
+        }
+        return true;
+    };
+
     const disconnectSocket = () => {
         if (socket) {
             if (currentOfficeIdForRoom.value) {
@@ -168,6 +186,7 @@ export function useSocket() {
         // Скидання стану після відключення
         connected.value = false;
         currentOfficeIdForRoom.value = null;
+        lastSeq.value = null;
     };
 
     return {
@@ -178,6 +197,8 @@ export function useSocket() {
         listen,
         off, // Додано функцію відписки
         emitEvent, // Використовуйте цю функцію для надсилання подій
-        disconnectSocket
+        disconnectSocket,
+        setBaselineSeq,
+        checkSequence
     };
 }
\ No newline at end of file
@@ -1,27 +1,43 @@
+import base64
+
 import frappe
 from frappe import _
-from frappe.utils import get_datetime, get_system_timezone, get_time, now_datetime, cint, today, now
-from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from frappe.utils import get_datetime, get_system_timezone, now_datetime, cint, today, now
 from datetime import datetime
+from werkzeug.wrappers import Response
 
+from qms_cherga.qms_cherga.doctype.qms_schedule.qms_schedule import (
+    get_compiled_schedule, get_intervals_for_date, is_open_at, resolve_timezone, seconds_to_time
+)
+from qms_cherga.qms_cherga.doctype.qms_service_time_summary.qms_service_time_summary import (
+    HISTOGRAM_FIELDS, summarize as summarize_service_times
+)
+from qms_cherga.qms_cherga.doctype.qms_slot_reservation.qms_slot_reservation import (
+    get_reserved_seats, get_slot_capacity, reserve_seat
+)
+from qms_cherga.qms_cherga.doctype.qms_ticket_hourly_summary.qms_ticket_hourly_summary import (
+    GROUP_BY_FIELDS as ANALYTICS_GROUP_BY_FIELDS, get_report as get_analytics_report
+)
+from qms_cherga.utils import (
+    board_registry, display_snapshot, kiosk_bootstrap, live_queue, live_stats, metrics, operator_profile, slots,
+    ticket_print
+)
+from qms_cherga.utils.bulk_transitions import BULK_TARGET_STATUSES, OPEN_STATUSES, bulk_transition
+from qms_cherga.utils.metrics import instrumented
+from qms_cherga.utils.office_context import get_office_context
+from qms_cherga.utils.rate_limit import rate_limited
+from qms_cherga.utils.realtime import current_sequence
 from qms_cherga.utils.response import error_response, info_response, success_response
 
 # Додайте ці імпорти на початку файлу api.py, якщо їх немає
 from frappe.utils import (
-    get_datetime, get_system_timezone, get_time, now_datetime, cint, today, now, get_date_str
+    get_datetime, get_system_timezone, now_datetime, cint, today, now, get_date_str
 )
-from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from datetime import timedelta, datetime
 
 
-def office_room(office_id: str):
-    """
-    Генерує ім'я кімнати для WebSocket на основі ID офісу.
-    """
-    return f'qms_office:{office_id}'
-
-
 @frappe.whitelist()
+@instrumented()
 def get_operator_dashboard_data():
     """
     Отримує всі початкові дані для панелі керування оператора.
@@ -30,45 +46,35 @@ def get_operator_dashboard_data():
     if user == "Guest":
         return error_response(_("Authentication required."), http_status_code=401)
 
-    try:
-        operator = frappe.get_doc(
-            "QMS Operator", {"user": user, "is_active": 1})
-    except frappe.DoesNotExistError:
+    # Кешований профіль оператора (utils/operator_profile.py)
+    operator = operator_profile.get_profile(user)
+    if not operator:
         return error_response(_("Active QMS Operator record not found for user {0}.").format(user), error_code="OPERATOR_NOT_FOUND", http_status_code=404)
 
     try:
-        office_id = operator.default_office
+        office_id = operator["office"]
 
         # Інформація про оператора та його офіс
         operator_info = {
-            "name": operator.name,
-            "full_name": operator.full_name,
-            "user": operator.user,
+            "name": operator["name"],
+            "full_name": operator["full_name"],
+            "user": operator["user"],
             "office": office_id,
-            "office_name": frappe.db.get_value("QMS Office", office_id, "office_name")
+            "office_name": operator["office_name"]
         }
 
         # Доступні оператору точки обслуговування (Service Points)
-        service_points = frappe.get_all("QMS Service Point",
-                                        filters={"office": office_id,
-                                                 "is_active": 1},
-                                        fields=["name", "point_name"],
-                                        order_by="point_name"
-                                        )
+        service_points = operator["service_points"]
 
         # Поточний активний талон оператора (якщо є)
         active_ticket = frappe.get_all("QMS Ticket",
                                        filters={"operator": user, "status": [
                                            "in", ["Called", "Serving"]]},
-                                       fields=["name", "ticket_number", "service", "status",
+                                       fields=["name", "ticket_number", "service", "service_name", "status",
                                                "issue_time", "call_time", "start_service_time", "visitor_name", "visitor_phone"],
                                        limit=1
                                        )
-        active_ticket_doc = None
-        if active_ticket:
-            active_ticket_doc = active_ticket[0]
-            active_ticket_doc['service_name'] = frappe.db.get_value(
-                "QMS Service", active_ticket_doc.service, "service_name")
+        active_ticket_doc = active_ticket[0] if active_ticket else None
 
         # ОТРИМАННЯ СТАТИСТИКИ ТА ВІДКЛАДЕНИХ ТАЛОНІВ
         live_data = get_live_data(office=office_id, as_dict=True)
@@ -78,7 +84,8 @@ def get_operator_dashboard_data():
             "service_points": service_points,
             "active_ticket": active_ticket_doc,
             "queue_stats": live_data.get("stats"),
-            "postponed_tickets": live_data.get("postponed_tickets")
+            "postponed_tickets": live_data.get("postponed_tickets"),
+            "seq": live_data.get("seq")
         })
 
     except Exception as e:
@@ -88,37 +95,45 @@ def get_operator_dashboard_data():
 
 
 @frappe.whitelist()
+@instrumented()
+def get_operator_profile_cache_stats():
+    """Лічильники влучань/промахів кешу профілів операторів (utils/operator_profile.py)."""
+    if "System Manager" not in frappe.get_roles():
+        return error_response(_("Permission denied."), http_status_code=403)
+    return success_response(data=operator_profile.get_cache_stats())
+
+
+@frappe.whitelist(allow_guest=True)
+def get_metrics(token: str | None = None):
+    """
+    Метрики API та хуків QMS Ticket у текстовому форматі Prometheus (utils/metrics.py).
+    Доступ: System Manager або токен qms_metrics_token зі site_config.
+    """
+    if not metrics.has_export_access(token):
+        return error_response(_("Permission denied."), http_status_code=403)
+    return Response(metrics.render_prometheus(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+
+@frappe.whitelist()
+@instrumented()
 def get_live_data(office: str, as_dict: bool = False):
     """
     Отримує "живі" дані для панелі оператора: статистику та відкладені талони.
     """
-    if not frappe.db.exists("QMS Office", office):
+    # Кешований контекст офісу: перевірка існування без запиту до БД
+    if not get_office_context(office):
         response = error_response(_("Office not found"), http_status_code=404)
         return response if not as_dict else {}
 
     try:
-        # Статистика черги для офісу
-        stats = {
-            "waiting": frappe.db.count("QMS Ticket", {"office": office, "status": "Waiting"}),
-            "serving": frappe.db.count("QMS Ticket", {"office": office, "status": "Serving"}),
-            "finished_today": frappe.db.count("QMS Ticket", {"office": office, "status": ["in", ["Completed", "NoShow"]], "completion_time": [">=", today()]})
-        }
-
-        # Список відкладених талонів
-        postponed_tickets = frappe.get_all("QMS Ticket",
-                                           filters={"office": office,
-                                                    "status": "Postponed"},
-                                           fields=[
-                                               "name", "ticket_number", "service"],
-                                           order_by="modified desc"
-                                           )
-        for ticket in postponed_tickets:
-            ticket['service_name'] = frappe.db.get_value(
-                "QMS Service", ticket.service, "service_name")
+        seq = current_sequence(office)
+        # Статистика черги та відкладені талони (utils/live_stats.py)
+        live_data = live_stats.get_live_stats(office)
 
         data_to_return = {
-            "stats": stats,
-            "postponed_tickets": postponed_tickets
+            "stats": live_data["stats"],
+            "postponed_tickets": live_data["postponed_tickets"],
+            "seq": seq
         }
 
         return success_response(data=data_to_return) if not as_dict else data_to_return
@@ -131,6 +146,59 @@ def get_live_data(office: str, as_dict: bool = False):
         return response if not as_dict else {}
 
 
+@frappe.whitelist()
+@instrumented()
+def get_service_time_stats(office: str, date: str | None = None):
+    """
+    Статистика часу очікування та обслуговування по послугах офісу за день
+    з накопичувальних агрегатів (QMS Service Time Summary) - без сканування талонів.
+    """
+    if not get_office_context(office):
+        return error_response(_("Office not found"), http_status_code=404)
+
+    rows = frappe.get_all(
+        "QMS Service Time Summary",
+        filters={"office": office, "date": date or today()},
+        fields=["service", "metric", "sample_count", "total_mins", "total_squares", *HISTOGRAM_FIELDS],
+    )
+    stats = {}
+    for row in rows:
+        stats.setdefault(row.service, {})[row.metric.lower()] = summarize_service_times(row)
+    return success_response(data={"office": office, "date": date or today(), "services": stats})
+
+
+@frappe.whitelist()
+@instrumented()
+def get_ticket_analytics(from_date: str, to_date: str | None = None, group_by: str = "office",
+                         office: str | None = None, service: str | None = None, operator: str | None = None):
+    """
+    Звіт з погодинних агрегатів (QMS Ticket Hourly Summary): кількість талонів,
+    середні та p50/p90 очікування й обслуговування за діапазон дат.
+    group_by - поля через кому: office, service, operator, date, hour, hour_of_day.
+    """
+    if not frappe.has_permission("QMS Ticket Hourly Summary", "read"):
+        return error_response(_("Permission denied."), http_status_code=403)
+
+    fields = [field.strip() for field in (group_by or "").split(",") if field.strip()]
+    invalid = [field for field in fields if field not in ANALYTICS_GROUP_BY_FIELDS]
+    if invalid:
+        return error_response(_("Unsupported group_by fields: {0}. Allowed: {1}.").format(
+            ", ".join(invalid), ", ".join(ANALYTICS_GROUP_BY_FIELDS)), error_code="INVALID_GROUP_BY", http_status_code=400)
+
+    try:
+        rows = get_analytics_report(from_date, to_date, fields, office=office, service=service, operator=operator)
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "Get Ticket Analytics API Error")
+        return error_response(_("An unexpected error occurred while building the report."), details=str(e), http_status_code=500)
+
+    return success_response(data={
+        "from_date": from_date,
+        "to_date": to_date or from_date,
+        "group_by": fields,
+        "rows": rows,
+    })
+
+
 def _update_ticket_status(ticket_name, target_status, user, extra_data=None):
     """Внутрішня функція для зміни статусу талону."""
     try:
@@ -159,30 +227,35 @@ def _update_ticket_status(ticket_name, target_status, user, extra_data=None):
 
 
 @frappe.whitelist()
+@instrumented()
 def start_service(ticket_name: str):
     """Переводить талон у статус 'Serving'."""
     return _update_ticket_status(ticket_name, "Serving", frappe.session.user, {"start_service_time": now_datetime()})
 
 
 @frappe.whitelist()
+@instrumented()
 def finish_service(ticket_name: str):
     """Переводить талон у статус 'Completed'."""
     return _update_ticket_status(ticket_name, "Completed", frappe.session.user, {"completion_time": now_datetime()})
 
 
 @frappe.whitelist()
+@instrumented()
 def mark_as_no_show(ticket_name: str):
     """Переводить талон у статус 'NoShow'."""
     return _update_ticket_status(ticket_name, "NoShow", frappe.session.user, {"completion_time": now_datetime()})
 
 
 @frappe.whitelist()
+@instrumented()
 def postpone_ticket(ticket_name: str):
     """Переводить талон у статус 'Postponed'."""
     return _update_ticket_status(ticket_name, "Postponed", frappe.session.user)
 
 
 @frappe.whitelist()
+@instrumented()
 def recall_ticket(ticket_name: str, service_point: str):
     """Повторно викликає відкладений талон."""
     if not service_point:
@@ -199,39 +272,111 @@ def recall_ticket(ticket_name: str, service_point: str):
     })
 
 
+@frappe.whitelist()
+@instrumented()
+def bulk_update_tickets(office: str, target_status: str, statuses=None, tickets=None):
+    """
+    Масово переводить талони офісу в 'Cancelled' або 'NoShow' (напр. при закритті офісу).
+    Оновлення виконуються пачками UPDATE, після коміту - одна подія на офіс.
+
+    :param statuses: JSON-список вихідних статусів (за замовчуванням - Waiting, Called, Postponed;
+        'Serving' - лише якщо вказано явно).
+    :param tickets: JSON-список талонів (за замовчуванням - усі талони офісу).
+    """
+    if not frappe.has_permission("QMS Ticket", "write"):
+        return error_response(_("Permission denied."), http_status_code=403)
+    if not get_office_context(office):
+        return error_response(_("Office not found"), http_status_code=404)
+    if target_status not in BULK_TARGET_STATUSES:
+        return error_response(_("Target status must be one of: {0}.").format(", ".join(BULK_TARGET_STATUSES)), error_code="INVALID_TARGET_STATUS", http_status_code=400)
+
+    try:
+        changed = bulk_transition(
+            office,
+            target_status,
+            from_statuses=frappe.parse_json(statuses) if statuses else OPEN_STATUSES,
+            ticket_names=frappe.parse_json(tickets) if tickets else None,
+        )
+        frappe.db.commit()
+        return success_response(data={"office": office, "status": target_status, "count": changed})
+
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(),
+                         f"Bulk Update Tickets API Error for Office {office}")
+        return error_response(_("An unexpected error occurred while updating tickets."), details=str(e), http_status_code=500)
+
+
+@frappe.whitelist(allow_guest=True)
+@instrumented()
+@rate_limited()
+def display_board_heartbeat(office_id: str, board_id: str | None = None, client_timestamp: str | None = None):
+    """
+    Сигнал живості табло: запис у реєстр (utils/board_registry.py) і час сервера
+    одразу у відповіді, без публікації через WebSocket.
+    """
+    return _record_board_heartbeat(office_id, board_id, client_timestamp)
+
+
 @frappe.whitelist(allow_guest=True)
-def ping_display_board(office_id: str, client_timestamp: str):
+@instrumented()
+@rate_limited()
+def ping_display_board(office_id: str, client_timestamp: str, board_id: str | None = None):
+    """Застарілий виклик табло попередніх версій; відповідає так само, як display_board_heartbeat."""
+    return _record_board_heartbeat(office_id, board_id, client_timestamp)
+
+
+def _record_board_heartbeat(office_id: str, board_id: str | None, client_timestamp: str | None):
     if not office_id:
-        return error_response(_("Office ID is required for ping."), http_status_code=400)
+        return error_response(_("Office ID is required for heartbeat."), http_status_code=400)
+    board_id = board_id or getattr(frappe.local, "request_ip", None) or "unknown"
+    if not board_registry.is_valid_board_id(board_id):
+        return error_response(_("Invalid board ID."), error_code="INVALID_BOARD_ID", http_status_code=400)
+    if not get_office_context(office_id):
+        return error_response(_("Office '{0}' not found.").format(office_id), http_status_code=404)
     try:
-        message_to_send = {
-            'status': 'ok',
-            'office_id': office_id,
-            'server_time': now(),
-            'client_timestamp_received': client_timestamp
-        }
-        frappe.publish_realtime(
-            event='display_board_pong_ack',
-            message=message_to_send,
-            after_commit=True
-        )
-        return success_response(message="Pong will be sent via WebSocket.")
+        if board_registry.record_heartbeat(office_id, board_id, client_timestamp) is None:
+            return error_response(_("Too many display boards registered for office '{0}'.").format(office_id),
+                                  error_code="BOARD_LIMIT_REACHED", http_status_code=409)
+        return success_response(data={
+            "office_id": office_id,
+            "server_time": now(),
+            "client_timestamp_received": client_timestamp,
+            "heartbeat_interval_sec": board_registry.HEARTBEAT_INTERVAL_SEC,
+        })
     except Exception as e:
-        frappe.log_error(
-            f"Failed to publish pong for office {office_id}: {e}", "QMS Ping Error")
-        return error_response(message=_("Ping received, but pong dispatch via WebSocket failed."), details=str(e), http_status_code=500)
+        frappe.log_error(frappe.get_traceback(), f"QMS Display Board Heartbeat Error for Office {office_id}")
+        return error_response(_("Failed to record display board heartbeat."), details=str(e), http_status_code=500)
+
+
+@frappe.whitelist()
+@instrumented()
+def get_display_board_status(office: str | None = None):
+    """Табло online/stale/offline за офісами з реєстру сигналів (одне читання Redis)."""
+    if not {"System Manager", "QMS Manager"} & set(frappe.get_roles()):
+        return error_response(_("Permission denied."), http_status_code=403)
+    return success_response(data={
+        "offices": board_registry.get_boards(office),
+        "online_within_sec": board_registry.ONLINE_WITHIN_SEC,
+        "stale_within_sec": board_registry.STALE_WITHIN_SEC,
+    })
 
 
 @frappe.whitelist(allow_guest=True)
+@instrumented()
 def get_office_info(office: str):
     if not office:
         return error_response(_("Office ID is required."), http_status_code=400)
     try:
-        office_data = frappe.db.get_value("QMS Office", office, [
-                                          "office_name", "timezone", "address", "contact_phone"], as_dict=True)
-        if not office_data:
+        office_ctx = get_office_context(office)
+        if not office_ctx:
             return error_response(_("Office '{0}' not found.").format(office), http_status_code=404)
-        return success_response(data=office_data)
+        return success_response(data={
+            "office_name": office_ctx.office_name,
+            "timezone": office_ctx.timezone,
+            "address": office_ctx.address,
+            "contact_phone": office_ctx.contact_phone
+        })
     except Exception as e:
         frappe.log_error(frappe.get_traceback(),
                          f"Get Office Info API Error for Office {office}")
@@ -250,290 +395,137 @@ def get_office_info(office: str):
 
 
 @frappe.whitelist(allow_guest=True)
+@instrumented()
 def get_available_appointment_slots(service: str, office: str, date: str):
     """
-    Отримує список доступних часових слотів для попереднього запису.
-    (З доданими print для діагностики)
+    Отримує список доступних часових слотів для попереднього запису на одну дату.
+    Обгортка над get_appointment_availability з діапазоном в один день.
+    """
+    if not service or not office or not date:
+        return error_response(_("Service, Office, and Date are required."), error_code="MISSING_PARAMS", http_status_code=400)
+
+    response = get_appointment_availability(service, office, date, days=1)
+    if response.get("status") != "success":
+        return response
+
+    day = response["data"]["days"][0]
+    if day["status"] == "past":
+        return info_response(_("Cannot book appointments for past dates."), data={"slots": [], "is_available": False})
+    if day["status"] == "closed":
+        return info_response(_("Office is closed on {0}.").format(day["date"]), data={"slots": [], "is_available": False})
+    return success_response(data={"slots": day["slots"], "is_available": day["is_available"]})
+
+
+@frappe.whitelist(allow_guest=True)
+@instrumented()
+def get_appointment_availability(service: str, office: str, from_date: str, days: int = 7):
+    """
+    Доступні слоти попереднього запису на діапазон дат (до 60 днів) одним викликом.
+    Сітка слотів будується рушієм utils/slots.py; зайняті слоти читаються одним запитом.
+
+    :return: {"slot_duration_mins": int, "days": [{"date", "status", "slots", "is_available"}]},
+             де status - "open", "closed" (неробочий день) або "past".
     """
-    # Додаємо ліміт ітерацій для циклу while, щоб запобігти нескінченному виконанню
-    # Обмеження на кількість слотів в одному робочому інтервалі
-    MAX_SLOT_ITERATIONS_PER_INTERVAL = 1000
     try:
         # --- Валідація ---
-        if not service or not office or not date:
-            print("DEBUG: Validation failed: Missing parameters.")
+        if not service or not office or not from_date:
             return error_response(_("Service, Office, and Date are required."), error_code="MISSING_PARAMS", http_status_code=400)
 
-        if not frappe.db.exists("QMS Service", service):
-            print(f"DEBUG: Validation failed: Service '{service}' not found.")
-            return error_response(_("Service '{0}' not found.").format(service), error_code="INVALID_SERVICE", http_status_code=404)
-        if not frappe.db.exists("QMS Office", office):
-            print(f"DEBUG: Validation failed: Office '{office}' not found.")
-            return error_response(_("Office '{0}' not found.").format(office), error_code="INVALID_OFFICE", http_status_code=404)
+        days = cint(days)
+        if not 1 <= days <= slots.MAX_RANGE_DAYS:
+            return error_response(_("Days must be between 1 and {0}.").format(slots.MAX_RANGE_DAYS), error_code="INVALID_RANGE", http_status_code=400)
 
-        # Валідація дати
         try:
-            # Використовуємо datetime.fromisoformat для стандарту YYYY-MM-DD
-            target_date = datetime.fromisoformat(date).date()
-            print(f"DEBUG: Parsed target_date: {target_date}")
+            start_date = datetime.fromisoformat(from_date).date()
         except ValueError:
-            print(f"DEBUG: Validation failed: Invalid date format '{date}'.")
             return error_response(_("Invalid date format provided. Use YYYY-MM-DD."), error_code="INVALID_DATE_FORMAT", http_status_code=400)
 
-        # Перевірка часової зони та дати відносно поточної
-        office_doc = frappe.get_cached_doc("QMS Office", office)
-        office_tz_str = office_doc.timezone or get_system_timezone()
-        print(f"DEBUG: Office timezone string: '{office_tz_str}'")
         try:
-            office_tz = ZoneInfo(office_tz_str)
-            now_in_office_tz = datetime.now(office_tz).date()
-            print(
-                f"DEBUG: Current date in office timezone ({office_tz_str}): {now_in_office_tz}")
-            if target_date < now_in_office_tz:
-                print("DEBUG: Target date is in the past.")
-                return info_response(_("Cannot book appointments for past dates."), data={"slots": [], "is_available": False})
-        except ZoneInfoNotFoundError:
-            print(
-                f"DEBUG: Validation failed: Invalid timezone '{office_tz_str}'.")
-            return error_response(_("Invalid office timezone configured: {0}").format(office_tz_str), error_code="INVALID_TIMEZONE", http_status_code=500)
-
-        print("DEBUG: Initial validation passed.")
-
-        # --- Отримання налаштувань ---
-        service_doc = frappe.get_cached_doc("QMS Service", service)
-        avg_duration_mins = service_doc.avg_duration_mins or 15
-        slot_duration = timedelta(minutes=avg_duration_mins)
-        print(
-            f"DEBUG: Service '{service}' found. Slot duration: {avg_duration_mins} mins.")
-
-        schedule_name = office_doc.schedule or frappe.db.get_value(
-            "QMS Organization", office_doc.organization, "default_schedule")
-        if not schedule_name:
-            print(
-                f"DEBUG: Configuration error: No schedule found for office '{office}'.")
-            return error_response(_("Working schedule not configured for office '{0}'.").format(office_doc.office_name), error_code="NO_SCHEDULE", http_status_code=500)
-        print(f"DEBUG: Using schedule '{schedule_name}'.")
-
-        # --- Визначення робочих інтервалів на задану дату ---
-        print(
-            f"DEBUG: Calling get_working_intervals_for_date for date: {target_date}, schedule: {schedule_name}")
-        working_intervals = get_working_intervals_for_date(
-            schedule_name, target_date, office_tz_str)
-        print(f"DEBUG: Received working_intervals: {working_intervals}")
-
-        if not working_intervals:
-            print("DEBUG: No working intervals found for the date. Returning closed.")
-            return info_response(_("Office is closed on {0}.").format(get_date_str(target_date)), data={"slots": [], "is_available": False})
-
-        # --- Отримання існуючих записів ---
-        print("DEBUG: Fetching existing appointments...")
-        existing_appointments = frappe.get_all(
-            "QMS Ticket",
-            filters={
-                "office": office,
-                "service": service,
-                "is_appointment": 1,
-                "status": ["!=", "Cancelled"],
-                "appointment_datetime": ["between", (f"{date} 00:00:00", f"{date} 23:59:59")]
-            },
-            fields=["appointment_datetime"]
-        )
-        booked_slots = {get_datetime(appt.appointment_datetime).astimezone(office_tz).time()  # Конвертуємо в зону офісу перед отриманням часу
-                        for appt in existing_appointments if appt.appointment_datetime}
-        print(
-            f"DEBUG: Found {len(existing_appointments)} existing appointments. Booked time slots (in office TZ): {booked_slots}")
-
-        # --- Генерація доступних слотів ---
-        available_slots = []
-        now_time_office = datetime.now(office_tz).time()
-        print(f"DEBUG: Current time in office timezone: {now_time_office}")
-        print(f"DEBUG: Starting slot generation loop...")
-
-        interval_index = 0
-        for start_work, end_work in working_intervals:
-            interval_index += 1
-            print(
-                f"DEBUG: Processing interval #{interval_index}: Start={start_work}, End={end_work}")
-            current_slot_time = start_work
-            iteration_count = 0  # Лічильник для циклу while
-
-            while current_slot_time < end_work:
-                iteration_count += 1
-                # Перевірка на перевищення ліміту ітерацій
-                if iteration_count > MAX_SLOT_ITERATIONS_PER_INTERVAL:
-                    print(
-                        f"DEBUG: ERROR - Exceeded MAX_SLOT_ITERATIONS_PER_INTERVAL ({MAX_SLOT_ITERATIONS_PER_INTERVAL}) for interval {interval_index}. Breaking loop.")
-                    # Можна повернути помилку або просто зупинити генерацію для цього інтервалу
-                    # return error_response("Slot generation limit exceeded.", http_status_code=500)
-                    break  # Виходимо з циклу while для цього інтервалу
-
-                # Виводимо кожну N-у ітерацію або якщо є потенційна проблема
-                if iteration_count % 50 == 0 or iteration_count > MAX_SLOT_ITERATIONS_PER_INTERVAL - 5:
-                    print(
-                        f"DEBUG: Interval #{interval_index}, Iteration #{iteration_count}: current_slot_time={current_slot_time}, end_work={end_work}")
-
-                # Перевірка, чи слот не зайнятий
-                is_booked = current_slot_time in booked_slots
-                # Перевірка, чи слот не в минулому
-                is_past = target_date == now_in_office_tz and current_slot_time < now_time_office
-
-                if not is_booked and not is_past:
-                    # Додаємо слот
-                    slot_dt_naive = datetime.combine(
-                        target_date, current_slot_time)
-                    slot_dt_aware = slot_dt_naive.replace(tzinfo=office_tz)
-                    available_slots.append({
-                        "time": current_slot_time.strftime("%H:%M"),
-                        "datetime": slot_dt_aware.strftime("%Y-%m-%d %H:%M:%S")
-                    })
-                    # print(f"DEBUG: Added slot: {current_slot_time.strftime('%H:%M')}")
-                # else:
-                    # print(f"DEBUG: Skipped slot: {current_slot_time.strftime('%H:%M')} (Booked: {is_booked}, Past: {is_past})")
-
-                # --- Перехід до наступного слоту ---
-                # Важливо: Використовуємо datetime для додавання timedelta
-                current_dt_naive = datetime.combine(
-                    target_date, current_slot_time)
-                # Перевірка на нульову тривалість, щоб уникнути нескінченного циклу
-                if slot_duration.total_seconds() <= 0:
-                    print(
-                        f"DEBUG: ERROR - Slot duration is zero or negative ({slot_duration}). Breaking loop.")
-                    break  # Виходимо з циклу while
-
-                next_dt_naive = current_dt_naive + slot_duration
-
-                # Перевірка, чи не виходимо за межі робочого дня після додавання тривалості
-                # Якщо кінець наступного слоту виходить за межі end_work, то цей слот вже не підходить
-                # (Це може бути оптимізовано, щоб не генерувати останній, якщо він не поміщається)
-                # if next_dt_naive.time() > end_work:
-                # print(f"DEBUG: Next slot end time {next_dt_naive.time()} exceeds interval end {end_work}. Stopping interval.")
-                # break # Зупиняємо для цього інтервалу
-
-                current_slot_time = next_dt_naive.time()
-
-            print(
-                f"DEBUG: Finished processing interval #{interval_index} after {iteration_count} iterations.")
-
-        print(
-            f"DEBUG: Slot generation finished. Found {len(available_slots)} available slots.")
-        print(f"DEBUG: Returning success response.")
-        return success_response(data={"slots": available_slots, "is_available": bool(available_slots)})
+            service_doc = frappe.get_cached_doc("QMS Service", service)
+        except frappe.DoesNotExistError:
+            return error_response(_("Service '{0}' not found.").format(service), error_code="INVALID_SERVICE", http_status_code=404)
+        office_ctx = get_office_context(office)
+        if not office_ctx:
+            return error_response(_("Office '{0}' not found.").format(office), error_code="INVALID_OFFICE", http_status_code=404)
+        if not office_ctx.schedule:
+            return error_response(_("Working schedule not configured for office '{0}'.").format(office_ctx.office_name), error_code="NO_SCHEDULE", http_status_code=500)
+
+        duration_mins = cint(service_doc.avg_duration_mins) or 15
+        end_date = start_date + timedelta(days=days - 1)
+
+        # --- Заповнені слоти за весь діапазон одним запитом ---
+        # Місткість слоту - кількість операторів з навичкою; слот заповнений,
+        # коли всі місця зайняті (QMS Slot Reservation, час у зоні офісу)
+        capacity = get_slot_capacity(office, service)
+        reserved = get_reserved_seats(
+            office, service, f"{start_date} 00:00:00", f"{end_date} 23:59:59")
+        booked = {}
+        for slot_start, seats in reserved.items():
+            if seats >= capacity:
+                slot_dt = get_datetime(slot_start)
+                booked.setdefault(slot_dt.date().isoformat(), set()).add(slots.minute_of_day(slot_dt))
+
+        availability = slots.build_availability(
+            office_ctx.compiled_schedule(), start_date, days, duration_mins,
+            booked, office_ctx.now_local())
+        if not capacity:
+            # Немає операторів з навичкою - записатися неможливо
+            for day in availability:
+                day["slots"] = []
+
+        return success_response(data={
+            "slot_duration_mins": duration_mins,
+            "days": [{
+                "date": day["date"],
+                "status": day["status"],
+                "slots": slots.format_slots(day["date"], day["slots"]),
+                "is_available": bool(day["slots"]),
+            } for day in availability]
+        })
 
     except Exception as e:
-        print(
-            f"DEBUG: Exception caught in get_available_appointment_slots: {type(e).__name__} - {e}")
         frappe.log_error(frappe.get_traceback(),
-                         "Get Available Slots API Error (with debug)")
+                         "Get Appointment Availability API Error")
         return error_response(_("An unexpected error occurred while fetching available slots."), details=str(e), http_status_code=500)
 
 
 def get_working_intervals_for_date(schedule_name, target_date, timezone_str):
     """
-    Допоміжна функція для отримання робочих інтервалів.
-    (З доданими print для діагностики)
-    """
-    print(f"--- DEBUG (helper): Entering get_working_intervals_for_date ---")
-    target_date_str = get_date_str(target_date)
-    day_name = target_date.strftime('%A')
-    print(
-        f"DEBUG (helper): schedule='{schedule_name}', target_date='{target_date_str}', day_name='{day_name}', timezone='{timezone_str}'")
-    intervals = []
+    Допоміжна функція для отримання робочих інтервалів на дату.
+    Читає скомпільований графік з кешу, тож не виконує SQL-запитів.
 
+    :return: Відсортований список кортежів (start_time, end_time) типу datetime.time.
+    """
     try:
-        # 1. Перевірка винятків
-        print("DEBUG (helper): Checking for exceptions...")
-        exceptions = frappe.get_all(
-            "QMS Schedule Exception Child",
-            filters={"parent": schedule_name, "parenttype": "QMS Schedule",
-                     "exception_date": target_date_str},
-            fields=["is_workday", "start_time", "end_time"],
-            order_by="start_time"
-        )
-        print(
-            f"DEBUG (helper): Found {len(exceptions)} exceptions for the date.")
-
-        has_exception = bool(exceptions)
-        is_explicitly_non_workday = any(
-            not exc.is_workday for exc in exceptions)
-
-        if is_explicitly_non_workday:
-            print(
-                "DEBUG (helper): Exception marks this as a non-workday. Returning empty intervals.")
-            return []
-
-        if has_exception:
-            print("DEBUG (helper): Processing exceptions...")
-            for exc in exceptions:
-                if exc.is_workday and exc.start_time and exc.end_time:
-                    try:
-                        start = get_time(exc.start_time)
-                        end = get_time(exc.end_time)
-                        if start < end:
-                            intervals.append((start, end))
-                            print(
-                                f"DEBUG (helper): Added interval from exception: {start} - {end}")
-                        else:
-                            print(
-                                f"DEBUG (helper): WARNING - Invalid exception interval skipped (start >= end): {exc.start_time} - {exc.end_time}")
-                    except (TypeError, ValueError):
-                        print(
-                            f"DEBUG (helper): ERROR - Could not parse time from exception: Start='{exc.start_time}', End='{exc.end_time}'")
-
-            print(
-                f"DEBUG (helper): Returning intervals based SOLELY on exceptions: {intervals}")
-            return intervals
-
-        # 2. Перевірка правил (якщо не було винятків)
-        print(
-            f"DEBUG (helper): No relevant exceptions found. Checking rules for day: {day_name}...")
-        rules = frappe.get_all(
-            "QMS Schedule Rule Child",
-            filters={"parent": schedule_name,
-                     "parenttype": "QMS Schedule", "day_of_week": day_name},
-            fields=["start_time", "end_time"],
-            order_by="start_time"
-        )
-        print(f"DEBUG (helper): Found {len(rules)} rules for the day.")
-
-        for rule in rules:
-            try:
-                start = get_time(rule.start_time)
-                end = get_time(rule.end_time)
-                if start < end:
-                    intervals.append((start, end))
-                    print(
-                        f"DEBUG (helper): Added interval from rule: {start} - {end}")
-                else:
-                    print(
-                        f"DEBUG (helper): WARNING - Invalid rule interval skipped (start >= end): {rule.start_time} - {rule.end_time}")
-            except (TypeError, ValueError):
-                print(
-                    f"DEBUG (helper): ERROR - Could not parse time from rule: Start='{rule.start_time}', End='{rule.end_time}'")
-
-        print(
-            f"DEBUG (helper): Returning intervals based on rules: {intervals}")
-        return intervals
-
+        compiled = get_compiled_schedule(schedule_name)
+        return [(seconds_to_time(start), seconds_to_time(end))
+                for start, end in get_intervals_for_date(compiled, target_date)]
     except Exception as e:
-        print(f"DEBUG (helper): Exception caught: {type(e).__name__} - {e}")
         frappe.log_error(
-            f"Error getting working intervals for {schedule_name} on {target_date_str}: {e}", "Schedule Interval Error (with debug)")
+            f"Error getting working intervals for {schedule_name} on {get_date_str(target_date)}: {e}", "Schedule Interval Error")
         return []
 
 
 @frappe.whitelist(allow_guest=True)
+@instrumented()
+@rate_limited()
 def create_appointment_ticket(service: str, office: str, appointment_datetime: str, visitor_phone: str = None):
     """
     Створює талон попереднього запису на вказаний час.
+    Місце у слоті займається атомарно (QMS Slot Reservation), тож слот не може
+    бути переповнений навіть при одночасних бронюваннях.
     """
     try:
         # --- Валідація вхідних даних ---
         if not service or not office or not appointment_datetime:
             return error_response(_("Service, Office, and Appointment Datetime are required."), error_code="MISSING_PARAMS", http_status_code=400)
 
-        if not frappe.db.exists("QMS Service", service):
+        try:
+            service_doc = frappe.get_cached_doc("QMS Service", service)
+        except frappe.DoesNotExistError:
             return error_response(_("Service '{0}' not found.").format(service), error_code="INVALID_SERVICE", http_status_code=404)
-        if not frappe.db.exists("QMS Office", office):
+        office_ctx = get_office_context(office)
+        if not office_ctx:
             return error_response(_("Office '{0}' not found.").format(office), error_code="INVALID_OFFICE", http_status_code=404)
 
         # Валідація та конвертація дати/часу
@@ -541,55 +533,38 @@ def create_appointment_ticket(service: str, office: str, appointment_datetime: s
             # Очікуємо datetime рядок у форматі "YYYY-MM-DD HH:MM:SS" з часовою зоною офісу
             appt_dt_naive = datetime.strptime(
                 appointment_datetime, '%Y-%m-%d %H:%M:%S')
-            office_doc = frappe.get_cached_doc("QMS Office", office)
-            office_tz_str = office_doc.timezone or get_system_timezone()
-            office_tz = ZoneInfo(office_tz_str)
-            appt_dt_aware = office_tz.localize(appt_dt_naive)  # Робимо aware
-            # Переводимо в UTC для збереження в Frappe (стандартна практика)
-            appt_dt_utc = appt_dt_aware.astimezone(ZoneInfo("UTC"))
-            target_date_str = appt_dt_aware.strftime('%Y-%m-%d')
-            target_time = appt_dt_aware.time()
-
         except (ValueError, TypeError):
             return error_response(_("Invalid appointment datetime format. Use 'YYYY-MM-DD HH:MM:SS'."), error_code="INVALID_DATETIME_FORMAT", http_status_code=400)
-        except ZoneInfoNotFoundError:
-            return error_response(_("Invalid office timezone configured: {0}").format(office_tz_str), error_code="INVALID_TIMEZONE", http_status_code=500)
-
-        # --- Перевірка доступності слоту (Дуже важливо!) ---
-        # Проста перевірка, чи вже існує запис на цей час (може бути недостатньою при високому навантаженні)
-        # В ідеалі потрібен механізм блокування слоту.
-        slot_taken = frappe.db.exists("QMS Ticket", {
-            "office": office,
-            "service": service,
-            "is_appointment": 1,
-            "status": ["!=", "Cancelled"],
-            "appointment_datetime": appt_dt_utc  # Порівнюємо з UTC
-        })
-        if slot_taken:
-            # 409 Conflict
-            return error_response(_("The selected time slot ({0}) is no longer available. Please choose another time.").format(target_time.strftime("%H:%M")), error_code="SLOT_TAKEN", http_status_code=409)
 
-        # Додаткова перевірка: чи відкритий офіс у цей час?
-        schedule_name = office_doc.schedule or frappe.db.get_value(
-            "QMS Organization", office_doc.organization, "default_schedule")
-        if schedule_name:
-            working_intervals = get_working_intervals_for_date(
-                schedule_name, appt_dt_aware.date(), office_tz_str)
-            is_within_working_hours = any(
-                start <= target_time < end for start, end in working_intervals)
-            if not is_within_working_hours:
-                return error_response(_("The selected time slot ({0}) is outside of office working hours for {1}.").format(target_time.strftime("%H:%M"), target_date_str), error_code="OUTSIDE_WORKING_HOURS", http_status_code=400)
-        else:
+        appt_dt_aware = appt_dt_naive.replace(tzinfo=office_ctx.tz)
+        target_date_str = appt_dt_aware.strftime('%Y-%m-%d')
+        target_time = appt_dt_aware.time()
+
+        if appt_dt_aware < office_ctx.now_local():
+            return error_response(_("Cannot book appointments for past dates."), error_code="SLOT_IN_PAST", http_status_code=400)
+
+        # --- Перевірка, що час є слотом сітки в робочі години ---
+        if not office_ctx.schedule:
             # Якщо немає графіка, але ми дійшли сюди, це помилка конфігурації
-            return error_response(_("Working schedule not configured for office '{0}'.").format(office_doc.office_name), error_code="NO_SCHEDULE", http_status_code=500)
+            return error_response(_("Working schedule not configured for office '{0}'.").format(office_ctx.office_name), error_code="NO_SCHEDULE", http_status_code=500)
+
+        duration_mins = cint(service_doc.avg_duration_mins) or 15
+        intervals = get_intervals_for_date(
+            office_ctx.compiled_schedule(), appt_dt_aware.date())
+        if target_time.second or slots.minute_of_day(appt_dt_aware) not in slots.day_grid(intervals, duration_mins):
+            return error_response(_("The selected time slot ({0}) is outside of office working hours for {1}.").format(target_time.strftime("%H:%M"), target_date_str), error_code="OUTSIDE_WORKING_HOURS", http_status_code=400)
 
-        # --- Створення талону ---
+        capacity = get_slot_capacity(office, service)
+
+        # --- Створення талону та резервування місця в одній транзакції ---
         new_ticket = frappe.new_doc("QMS Ticket")
         new_ticket.office = office
         new_ticket.service = service
         new_ticket.status = "Waiting"  # Або "Scheduled", якщо додасте такий статус
         new_ticket.is_appointment = 1
-        new_ticket.appointment_datetime = appt_dt_utc  # Зберігаємо в UTC
+        # Frappe зберігає datetime без зони в системній часовій зоні
+        new_ticket.appointment_datetime = appt_dt_aware.astimezone(
+            resolve_timezone(get_system_timezone())).replace(tzinfo=None)
         new_ticket.issue_time = now()  # Час створення запису
         if visitor_phone:
             # TODO: Додати валідацію формату телефону
@@ -597,13 +572,21 @@ def create_appointment_ticket(service: str, office: str, appointment_datetime: s
 
         # autoname згенерує ім'я та номер
         new_ticket.insert(ignore_permissions=True)
+
+        seat_index = reserve_seat(
+            office, service, appt_dt_naive.strftime('%Y-%m-%d %H:%M:%S'), new_ticket.name, capacity)
+        if seat_index is None:
+            # Талон та номер лічильника відкочуються разом із транзакцією
+            frappe.db.rollback()
+            # 409 Conflict
+            return error_response(_("The selected time slot ({0}) is no longer available. Please choose another time.").format(target_time.strftime("%H:%M")), error_code="SLOT_TAKEN", http_status_code=409)
+
         frappe.db.commit()
 
         # --- Успішна відповідь ---
         return success_response(
             message=_("Appointment booked successfully for {0} at {1}.").format(
-                get_date_str(appt_dt_aware.date()
-                             ), target_time.strftime("%H:%M")
+                target_date_str, target_time.strftime("%H:%M")
             ),
             data={
                 "ticket_name": new_ticket.name,
@@ -631,6 +614,7 @@ def is_office_open(schedule_name: str, timezone: str):
     """
     Перевіряє, чи відкритий офіс зараз згідно з графіком, враховуючи винятки,
     часову зону офісу та можливість кількох робочих інтервалів на день.
+    Використовує скомпільований графік з кешу, тож не виконує SQL-запитів.
 
     :param schedule_name: Назва (ID) документу QMS Schedule.
     :param timezone: Рядок з назвою часової зони у форматі IANA (напр., 'Europe/Kyiv').
@@ -641,83 +625,14 @@ def is_office_open(schedule_name: str, timezone: str):
             "Schedule name not provided for is_office_open check.", "Schedule Check Error")
         return False
 
-    office_tz = None
+    office_tz = resolve_timezone(timezone)
     try:
-        if timezone:
-            office_tz = ZoneInfo(timezone)
-        else:
-            system_tz_str = get_system_timezone()
-            office_tz = ZoneInfo(system_tz_str)
-            frappe.log_warning(
-                f"Office timezone not provided for schedule '{schedule_name}'. Falling back to system timezone '{system_tz_str}'.", "Schedule Check Info")
-    except ZoneInfoNotFoundError:
-        system_tz_str = get_system_timezone()
-        office_tz = ZoneInfo(system_tz_str)
-        frappe.log_error(
-            message=f"Invalid timezone '{timezone}' provided for schedule '{schedule_name}'. Falling back to system timezone '{system_tz_str}'.", title="Schedule Check Error")
-    except Exception as e:
-        system_tz_str = get_system_timezone()
-        office_tz = ZoneInfo(system_tz_str)
-        frappe.log_error(
-            message=f"Error processing timezone '{timezone}' for schedule '{schedule_name}'. Falling back to system timezone '{system_tz_str}'. Error: {e}", title="Schedule Check Error")
-
-    try:
-        # now_local_dt = datetime.now(office_tz) # Використовуємо frappe.utils.now_datetime()
         now_local_dt = now_datetime().astimezone(office_tz)
-
-        current_date_str = now_local_dt.strftime('%Y-%m-%d')
-        current_day_name = now_local_dt.strftime('%A')
-        current_time_obj = get_time(now_local_dt.strftime('%H:%M:%S'))
-
-        # Перевірка Винятків
-        exceptions = frappe.get_all(
-            "QMS Schedule Exception Child",
-            filters={"parenttype": "QMS Schedule",
-                     "parent": schedule_name, "exception_date": current_date_str},
-            fields=["is_workday", "start_time", "end_time"],
-        )
-
-        if exceptions:
-            is_explicitly_non_workday = any(
-                not exc.is_workday for exc in exceptions)
-            if is_explicitly_non_workday:
-                return False
-
-            found_working_interval_in_exception = False
-            for exception in exceptions:
-                if exception.is_workday and exception.start_time and exception.end_time:
-                    start_time_exc = get_time(exception.start_time)
-                    end_time_exc = get_time(exception.end_time)
-                    if start_time_exc <= current_time_obj < end_time_exc:
-                        return True  # Відкрито за винятком
-
-            # Якщо були робочі винятки, але час не підійшов - закрито
-            if any(exc.is_workday for exc in exceptions):
-                return False
-
-        # Перевірка Правил
-        all_rules = frappe.get_all(
-            "QMS Schedule Rule Child",
-            filters={"parent": schedule_name, "parenttype": "QMS Schedule",
-                     "day_of_week": current_day_name},
-            fields=["start_time", "end_time"]
-        )
-
-        if not all_rules:
-            return False  # Немає правил на цей день
-
-        for rule in all_rules:
-            start_time_rule = get_time(rule.start_time)
-            end_time_rule = get_time(rule.end_time)
-            if start_time_rule <= current_time_obj < end_time_rule:
-                return True  # Відкрито за правилом
-
-        return False  # Жоден інтервал не підійшов
+        return is_open_at(get_compiled_schedule(schedule_name), now_local_dt)
 
     except Exception as e:
-        now_local_dt_str = now_local_dt.isoformat() if 'now_local_dt' in locals() else 'N/A'
         frappe.log_error(
-            f"Error during schedule check for schedule '{schedule_name}' with timezone '{timezone}'. Current local time check: {now_local_dt_str}. Error: {e}\n{frappe.get_traceback()}",
+            f"Error during schedule check for schedule '{schedule_name}' with timezone '{timezone}'. Error: {e}\n{frappe.get_traceback()}",
             "Schedule Check Runtime Error"
         )
         return False
@@ -726,6 +641,8 @@ def is_office_open(schedule_name: str, timezone: str):
 # --- API Ендпоінти ---
 
 @frappe.whitelist(allow_guest=True)
+@instrumented()
+@rate_limited()
 def create_live_queue_ticket(service: str, office: str, visitor_phone: str = None):
     """
     API Endpoint для створення нового талону QMS Ticket з Кіоску (Оновлена версія).
@@ -739,7 +656,8 @@ def create_live_queue_ticket(service: str, office: str, visitor_phone: str = Non
         # Перевірка існування записів
         if not frappe.db.exists("QMS Service", service):
             return error_response(_("Service '{0}' not found.").format(service), error_code="INVALID_SERVICE", http_status_code=404)
-        if not frappe.db.exists("QMS Office", office):
+        office_ctx = get_office_context(office)
+        if not office_ctx:
             return error_response(_("Office '{0}' not found.").format(office), error_code="INVALID_OFFICE", http_status_code=404)
 
         # --- Додаткові перевірки ---
@@ -752,23 +670,17 @@ def create_live_queue_ticket(service: str, office: str, visitor_phone: str = Non
         is_service_in_office = frappe.db.exists("QMS Office Service Assignment", {
                                                 "parent": office, "service": service, "is_active_in_office": 1})
         if not is_service_in_office:
-            office_name = frappe.db.get_value(
-                "QMS Office", office, "office_name")
-            return error_response(_("Service '{0}' is not available in office '{1}'.").format(service_doc.service_name, office_name), error_code="SERVICE_NOT_IN_OFFICE", http_status_code=400)
-
-        office_doc = frappe.get_cached_doc("QMS Office", office)
-        schedule_name = office_doc.schedule or frappe.db.get_value(
-            "QMS Organization", office_doc.organization, "default_schedule")
+            return error_response(_("Service '{0}' is not available in office '{1}'.").format(service_doc.service_name, office_ctx.office_name), error_code="SERVICE_NOT_IN_OFFICE", http_status_code=400)
 
-        if schedule_name:
-            if not is_office_open(schedule_name, office_doc.timezone):
+        if office_ctx.schedule:
+            if not office_ctx.is_open():
                 # Використовуємо info_response, бо це не помилка системи, а стан офісу
                 # Повертаємо 200 OK, але з інформаційним статусом
-                return info_response(_("Office '{0}' is currently closed.").format(office_doc.office_name), data={"office_status": "closed"})
+                return info_response(_("Office '{0}' is currently closed.").format(office_ctx.office_name), data={"office_status": "closed"})
         else:
             # Якщо немає графіка, це помилка конфігурації
             # 500 бо це проблема налаштування сервера
-            return error_response(_("Working schedule not configured for office '{0}'.").format(office_doc.office_name), error_code="NO_SCHEDULE", http_status_code=500)
+            return error_response(_("Working schedule not configured for office '{0}'.").format(office_ctx.office_name), error_code="NO_SCHEDULE", http_status_code=500)
 
         # --- Валідація номеру телефону ---
         if visitor_phone:
@@ -800,7 +712,9 @@ def create_live_queue_ticket(service: str, office: str, visitor_phone: str = Non
                 "ticket_name": new_ticket.name,  # Унікальний ID документа
                 "ticket_number": new_ticket.ticket_number,  # Номер для відображення
                 "office": new_ticket.office,
-                "service": new_ticket.service
+                "service": new_ticket.service,
+                "people_ahead": new_ticket.flags.people_ahead,
+                "estimated_wait_time_mins": new_ticket.estimated_wait_time_mins
             }
         )
 
@@ -822,7 +736,70 @@ def create_live_queue_ticket(service: str, office: str, visitor_phone: str = Non
         )
 
 
+@frappe.whitelist(allow_guest=True)
+@instrumented()
+@rate_limited()
+def get_ticket_escpos(ticket: str):
+    """
+    Сирий ESC/POS-потік талону (base64) для термопринтера кіоску - без рендерингу
+    HTML/PDF. Формат "QMS Ticket Thermal" лишається для друку через браузер.
+    """
+    try:
+        if not ticket or not frappe.db.exists("QMS Ticket", ticket):
+            return error_response(_("Ticket '{0}' not found.").format(ticket), http_status_code=404)
+
+        payload = ticket_print.render_ticket_escpos(ticket)
+        return success_response(data={
+            "ticket_name": ticket,
+            "encoding": "base64",
+            "payload": base64.b64encode(payload).decode(),
+        })
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "QMS Ticket ESC/POS API Error")
+        return error_response(
+            message=_("Failed to render ticket."),
+            details=str(e),
+            http_status_code=500
+        )
+
+
+def _claim_next_waiting_ticket(office_id, operator_skills):
+    """
+    Атомарно "захоплює" перший доступний талон у черзі для навичок оператора.
+
+    Кандидати беруться з Redis-черги офісу (utils/live_queue.py), а рядок талону
+    блокується через SELECT ... FOR UPDATE SKIP LOCKED. Талон, який саме зараз
+    захоплює інший оператор, пропускається без очікування; блокування тримається
+    до коміту транзакції виклику. Повертає ім'я захопленого талону або None.
+    """
+    # Нова транзакція: дані, закомічені іншими операторами, мають бути видимі
+    frappe.db.commit()
+
+    skipped = set()
+    limit = live_queue.DEFAULT_CANDIDATES
+    while True:
+        candidates = [(name, service) for name, service in live_queue.get_next_candidates(
+            office_id, operator_skills, limit=limit) if name not in skipped]
+        if not candidates:
+            return None
+
+        for ticket_name, service in candidates:
+            locked = frappe.db.sql(
+                "select status from `tabQMS Ticket` where name=%s for update skip locked", ticket_name)
+            if locked and locked[0][0] == "Waiting":
+                return ticket_name
+            if locked or not frappe.db.exists("QMS Ticket", ticket_name):
+                # Застарілий запис рушія: талон уже не в очікуванні або видалений
+                live_queue.remove_ticket(ticket_name, office_id, service)
+            else:
+                # Рядок заблокований іншим оператором - беремо наступного
+                skipped.add(ticket_name)
+
+        limit = len(skipped) + live_queue.DEFAULT_CANDIDATES
+
+
 @frappe.whitelist()
+@instrumented()
 def call_next_visitor(service_point_name: str):
     try:
         current_user = frappe.session.user
@@ -840,15 +817,20 @@ def call_next_visitor(service_point_name: str):
                 http_status_code=409  # 409 Conflict - відповідний статус для цієї ситуації
             )
             
-        operator_doc = frappe.get_doc(
-            "QMS Operator", {"user": current_user, "is_active": 1})
-        operator_skills = [
-            skill.service for skill in operator_doc.get("operator_skills", [])]
+        operator = operator_profile.get_profile(current_user)
+        if not operator:
+            return error_response(_("Active QMS Operator record not found for user {0}.").format(current_user), error_code="OPERATOR_NOT_FOUND", http_status_code=404)
+        operator_skills = operator["skills"]
         if not operator_skills:
             return error_response(_("Operator {0} has no skills assigned.").format(current_user), error_code="NO_SKILLS", http_status_code=400)
 
-        service_point_data = frappe.db.get_value("QMS Service Point", service_point_name, [
-                                                 "office", "point_name"], as_dict=True)
+        # Точки свого офісу - з профілю; інші (напр. неактивні) - з БД, як і раніше
+        service_point_data = operator_profile.find_service_point(operator, service_point_name)
+        if service_point_data:
+            service_point_data = frappe._dict(service_point_data, office=operator["office"])
+        else:
+            service_point_data = frappe.db.get_value("QMS Service Point", service_point_name, [
+                                                     "office", "point_name"], as_dict=True)
         if not service_point_data:
             return error_response(_("Service point with ID '{0}' not found.").format(service_point_name), http_status_code=404)
 
@@ -858,19 +840,11 @@ def call_next_visitor(service_point_name: str):
         if not office_id:
             return error_response(_("Could not determine Office for service point '{0}'.").format(actual_service_point_display_name), http_status_code=500)
 
-        waiting_tickets = frappe.get_list(
-            "QMS Ticket",
-            filters={"office": office_id, "status": "Waiting",
-                     "service": ["in", operator_skills]},
-            fields=["name"],
-            order_by="priority desc, creation asc",
-            limit_page_length=1
-        )
-
-        if not waiting_tickets:
+        # Наступний талон береться з Redis-черги офісу та блокується до коміту
+        next_ticket_name = _claim_next_waiting_ticket(office_id, operator_skills)
+        if not next_ticket_name:
             return info_response(_("No tickets found in queue for calling."), data={"ticket_info": None})
 
-        next_ticket_name = waiting_tickets[0].name
         ticket_doc = frappe.get_doc("QMS Ticket", next_ticket_name)
 
         # Просто оновлюємо поля і зберігаємо. Хук on_update в QMSTicket зробить решту.
@@ -878,11 +852,8 @@ def call_next_visitor(service_point_name: str):
         ticket_doc.call_time = now_datetime()
         ticket_doc.operator = current_user
         ticket_doc.service_point = service_point_name
-
-        # Можливо, зберегти service_name та service_point_name напряму в документі талону
-        # для легшого доступу в get_realtime_data, якщо вони не оновлюються часто.
-        # ticket_doc.service_name = frappe.db.get_value("QMS Service", ticket_doc.service, "service_name")
-        # ticket_doc.service_point_name = actual_service_point_display_name
+        # Назва вже відома - не чекаємо на fetch_from, подія піде без зайвих запитів
+        ticket_doc.service_point_name = actual_service_point_display_name
 
         ticket_doc.save(ignore_permissions=True)  # Це викличе on_update
         frappe.db.commit()
@@ -914,10 +885,14 @@ def call_next_visitor(service_point_name: str):
 
 
 @frappe.whitelist(allow_guest=True)
-def get_display_data(office: str, limit_called: int = 3, limit_waiting: int = 20):
+@instrumented()
+@rate_limited()
+def get_display_data(office: str, limit_called: int = 3, limit_waiting: int = 20, etag: str | None = None):
     """
-    Отримує дані для публічного дисплея черги (Оновлена версія).
-    Повертає стандартизовану відповідь.
+    Отримує дані для публічного дисплея черги.
+    Дані талонів беруться з кешованого знімка офісу (utils/display_snapshot.py),
+    який інвалідується при зміні талонів. Якщо табло передає `etag` останньої
+    відповіді і нічого не змінилось - повертається коротка відповідь {"unchanged": True}.
     """
     try:
         limit_called = cint(limit_called)
@@ -926,30 +901,34 @@ def get_display_data(office: str, limit_called: int = 3, limit_waiting: int = 20
         if not office:
             return error_response(_("Office ID is required."), http_status_code=400)
 
-        if not frappe.db.exists("QMS Office", office):
+        office_ctx = get_office_context(office)
+        if not office_ctx:
             return error_response(_("Office '{0}' not found.").format(office), http_status_code=404)
 
-        # Перевірка графіка роботи
-        office_doc = frappe.get_cached_doc("QMS Office", office)
-        schedule_name = office_doc.schedule or frappe.db.get_value(
-            "QMS Organization", office_doc.organization, "default_schedule")
-
         office_is_open = False
         # Змінено: ініціалізація перекладним рядком
         closed_message = _("Working schedule not configured.")
 
-        if schedule_name:
-            office_is_open = is_office_open(schedule_name, office_doc.timezone)
+        # Перевірка графіка роботи
+        if office_ctx.schedule:
+            office_is_open = office_ctx.is_open()
             if not office_is_open:
                 closed_message = _("Office '{0}' is currently closed.").format(
-                    office_doc.office_name)
+                    office_ctx.office_name)
         else:
             closed_message = _("Working schedule not configured for office '{0}'.").format(
-                office_doc.office_name)
+                office_ctx.office_name)
             office_is_open = False
 
         # Отримуємо інформаційне повідомлення
-        info_message_text = office_doc.display_message_text or None
+        info_message_text = office_ctx.display_message_text or None
+
+        # Номер останньої події кімнати офісу: від нього табло відлічує пропуски
+        seq = current_sequence(office)
+        current_etag = display_snapshot.make_etag(
+            office, limit_called, limit_waiting, office_is_open, info_message_text)
+        if etag and etag == current_etag:
+            return success_response(data={"unchanged": True, "etag": current_etag, "seq": seq})
 
         if not office_is_open:
             # Використовуємо info_response для стану "закрито"
@@ -959,85 +938,22 @@ def get_display_data(office: str, limit_called: int = 3, limit_waiting: int = 20
                     "office_status": "closed",
                     "last_called": [],
                     "waiting": [],
-                    "info_message": info_message_text  # Передаємо повідомлення і тут
+                    "info_message": info_message_text,  # Передаємо повідомлення і тут
+                    "etag": current_etag,
+                    "seq": seq
                 }
             )
 
-        # --- Отримуємо останні викликані/обслужені ---
-        last_called = []
-        potential_called = frappe.get_all(
-            "QMS Ticket",
-            filters={
-                "office": office,
-                # Показуємо тільки ті, що зараз викликані
-                "status": "Called",
-                # Обмежуємо сьогоднішнім днем для продуктивності
-                # Фільтр за часом виклику
-                "call_time": [">=", today() + " 00:00:00"] if frappe.db.db_type == 'mariadb' else [">=", datetime.combine(get_datetime(today()).date(), datetime.min.time())]
-            },
-            fields=["name", "ticket_number", "service_point", "call_time"],
-            # Сортуємо за часом виклику, найновіші зверху
-            order_by="call_time desc",
-            limit_page_length=limit_called  # Беремо тільки потрібну кількість
-        )
-
-        # Отримуємо назви точок одним запитом
-        point_ids = list(
-            set(t.service_point for t in potential_called if t.service_point))
-        point_names_map = {}
-        if point_ids:
-            points = frappe.get_all("QMS Service Point", filters={
-                                    "name": ["in", point_ids]}, fields=["name", "point_name"])
-            point_names_map = {p.name: p.point_name for p in points}
-
-        for ticket in potential_called:
-            short_ticket_number = ticket.ticket_number.split(
-                '-')[-1] if ticket.ticket_number and '-' in ticket.ticket_number else ticket.ticket_number
-            call_time_dt = get_datetime(
-                ticket.call_time) if ticket.call_time else None
-            last_called.append({
-                "ticket": short_ticket_number or ticket.name,
-                "window": point_names_map.get(ticket.service_point, "N/A"),
-                "time": call_time_dt.strftime("%H:%M") if call_time_dt else "--:--"
-            })
-
-        # --- Отримуємо наступних у черзі ---
-        waiting_tickets = []
-        # TODO: Додати логіку обробки талонів по запису (is_appointment, appointment_datetime), якщо реалізовано
-        waiting_raw = frappe.get_all(
-            "QMS Ticket",
-            filters={"office": office, "status": "Waiting"},
-            fields=["name", "ticket_number", "service"],
-            order_by="priority desc, creation asc",
-            limit_page_length=limit_waiting
-        )
-
-        # Отримуємо назви послуг одним запитом
-        service_ids_waiting = list(
-            set(row.service for row in waiting_raw if row.service))
-        service_names_map_waiting = {}
-        if service_ids_waiting:
-            services = frappe.get_all("QMS Service", filters={
-                                      "name": ["in", service_ids_waiting]}, fields=["name", "service_name"])
-            service_names_map_waiting = {
-                s.name: s.service_name for s in services}
-
-        for row in waiting_raw:
-            short_ticket_number = row.ticket_number.split(
-                '-')[-1] if row.ticket_number and '-' in row.ticket_number else row.ticket_number
-            waiting_tickets.append({
-                "ticket": short_ticket_number or row.name,
-                # Переклад тут
-                "service": service_names_map_waiting.get(row.service, _("Service not specified")),
-                "service_id": row.service  # Додаємо ID для можливої стилізації на фронтенді
-            })
+        snapshot = display_snapshot.get_snapshot(office, limit_called, limit_waiting)
 
         # Успішна відповідь для відкритого офісу
         return success_response(data={
             "office_status": "open",
-            "last_called": last_called,
-            "waiting": waiting_tickets,
-            "info_message": info_message_text  # Передаємо повідомлення
+            "last_called": snapshot["last_called"],
+            "waiting": snapshot["waiting"],
+            "info_message": info_message_text,  # Передаємо повідомлення
+            "etag": current_etag,
+            "seq": seq
         })
 
     except Exception as e:
@@ -1053,122 +969,61 @@ def get_display_data(office: str, limit_called: int = 3, limit_waiting: int = 20
 
 
 @frappe.whitelist(allow_guest=True)
-def get_kiosk_services(office: str):
+@instrumented()
+@rate_limited()
+def get_kiosk_bootstrap(office: str):
     """
-    Отримує список послуг для кіоску (Оновлена версія).
-    Повертає стандартизовану відповідь.
+    Усі стартові дані кіоску одним запитом: інформація про офіс, чи відкрито зараз,
+    найближча зміна стану (next_transition) та дерево послуг за категоріями.
+    Обслуговується з кешу офісу (utils/kiosk_bootstrap.py) без запитів до БД.
     """
     try:
         if not office:
             return error_response(_("Office ID is required."), http_status_code=400)
-        if not frappe.db.exists("QMS Office", office):
+
+        bootstrap = kiosk_bootstrap.get_bootstrap(office)
+        if bootstrap is None:
             return error_response(_("Office '{0}' not found.").format(office), http_status_code=404)
 
-        # Перевірка графіка роботи
-        office_doc = frappe.get_cached_doc("QMS Office", office)
-        schedule_name = office_doc.schedule or frappe.db.get_value(
-            "QMS Organization", office_doc.organization, "default_schedule")
+        return success_response(data=bootstrap)
 
-        office_is_open = False
-        # Змінено: ініціалізація перекладним рядком
-        closed_message = _("Working schedule not configured.")
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(),
+                         f"Get Kiosk Bootstrap API Error for Office {office}")
+        return error_response(
+            message=_("An unexpected error occurred while fetching kiosk data."),
+            details=str(e),
+            http_status_code=500
+        )
 
-        if schedule_name:
-            office_is_open = is_office_open(schedule_name, office_doc.timezone)
-            if not office_is_open:
-                closed_message = _("Office '{0}' is currently closed.").format(
-                    office_doc.office_name)
-        else:
-            closed_message = _("Working schedule not configured for office '{0}'.").format(
-                office_doc.office_name)
-            office_is_open = False
 
-        if not office_is_open:
+@frappe.whitelist(allow_guest=True)
+@instrumented()
+@rate_limited()
+def get_kiosk_services(office: str):
+    """
+    Отримує список послуг для кіоску (Оновлена версія).
+    Повертає стандартизовану відповідь. Дані беруться з кешу get_kiosk_bootstrap.
+    """
+    try:
+        if not office:
+            return error_response(_("Office ID is required."), http_status_code=400)
+
+        bootstrap = kiosk_bootstrap.get_bootstrap(office)
+        if bootstrap is None:
+            return error_response(_("Office '{0}' not found.").format(office), http_status_code=404)
+
+        if not bootstrap["is_open"]:
             # Використовуємо info_response для стану "закрито"
             return info_response(
-                message=closed_message,
+                message=bootstrap["closed_message"],
                 data={"status": "closed", "categories": [],
                       "services_no_category": []}
             )
 
-        # Отримуємо впорядковані призначення послуг для офісу
-        assignments = frappe.get_all(
-            "QMS Office Service Assignment",
-            filters={"parent": office, "is_active_in_office": 1},
-            fields=["service"],
-            order_by="idx asc"  # Важливо для порядку на кіоску
-        )
-        if not assignments:
-            # Успіх, але дані порожні
-            return success_response(data={"categories": [], "services_no_category": []})
-
-        ordered_service_ids = [a.service for a in assignments]
-
-        # Отримуємо деталі тільки активних та доступних для кіоску послуг
-        services_details = frappe.get_all(
-            "QMS Service",
-            filters={
-                "name": ["in", ordered_service_ids],
-                "enabled": 1,  # Послуга має бути активна
-                "live_queue_enabled": 1  # Послуга має бути доступна для живої черги
-            },
-            # Додаємо іконку
-            fields=["name", "service_name", "category", "icon"]
-        )
-        # Створюємо словник для швидкого доступу
-        active_services_map = {s.name: s for s in services_details}
-
-        # Отримуємо та сортуємо категорії
-        category_ids = list(
-            set(s.category for s in services_details if s.category))
-        categories_map = {}
-        sorted_cat_ids = []
-        if category_ids:
-            categories_data = frappe.get_all(
-                "QMS Service Category",
-                filters={"name": ["in", category_ids]},
-                fields=["name", "category_name", "display_order"],
-                order_by="display_order asc, category_name asc"  # Сортування категорій
-            )
-            sorted_cat_ids = [cat.name for cat in categories_data]
-            categories_map = {cat.name: {
-                "label": cat.category_name, "services": []} for cat in categories_data}
-
-        # Розподіляємо послуги за категоріями згідно з порядком assignments
-        services_no_category_ordered = []
-        # Створюємо тимчасовий словник для накопичення послуг у категоріях
-        temp_categories_services = {cat_id: [] for cat_id in sorted_cat_ids}
-
-        for service_id in ordered_service_ids:
-            # Перевіряємо, чи послуга активна і доступна для кіоску
-            if service_id in active_services_map:
-                service_info = active_services_map[service_id]
-                service_data = {
-                    "id": service_info.name,
-                    "label": service_info.service_name,
-                    "icon": service_info.icon or ""  # Повертаємо іконку або порожній рядок
-                }
-
-                if service_info.category and service_info.category in temp_categories_services:
-                    temp_categories_services[service_info.category].append(
-                        service_data)
-                else:
-                    services_no_category_ordered.append(service_data)
-
-        # Формуємо фінальний список категорій з послугами (тільки не порожні)
-        final_categories_list = []
-        for cat_id in sorted_cat_ids:
-            # Додаємо категорію, тільки якщо в ній є послуги
-            if temp_categories_services[cat_id]:
-                final_categories_list.append({
-                    "label": categories_map[cat_id]["label"],
-                    "services": temp_categories_services[cat_id]
-                })
-
-        # Успішна відповідь з даними
         return success_response(data={
-            "categories": final_categories_list,
-            "services_no_category": services_no_category_ordered
+            "categories": bootstrap["categories"],
+            "services_no_category": bootstrap["services_no_category"]
         })
 
     except Exception as e:
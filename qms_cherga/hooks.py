@@ -81,6 +81,10 @@ app_license = "mit"
 # 	"methods": "qms_cherga.utils.jinja_methods",
 # 	"filters": "qms_cherga.utils.jinja_filters"
 # }
+jinja = {
+	# Контекст друку талону без запитів до БД (формат "QMS Ticket Thermal")
+	"methods": ["qms_cherga.utils.ticket_print.get_ticket_print_context"],
+}
 
 # Installation
 # ------------
@@ -143,6 +147,31 @@ app_license = "mit"
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+	"cron": {
+		# Прибирання талонів офісів, що закрились (qms_cherga/tasks.py)
+		"*/15 * * * *": [
+			"qms_cherga.tasks.sweep_closed_offices"
+		],
+		# Інкрементальна погодинна аналітика талонів (QMS Ticket Hourly Summary)
+		"*/10 * * * *": [
+			"qms_cherga.tasks.refresh_ticket_analytics"
+		],
+		# Звірка черг Redis із БД та перебудова розбіжних (qms_cherga/utils/live_queue.py)
+		"*/5 * * * *": [
+			"qms_cherga.tasks.repair_live_queues"
+		],
+		# Перенесення старих закритих талонів в архів (QMS Ticket Archive)
+		"30 3 * * *": [
+			"qms_cherga.tasks.archive_old_tickets"
+		],
+		# Лічильники талонів на завтра та згортання старих рядків (QMS Daily Counter)
+		"0 22 * * *": [
+			"qms_cherga.tasks.prepare_daily_counters"
+		],
+	},
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"qms_cherga.tasks.all"
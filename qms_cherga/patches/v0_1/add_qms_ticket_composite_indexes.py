@@ -0,0 +1,5 @@
+from qms_cherga.qms_cherga.doctype.qms_ticket.qms_ticket import add_qms_ticket_indexes
+
+
+def execute():
+    add_qms_ticket_indexes()
@@ -0,0 +1,25 @@
+import frappe
+
+
+def execute():
+    """Заповнює service_name / service_point_name в існуючих талонах (поля з fetch_from)."""
+    frappe.db.sql(
+        """
+        UPDATE `tabQMS Ticket` ticket
+        SET service_name = (
+            SELECT service.service_name FROM `tabQMS Service` service
+            WHERE service.name = ticket.service
+        )
+        WHERE ticket.service IS NOT NULL
+        """
+    )
+    frappe.db.sql(
+        """
+        UPDATE `tabQMS Ticket` ticket
+        SET service_point_name = (
+            SELECT point.point_name FROM `tabQMS Service Point` point
+            WHERE point.name = ticket.service_point
+        )
+        WHERE ticket.service_point IS NOT NULL
+        """
+    )
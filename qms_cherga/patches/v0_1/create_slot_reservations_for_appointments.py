@@ -0,0 +1,36 @@
+import frappe
+from frappe.utils import get_datetime, get_system_timezone, now_datetime
+
+from qms_cherga.qms_cherga.doctype.qms_schedule.qms_schedule import resolve_timezone
+from qms_cherga.qms_cherga.doctype.qms_slot_reservation.qms_slot_reservation import reserve_seat
+
+
+def execute():
+    """
+    Займає місця в QMS Slot Reservation для майбутніх записів, створених до її появи.
+    Вже наявні перевищення місткості зберігаються - кожен талон отримує своє місце.
+    """
+    system_tz = resolve_timezone(get_system_timezone())
+    office_timezones = {}
+
+    appointments = frappe.get_all(
+        "QMS Ticket",
+        filters={
+            "is_appointment": 1,
+            "status": ["not in", ["Cancelled", "Completed", "NoShow"]],
+            "appointment_datetime": [">=", now_datetime()],
+        },
+        fields=["name", "office", "service", "appointment_datetime"],
+        order_by="creation asc",
+    )
+    for ticket in appointments:
+        if ticket.office not in office_timezones:
+            office_timezones[ticket.office] = resolve_timezone(
+                frappe.db.get_value("QMS Office", ticket.office, "timezone"))
+        slot_start = (
+            get_datetime(ticket.appointment_datetime)
+            .replace(tzinfo=system_tz)
+            .astimezone(office_timezones[ticket.office])
+            .strftime("%Y-%m-%d %H:%M:%S")
+        )
+        reserve_seat(ticket.office, ticket.service, slot_start, ticket.name, capacity=len(appointments))
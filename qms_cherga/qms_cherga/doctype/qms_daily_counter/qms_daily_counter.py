@@ -1,9 +1,147 @@
 # Copyright (c) 2025, Maxym Sysoiev and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
+from frappe.utils import add_days, get_first_day, getdate, now, today
+
+# Денні рядки лічильника зберігаються тиждень, старші згортаються в QMS Daily Counter Summary
+COUNTER_RETENTION_DAYS = 7
 
 
 class QMSDailyCounter(Document):
 	pass
+
+
+def get_counter_name(office: str, date_str: str) -> str:
+	"""Ім'я рядка лічильника, узгоджене з autoname 'format:{office}-{YYYY}-{MM}-{DD}'."""
+	return f"{office}-{date_str}"
+
+
+def allocate_next_number(office: str, date_str: str) -> int:
+	"""
+	Атомарно видає наступний номер талону для офісу на дату.
+
+	Один оператор БД (upsert) створює рядок лічильника або збільшує last_number.
+	Рядок блокується до кінця поточної транзакції, тож конкурентні кіоски
+	просто чекають на коміт замість DuplicateEntryError/повторів/sleep.
+	Якщо транзакція талону відкотиться, відкотиться і номер — пропусків немає.
+	"""
+	if not office or not date_str:
+		frappe.throw("Не вказано 'Office' або дату для генерації послідовності")
+
+	timestamp = now()
+	values = {
+		"name": get_counter_name(office, date_str),
+		"office": office,
+		"date": date_str,
+		"now": timestamp,
+		"user": frappe.session.user if getattr(frappe.local, "session", None) else "Administrator",
+	}
+
+	if frappe.db.db_type == "postgres":
+		result = frappe.db.sql(
+			"""
+			INSERT INTO "tabQMS Daily Counter"
+				(name, office, date, last_number, creation, modified, owner, modified_by, docstatus, idx)
+			VALUES (%(name)s, %(office)s, %(date)s, 1, %(now)s, %(now)s, %(user)s, %(user)s, 0, 0)
+			ON CONFLICT (name) DO UPDATE
+				SET last_number = "tabQMS Daily Counter".last_number + 1, modified = %(now)s
+			RETURNING last_number
+			""",
+			values,
+		)
+		return int(result[0][0])
+
+	# MariaDB: LAST_INSERT_ID(expr) запам'ятовує значення в межах з'єднання,
+	# тому і вставка (1), і оновлення (last_number + 1) повертаються одним SELECT.
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabQMS Daily Counter`
+			(name, office, date, last_number, creation, modified, owner, modified_by, docstatus, idx)
+		VALUES (%(name)s, %(office)s, %(date)s, LAST_INSERT_ID(1), %(now)s, %(now)s, %(user)s, %(user)s, 0, 0)
+		ON DUPLICATE KEY UPDATE
+			last_number = LAST_INSERT_ID(last_number + 1), modified = %(now)s
+		""",
+		values,
+	)
+	return int(frappe.db.sql("SELECT LAST_INSERT_ID()")[0][0])
+
+
+def precreate_counters(date_str: str, offices: list | None = None) -> int:
+	"""
+	Створює рядки лічильника з last_number = 0 для всіх офісів на дату одним
+	INSERT IGNORE. Перший талон дня тоді лише оновлює наявний рядок, а не вставляє
+	новий у момент, коли всі кіоски офісу видають талони одночасно.
+	"""
+	if offices is None:
+		offices = frappe.get_all("QMS Office", pluck="name")
+	if not offices:
+		return 0
+
+	timestamp = now()
+	user = frappe.session.user if getattr(frappe.local, "session", None) else "Administrator"
+	fields = ["name", "office", "date", "last_number", "creation", "modified", "owner", "modified_by", "docstatus", "idx"]
+	values = [
+		(get_counter_name(office, date_str), office, date_str, 0, timestamp, timestamp, user, user, 0, 0)
+		for office in offices
+	]
+	frappe.db.bulk_insert("QMS Daily Counter", fields, values, ignore_duplicates=True)
+	return len(values)
+
+
+def compact_counters(retention_days: int = COUNTER_RETENTION_DAYS) -> int:
+	"""
+	Згортає рядки лічильника, старші за retention_days, у місячні підсумки
+	(QMS Daily Counter Summary) та видаляє їх. Повертає кількість згорнутих рядків.
+	"""
+	cutoff = add_days(today(), -retention_days)
+	rows = frappe.get_all(
+		"QMS Daily Counter",
+		filters={"date": ["<", cutoff]},
+		fields=["name", "office", "date", "last_number"],
+		order_by="date asc",
+	)
+	if not rows:
+		return 0
+
+	months = {}
+	for row in rows:
+		months.setdefault((row.office, get_first_day(row.date)), []).append(row)
+
+	for (office, month), month_rows in months.items():
+		add_to_summary(office, month, month_rows)
+
+	frappe.db.delete("QMS Daily Counter", {"name": ["in", [row.name for row in rows]]})
+	return len(rows)
+
+
+def add_to_summary(office: str, month, rows: list):
+	name = get_summary_name(office, month)
+	if frappe.db.exists("QMS Daily Counter Summary", name):
+		summary = frappe.get_doc("QMS Daily Counter Summary", name)
+	else:
+		summary = frappe.new_doc("QMS Daily Counter Summary")
+		summary.update({"office": office, "month": month})
+
+	for row in rows:
+		# Заздалегідь створені рядки днів без талонів лише видаляються
+		if not row.last_number:
+			continue
+		summary.working_days = (summary.working_days or 0) + 1
+		summary.tickets_issued = (summary.tickets_issued or 0) + row.last_number
+		if row.last_number > (summary.busiest_day_tickets or 0):
+			summary.busiest_date = row.date
+			summary.busiest_day_tickets = row.last_number
+
+	# Підсумок лишається і для видаленого офісу
+	summary.flags.ignore_links = True
+	if summary.is_new():
+		summary.insert(ignore_permissions=True, set_name=name)
+	else:
+		summary.save(ignore_permissions=True)
+
+
+def get_summary_name(office: str, month) -> str:
+	"""Узгоджене з autoname 'format:{office}-{month}' QMS Daily Counter Summary."""
+	return f"{office}-{getdate(month).isoformat()}"
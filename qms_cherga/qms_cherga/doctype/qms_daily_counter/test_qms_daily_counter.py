@@ -1,9 +1,20 @@
 # Copyright (c) 2025, Maxym Sysoiev and Contributors
 # See license.txt
 
-# import frappe
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import frappe
 from frappe.tests import IntegrationTestCase, UnitTestCase
 
+from qms_cherga.qms_cherga.doctype.qms_daily_counter.qms_daily_counter import (
+	allocate_next_number,
+	compact_counters,
+	get_counter_name,
+	get_summary_name,
+	precreate_counters,
+)
 
 # On IntegrationTestCase, the doctype test records and all
 # link-field test record dependencies are recursively loaded
@@ -21,10 +32,93 @@ class UnitTestQMSDailyCounter(UnitTestCase):
 	pass
 
 
+def _allocate_in_thread(site, sites_path, office, date_str, count):
+	"""Окреме з'єднання з БД на потік, як у окремого воркера кіоску."""
+	frappe.init(site=site, sites_path=sites_path)
+	frappe.connect()
+	try:
+		numbers = []
+		for _ in range(count):
+			numbers.append(allocate_next_number(office, date_str))
+			frappe.db.commit()
+		return numbers
+	finally:
+		frappe.destroy()
+
+
 class IntegrationTestQMSDailyCounter(IntegrationTestCase):
 	"""
 	Integration tests for QMSDailyCounter.
 	Use this class for testing interactions between multiple components.
 	"""
 
-	pass
+	def setUp(self):
+		self.office = f"CNT-{uuid.uuid4().hex[:8]}"
+		self.date_str = "2099-01-01"
+		self.addCleanup(self._cleanup_counter)
+
+	def _cleanup_counter(self):
+		frappe.db.delete("QMS Daily Counter", get_counter_name(self.office, self.date_str))
+		frappe.db.commit()
+
+	def test_allocation_is_sequential(self):
+		numbers = [allocate_next_number(self.office, self.date_str) for _ in range(3)]
+		self.assertEqual(numbers, [1, 2, 3])
+		self.assertEqual(
+			frappe.db.get_value(
+				"QMS Daily Counter", get_counter_name(self.office, self.date_str), "last_number"
+			),
+			3,
+		)
+
+	def test_parallel_allocations_have_no_gaps_or_duplicates(self):
+		frappe.db.commit()
+		workers, per_worker = 10, 100
+		site, sites_path = frappe.local.site, frappe.local.sites_path
+
+		with patch("time.sleep") as sleep_mock:
+			with ThreadPoolExecutor(max_workers=workers) as executor:
+				futures = [
+					executor.submit(
+						_allocate_in_thread, site, sites_path, self.office, self.date_str, per_worker
+					)
+					for _ in range(workers)
+				]
+				numbers = [n for future in futures for n in future.result()]
+
+		sleep_mock.assert_not_called()
+		self.assertEqual(sorted(numbers), list(range(1, workers * per_worker + 1)))
+
+	def test_precreated_counter_starts_at_one(self):
+		precreate_counters(self.date_str, [self.office])
+		# Повторний запуск завдання нічого не змінює
+		precreate_counters(self.date_str, [self.office])
+		self.assertEqual(
+			frappe.db.get_value(
+				"QMS Daily Counter", get_counter_name(self.office, self.date_str), "last_number"
+			),
+			0,
+		)
+		self.assertEqual(allocate_next_number(self.office, self.date_str), 1)
+
+	def test_old_counters_compacted_into_monthly_summary(self):
+		old_dates = {"2000-01-03": 5, "2000-01-04": 9, "2000-01-05": 0}
+		precreate_counters(self.date_str, [self.office])
+		precreate_counters("2000-01-03", [self.office])
+		precreate_counters("2000-01-04", [self.office])
+		precreate_counters("2000-01-05", [self.office])
+		for date_str, last_number in old_dates.items():
+			frappe.db.set_value("QMS Daily Counter", get_counter_name(self.office, date_str), "last_number", last_number)
+		summary_name = get_summary_name(self.office, "2000-01-01")
+		self.addCleanup(frappe.db.delete, "QMS Daily Counter Summary", summary_name)
+
+		self.assertGreaterEqual(compact_counters(), len(old_dates))
+
+		for date_str in old_dates:
+			self.assertFalse(frappe.db.exists("QMS Daily Counter", get_counter_name(self.office, date_str)))
+		self.assertTrue(frappe.db.exists("QMS Daily Counter", get_counter_name(self.office, self.date_str)))
+		summary = frappe.get_doc("QMS Daily Counter Summary", summary_name)
+		self.assertEqual(
+			(summary.working_days, summary.tickets_issued, str(summary.busiest_date), summary.busiest_day_tickets),
+			(2, 14, "2000-01-04", 9),
+		)
@@ -4,6 +4,8 @@
 # import frappe
 from frappe.model.document import Document
 
+from qms_cherga.utils import kiosk_bootstrap, office_context, operator_profile
+
 
 class QMSOffice(Document):
 	# begin: auto-generated types
@@ -26,4 +28,14 @@ class QMSOffice(Document):
 		timezone: DF.Data
 	# end: auto-generated types
 
-	pass
+	def on_update(self):
+		# Призначення послуг - дочірня таблиця офісу, тож зберігаються разом з ним
+		kiosk_bootstrap.invalidate(self.name)
+		office_context.invalidate(self.name)
+		if self.has_value_changed("office_name"):
+			operator_profile.clear_cache()
+
+	def on_trash(self):
+		kiosk_bootstrap.invalidate(self.name)
+		office_context.invalidate(self.name)
+		operator_profile.clear_cache()
@@ -4,6 +4,18 @@
 # import frappe
 from frappe.model.document import Document
 
+from qms_cherga.qms_cherga.doctype.qms_slot_reservation.qms_slot_reservation import clear_slot_capacity_cache
+from qms_cherga.utils import operator_profile, wait_predictor
+
 
 class QMSOperator(Document):
-	pass
+	def on_update(self):
+		# Місткість слотів запису залежить від навичок та офісу операторів
+		clear_slot_capacity_cache()
+		operator_profile.clear_cache()
+		wait_predictor.clear_operator_cache()
+
+	def on_trash(self):
+		clear_slot_capacity_cache()
+		operator_profile.clear_cache()
+		wait_predictor.clear_operator_cache()
@@ -4,6 +4,11 @@
 # import frappe
 from frappe.model.document import Document
 
+from qms_cherga.utils import kiosk_bootstrap, office_context
+
 
 class QMSOrganization(Document):
-	pass
+	def on_update(self):
+		# Назва та графік за замовчуванням організації входять до стартових даних кіосків
+		kiosk_bootstrap.invalidate_all()
+		office_context.invalidate_all()
@@ -1,9 +1,127 @@
 # Copyright (c) 2025, Maxym Sysoiev and contributors
 # For license information, please see license.txt
 
-# import frappe
+from datetime import time
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import frappe
 from frappe.model.document import Document
+from frappe.utils import get_date_str, get_system_timezone, get_time
+
+COMPILED_SCHEDULE_CACHE_KEY = "qms_compiled_schedule"
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
 
 
 class QMSSchedule(Document):
-	pass
+	def on_update(self):
+		# Скомпільована форма перебудовується лише після збереження графіка
+		clear_compiled_schedule(self.name)
+
+	def on_trash(self):
+		clear_compiled_schedule(self.name)
+
+
+def clear_compiled_schedule(schedule_name: str):
+	frappe.cache().hdel(COMPILED_SCHEDULE_CACHE_KEY, schedule_name)
+
+
+def get_compiled_schedule(schedule_name: str) -> dict:
+	"""
+	Повертає графік у скомпільованій формі (кеш Redis + кеш запиту):
+	    {"rules": {weekday: [(start_sec, end_sec), ...]},
+	     "exceptions": {"YYYY-MM-DD": [(start_sec, end_sec), ...]}}
+	Порожній список у "exceptions" означає, що в цей день офіс зачинено.
+	"""
+	return frappe.cache().hget(
+		COMPILED_SCHEDULE_CACHE_KEY, schedule_name, generator=lambda: compile_schedule(schedule_name)
+	)
+
+
+def compile_schedule(schedule_name: str) -> dict:
+	"""Будує тижневу таблицю інтервалів та карту винятків (два запити на весь графік)."""
+	rules = {weekday: [] for weekday in range(7)}
+	for rule in frappe.get_all(
+		"QMS Schedule Rule Child",
+		filters={"parent": schedule_name, "parenttype": "QMS Schedule"},
+		fields=["day_of_week", "start_time", "end_time"],
+	):
+		interval = _to_interval(rule.start_time, rule.end_time)
+		if interval and rule.day_of_week in WEEKDAYS:
+			rules[WEEKDAYS.index(rule.day_of_week)].append(interval)
+
+	exceptions = {}
+	non_workdays = set()
+	for exc in frappe.get_all(
+		"QMS Schedule Exception Child",
+		filters={"parent": schedule_name, "parenttype": "QMS Schedule"},
+		fields=["exception_date", "is_workday", "start_time", "end_time"],
+	):
+		date_key = get_date_str(exc.exception_date)
+		intervals = exceptions.setdefault(date_key, [])
+		if not exc.is_workday:
+			non_workdays.add(date_key)
+			continue
+		interval = _to_interval(exc.start_time, exc.end_time)
+		if interval:
+			intervals.append(interval)
+
+	# Явний неробочий день перекриває будь-які робочі винятки на цю дату
+	for date_key in non_workdays:
+		exceptions[date_key] = []
+
+	return {
+		"rules": {weekday: sorted(intervals) for weekday, intervals in rules.items()},
+		"exceptions": {date_key: sorted(intervals) for date_key, intervals in exceptions.items()},
+	}
+
+
+def get_intervals_for_date(compiled: dict, target_date) -> list:
+	"""Робочі інтервали (секунди від початку доби) на дату: спершу винятки, потім правила."""
+	exception_intervals = compiled["exceptions"].get(get_date_str(target_date))
+	if exception_intervals is not None:
+		return exception_intervals
+	return compiled["rules"].get(target_date.weekday(), [])
+
+
+def is_open_at(compiled: dict, local_dt) -> bool:
+	"""Чи відкрито на момент local_dt (час у часовій зоні офісу)."""
+	seconds = local_dt.hour * 3600 + local_dt.minute * 60 + local_dt.second
+	return any(start <= seconds < end for start, end in get_intervals_for_date(compiled, local_dt.date()))
+
+
+def seconds_to_time(seconds: int) -> time:
+	return time(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def resolve_timezone(timezone: str | None):
+	"""
+	Повертає ZoneInfo для часової зони офісу (з кешем на процес).
+	Якщо зону не вказано або вона некоректна - використовується системна.
+	"""
+	if timezone:
+		try:
+			return _get_zoneinfo(timezone)
+		except (ZoneInfoNotFoundError, ValueError):
+			frappe.log_error(
+				message=f"Invalid timezone '{timezone}'. Falling back to system timezone '{get_system_timezone()}'.",
+				title="Schedule Check Error",
+			)
+	return _get_zoneinfo(get_system_timezone())
+
+
+@lru_cache(maxsize=256)
+def _get_zoneinfo(timezone: str):
+	return ZoneInfo(timezone)
+
+
+def _to_interval(start_time, end_time):
+	if start_time is None or end_time is None:
+		return None
+	try:
+		start, end = get_time(start_time), get_time(end_time)
+	except (TypeError, ValueError):
+		return None
+	start_sec = start.hour * 3600 + start.minute * 60 + start.second
+	end_sec = end.hour * 3600 + end.minute * 60 + end.second
+	return (start_sec, end_sec) if start_sec < end_sec else None
@@ -1,9 +1,17 @@
 # Copyright (c) 2025, Maxym Sysoiev and Contributors
 # See license.txt
 
-# import frappe
+from datetime import date, datetime, time
+
+import frappe
 from frappe.tests import IntegrationTestCase, UnitTestCase
 
+from qms_cherga.api import is_office_open
+from qms_cherga.qms_cherga.doctype.qms_schedule.qms_schedule import (
+	get_compiled_schedule,
+	get_intervals_for_date,
+	is_open_at,
+)
 
 # On IntegrationTestCase, the doctype test records and all
 # link-field test record dependencies are recursively loaded
@@ -18,7 +26,21 @@ class UnitTestQMSSchedule(UnitTestCase):
 	Use this class for testing individual functions and methods.
 	"""
 
-	pass
+	compiled = {
+		"rules": {2: [(9 * 3600, 13 * 3600), (14 * 3600, 18 * 3600)]},
+		"exceptions": {"2025-05-07": [], "2025-05-14": [(11 * 3600, 12 * 3600)]},
+	}
+
+	def test_rules_are_used_without_exception(self):
+		self.assertEqual(len(get_intervals_for_date(self.compiled, date(2025, 4, 30))), 2)
+		self.assertTrue(is_open_at(self.compiled, datetime(2025, 4, 30, 9, 0)))
+		self.assertFalse(is_open_at(self.compiled, datetime(2025, 4, 30, 13, 0)))
+		self.assertFalse(is_open_at(self.compiled, datetime(2025, 5, 4, 10, 0)))
+
+	def test_exceptions_override_rules(self):
+		self.assertFalse(is_open_at(self.compiled, datetime(2025, 5, 7, 10, 0)))
+		self.assertTrue(is_open_at(self.compiled, datetime(2025, 5, 14, 11, 30)))
+		self.assertFalse(is_open_at(self.compiled, datetime(2025, 5, 14, 10, 0)))
 
 
 class IntegrationTestQMSSchedule(IntegrationTestCase):
@@ -27,4 +49,30 @@ class IntegrationTestQMSSchedule(IntegrationTestCase):
 	Use this class for testing interactions between multiple components.
 	"""
 
-	pass
+	def setUp(self):
+		self.schedule = frappe.get_doc(
+			{
+				"doctype": "QMS Schedule",
+				"schedule_name": "Compiled Schedule Test",
+				"schedule_rules": [
+					{"day_of_week": "Wednesday", "start_time": time(9, 0), "end_time": time(13, 0)},
+				],
+			}
+		).insert(ignore_permissions=True)
+		self.addCleanup(frappe.delete_doc, "QMS Schedule", self.schedule.name, force=True)
+
+	def test_compiled_schedule_is_rebuilt_on_save(self):
+		self.assertEqual(get_compiled_schedule(self.schedule.name)["rules"][2], [(9 * 3600, 13 * 3600)])
+
+		self.schedule.append(
+			"schedule_exceptions",
+			{"exception_date": "2025-05-07", "description": "Holiday", "is_workday": 0},
+		)
+		self.schedule.save(ignore_permissions=True)
+
+		self.assertEqual(get_compiled_schedule(self.schedule.name)["exceptions"]["2025-05-07"], [])
+
+	def test_open_check_runs_no_queries_once_compiled(self):
+		is_office_open(self.schedule.name, "Europe/Kyiv")
+		with self.assertQueryCount(0):
+			is_office_open(self.schedule.name, "Europe/Kyiv")
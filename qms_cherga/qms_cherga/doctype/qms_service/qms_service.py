@@ -4,6 +4,17 @@
 # import frappe
 from frappe.model.document import Document
 
+from qms_cherga.qms_cherga.doctype.qms_ticket.qms_ticket import update_denormalized_names
+from qms_cherga.utils import display_snapshot, kiosk_bootstrap
+
 
 class QMSService(Document):
-	pass
+	def on_update(self):
+		if self.has_value_changed("service_name"):
+			update_denormalized_names("service", self.name, "service_name", self.service_name)
+		# Назва послуги показується на табло всіх офісів
+		display_snapshot.invalidate_all()
+		kiosk_bootstrap.invalidate_all()
+
+	def on_trash(self):
+		kiosk_bootstrap.invalidate_all()
@@ -4,6 +4,12 @@
 # import frappe
 from frappe.model.document import Document
 
+from qms_cherga.utils import kiosk_bootstrap
+
 
 class QMSServiceCategory(Document):
-	pass
+	def on_update(self):
+		kiosk_bootstrap.invalidate_all()
+
+	def on_trash(self):
+		kiosk_bootstrap.invalidate_all()
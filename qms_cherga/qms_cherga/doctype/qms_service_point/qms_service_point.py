@@ -4,6 +4,21 @@
 # import frappe
 from frappe.model.document import Document
 
+from qms_cherga.qms_cherga.doctype.qms_ticket.qms_ticket import update_denormalized_names
+from qms_cherga.utils import display_snapshot, operator_profile, wait_predictor
+
 
 class QMSServicePoint(Document):
-	pass
+	def on_update(self):
+		if self.has_value_changed("point_name"):
+			update_denormalized_names("service_point", self.name, "service_point_name", self.point_name)
+		# Назва точки показується на табло
+		display_snapshot.invalidate(self.office)
+		# Точки офісу входять до профілів операторів
+		operator_profile.clear_cache()
+		# Закріплений оператор - оператор на зміні для оцінки очікування
+		wait_predictor.clear_operator_cache()
+
+	def on_trash(self):
+		operator_profile.clear_cache()
+		wait_predictor.clear_operator_cache()
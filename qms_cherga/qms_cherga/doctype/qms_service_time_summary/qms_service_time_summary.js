@@ -0,0 +1,8 @@
+// Copyright (c) 2025, Maxym Sysoiev and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("QMS Service Time Summary", {
+// 	refresh(frm) {
+
+// 	},
+// });
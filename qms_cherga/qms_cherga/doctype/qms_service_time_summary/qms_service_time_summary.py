@@ -0,0 +1,112 @@
+# Copyright (c) 2025, Maxym Sysoiev and contributors
+# For license information, please see license.txt
+
+import math
+from bisect import bisect_right
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now
+
+METRICS = ("Wait", "Service")
+# Верхні межі кошиків гістограми (хвилини): <5, 5-10, 10-15, 15-30, 30-60, >=60
+HISTOGRAM_BOUNDS = (5, 10, 15, 30, 60)
+HISTOGRAM_FIELDS = tuple(f"hist_{i}" for i in range(len(HISTOGRAM_BOUNDS) + 1))
+
+
+class QMSServiceTimeSummary(Document):
+	pass
+
+
+def get_summary_name(office: str, service: str, date_str: str, metric: str) -> str:
+	"""Ім'я рядка, узгоджене з autoname 'format:{office}-{service}-{date}-{metric}'."""
+	return f"{office}-{service}-{date_str}-{metric}"
+
+
+def histogram_field(minutes: float) -> str:
+	return HISTOGRAM_FIELDS[bisect_right(HISTOGRAM_BOUNDS, minutes)]
+
+
+def record_sample(office: str, service: str, date_str: str, metric: str, minutes: float):
+	"""
+	Додає одне значення до агрегатів дня одним upsert-ом: кількість, сума, сума квадратів
+	та кошик гістограми збільшуються атомарно, без читання рядка.
+	"""
+	if metric not in METRICS:
+		frappe.throw(f"Unknown service time metric: {metric}")
+
+	bucket = histogram_field(minutes)
+	timestamp = now()
+	values = {
+		"name": get_summary_name(office, service, date_str, metric),
+		"office": office,
+		"service": service,
+		"date": date_str,
+		"metric": metric,
+		"value": minutes,
+		"square": minutes * minutes,
+		"now": timestamp,
+		"user": frappe.session.user if getattr(frappe.local, "session", None) else "Administrator",
+	}
+
+	if frappe.db.db_type == "postgres":
+		frappe.db.sql(
+			f"""
+			INSERT INTO "tabQMS Service Time Summary"
+				(name, office, service, date, metric, sample_count, total_mins, total_squares, {bucket},
+				creation, modified, owner, modified_by, docstatus, idx)
+			VALUES (%(name)s, %(office)s, %(service)s, %(date)s, %(metric)s, 1, %(value)s, %(square)s, 1,
+				%(now)s, %(now)s, %(user)s, %(user)s, 0, 0)
+			ON CONFLICT (name) DO UPDATE SET
+				sample_count = "tabQMS Service Time Summary".sample_count + 1,
+				total_mins = "tabQMS Service Time Summary".total_mins + %(value)s,
+				total_squares = "tabQMS Service Time Summary".total_squares + %(square)s,
+				{bucket} = "tabQMS Service Time Summary".{bucket} + 1,
+				modified = %(now)s
+			""",
+			values,
+		)
+		return
+
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tabQMS Service Time Summary`
+			(name, office, service, date, metric, sample_count, total_mins, total_squares, {bucket},
+			creation, modified, owner, modified_by, docstatus, idx)
+		VALUES (%(name)s, %(office)s, %(service)s, %(date)s, %(metric)s, 1, %(value)s, %(square)s, 1,
+			%(now)s, %(now)s, %(user)s, %(user)s, 0, 0)
+		ON DUPLICATE KEY UPDATE
+			sample_count = sample_count + 1,
+			total_mins = total_mins + %(value)s,
+			total_squares = total_squares + %(square)s,
+			{bucket} = {bucket} + 1,
+			modified = %(now)s
+		""",
+		values,
+	)
+
+
+def get_summary(office: str, service: str, date_str: str, metric: str) -> dict:
+	"""Статистика дня з одного рядка: count, mean, stddev та гістограма."""
+	row = frappe.db.get_value(
+		"QMS Service Time Summary",
+		get_summary_name(office, service, date_str, metric),
+		["sample_count", "total_mins", "total_squares", *HISTOGRAM_FIELDS],
+		as_dict=True,
+	)
+	return summarize(row)
+
+
+def summarize(row) -> dict:
+	count = (row or {}).get("sample_count") or 0
+	if not count:
+		return {"count": 0, "mean": None, "stddev": None, "histogram": [0] * len(HISTOGRAM_FIELDS)}
+
+	mean = row["total_mins"] / count
+	variance = max(row["total_squares"] / count - mean * mean, 0)
+	return {
+		"count": count,
+		"mean": round(mean, 2),
+		"stddev": round(math.sqrt(variance), 2),
+		"histogram": [row.get(field) or 0 for field in HISTOGRAM_FIELDS],
+	}
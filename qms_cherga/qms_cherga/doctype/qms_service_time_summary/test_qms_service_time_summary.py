@@ -0,0 +1,59 @@
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import uuid
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from qms_cherga.qms_cherga.doctype.qms_service_time_summary.qms_service_time_summary import (
+	get_summary,
+	histogram_field,
+	record_sample,
+	summarize,
+)
+
+# On IntegrationTestCase, the doctype test records and all
+# link-field test record dependencies are recursively loaded
+# Use these module variables to add/remove to/from that list
+EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+
+
+class UnitTestQMSServiceTimeSummary(UnitTestCase):
+	"""
+	Unit tests for QMSServiceTimeSummary.
+	Use this class for testing individual functions and methods.
+	"""
+
+	def test_histogram_buckets(self):
+		self.assertEqual(histogram_field(0), "hist_0")
+		self.assertEqual(histogram_field(5), "hist_1")
+		self.assertEqual(histogram_field(29), "hist_3")
+		self.assertEqual(histogram_field(240), "hist_5")
+
+	def test_summarize_empty_row(self):
+		self.assertEqual(summarize(None)["count"], 0)
+		self.assertIsNone(summarize(None)["mean"])
+
+
+class IntegrationTestQMSServiceTimeSummary(IntegrationTestCase):
+	"""
+	Integration tests for QMSServiceTimeSummary.
+	Use this class for testing interactions between multiple components.
+	"""
+
+	def setUp(self):
+		self.office = f"STS-{uuid.uuid4().hex[:8]}"
+		self.addCleanup(frappe.db.delete, "QMS Service Time Summary", {"office": self.office})
+
+	def test_samples_accumulate_in_one_row(self):
+		for minutes in (4, 6, 20):
+			record_sample(self.office, "STS Service", "2099-01-01", "Wait", minutes)
+
+		self.assertEqual(frappe.db.count("QMS Service Time Summary", {"office": self.office}), 1)
+		summary = get_summary(self.office, "STS Service", "2099-01-01", "Wait")
+		self.assertEqual(summary["count"], 3)
+		self.assertEqual(summary["mean"], 10)
+		self.assertAlmostEqual(summary["stddev"], 7.12, places=2)
+		self.assertEqual(summary["histogram"], [1, 1, 0, 1, 0, 0])
@@ -0,0 +1,123 @@
+# Copyright (c) 2025, Maxym Sysoiev and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now
+
+SLOT_RESERVATION_UNIQUE = "office_service_slot_seat"
+SLOT_CAPACITY_CACHE_KEY = "qms_slot_capacity"
+
+
+class QMSSlotReservation(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique(
+		"QMS Slot Reservation",
+		["office", "service", "slot_start", "seat_index"],
+		constraint_name=SLOT_RESERVATION_UNIQUE,
+	)
+
+
+def get_slot_capacity(office: str, service: str) -> int:
+	"""
+	Кількість місць у слоті: активні оператори офісу з навичкою для послуги.
+	Кешується; кеш скидається при зміні будь-якого оператора.
+	"""
+	return frappe.cache().hget(
+		SLOT_CAPACITY_CACHE_KEY, f"{office}::{service}", generator=lambda: _count_skilled_operators(office, service)
+	)
+
+
+def clear_slot_capacity_cache():
+	# Повторно після коміту: інакше паралельний запит між очищенням і комітом
+	# закешує ємність за старими даними на весь TTL
+	def _clear():
+		frappe.cache().delete_value(SLOT_CAPACITY_CACHE_KEY)
+
+	_clear()
+	frappe.db.after_commit.add(_clear)
+
+
+def _count_skilled_operators(office: str, service: str) -> int:
+	return int(
+		frappe.db.sql(
+			"""
+			SELECT COUNT(DISTINCT operator.name)
+			FROM `tabQMS Operator` operator
+			JOIN `tabQMS Operator Skill` skill
+				ON skill.parent = operator.name AND skill.parenttype = 'QMS Operator'
+			WHERE operator.default_office = %(office)s
+				AND operator.is_active = 1
+				AND skill.service = %(service)s
+			""",
+			{"office": office, "service": service},
+		)[0][0]
+	)
+
+
+def reserve_seat(office: str, service: str, slot_start: str, ticket: str, capacity: int) -> int | None:
+	"""
+	Займає перше вільне місце у слоті та повертає його індекс (None - слот заповнено).
+
+	Кожна спроба - один INSERT; унікальний ключ (office, service, slot_start, seat_index)
+	гарантує, що два бронювання не отримають одне місце, тож вікна між читанням
+	і записом немає. Конкурентний INSERT на те саме місце чекає коміту іншої
+	транзакції і отримує порушення ключа - тоді пробуємо наступне місце.
+	"""
+	timestamp = now()
+	user = frappe.session.user if getattr(frappe.local, "session", None) else "Administrator"
+
+	for seat_index in range(capacity):
+		values = {
+			"name": frappe.generate_hash(length=10),
+			"office": office,
+			"service": service,
+			"slot_start": slot_start,
+			"seat_index": seat_index,
+			"ticket": ticket,
+			"now": timestamp,
+			"user": user,
+		}
+		frappe.db.savepoint(SLOT_RESERVATION_UNIQUE)
+		try:
+			frappe.db.sql(
+				"""
+				INSERT INTO `tabQMS Slot Reservation`
+					(name, office, service, slot_start, seat_index, ticket,
+					creation, modified, owner, modified_by, docstatus, idx)
+				VALUES (%(name)s, %(office)s, %(service)s, %(slot_start)s, %(seat_index)s, %(ticket)s,
+					%(now)s, %(now)s, %(user)s, %(user)s, 0, 0)
+				""",
+				values,
+			)
+		except Exception as e:
+			if not frappe.db.is_unique_key_violation(e):
+				raise
+			frappe.db.rollback(save_point=SLOT_RESERVATION_UNIQUE)
+			continue
+		return seat_index
+
+	return None
+
+
+def release_ticket_reservations(ticket: str):
+	"""Звільняє місця, зайняті талоном (скасування або видалення запису)."""
+	frappe.db.delete("QMS Slot Reservation", {"ticket": ticket})
+
+
+def get_reserved_seats(office: str, service: str, from_datetime: str, to_datetime: str) -> dict:
+	"""{slot_start (datetime): кількість зайнятих місць} для діапазону - один запит."""
+	rows = frappe.get_all(
+		"QMS Slot Reservation",
+		filters={
+			"office": office,
+			"service": service,
+			"slot_start": ["between", (from_datetime, to_datetime)],
+		},
+		fields=["slot_start", "count(name) as seats"],
+		group_by="slot_start",
+	)
+	return {row.slot_start: row.seats for row in rows}
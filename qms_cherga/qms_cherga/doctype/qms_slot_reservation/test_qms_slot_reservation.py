@@ -0,0 +1,51 @@
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import uuid
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from qms_cherga.qms_cherga.doctype.qms_slot_reservation.qms_slot_reservation import (
+	release_ticket_reservations,
+	reserve_seat,
+)
+
+# On IntegrationTestCase, the doctype test records and all
+# link-field test record dependencies are recursively loaded
+# Use these module variables to add/remove to/from that list
+EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+
+
+class UnitTestQMSSlotReservation(UnitTestCase):
+	"""
+	Unit tests for QMSSlotReservation.
+	Use this class for testing individual functions and methods.
+	"""
+
+	pass
+
+
+class IntegrationTestQMSSlotReservation(IntegrationTestCase):
+	"""
+	Integration tests for QMSSlotReservation.
+	Use this class for testing interactions between multiple components.
+	"""
+
+	def setUp(self):
+		self.office = f"RSV-{uuid.uuid4().hex[:8]}"
+		self.service = "RSV Service"
+		self.slot_start = "2099-01-01 10:00:00"
+		self.addCleanup(frappe.db.delete, "QMS Slot Reservation", {"office": self.office})
+
+	def test_seats_are_taken_in_order_up_to_capacity(self):
+		seats = [
+			reserve_seat(self.office, self.service, self.slot_start, f"T-{i}", capacity=2) for i in range(3)
+		]
+		self.assertEqual(seats, [0, 1, None])
+		self.assertEqual(frappe.db.count("QMS Slot Reservation", {"office": self.office}), 2)
+
+		# Звільнене місце можна зайняти знову
+		release_ticket_reservations("T-0")
+		self.assertEqual(reserve_seat(self.office, self.service, self.slot_start, "T-3", capacity=2), 0)
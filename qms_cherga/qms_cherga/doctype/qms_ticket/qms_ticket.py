@@ -1,10 +1,37 @@
 # qms_ticket.py
 
-import time
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import now_datetime, today, cint, get_date_str
+from frappe.utils import now_datetime, today, get_date_str, get_datetime, time_diff_in_seconds
+
+from qms_cherga.qms_cherga.doctype.qms_daily_counter.qms_daily_counter import allocate_next_number
+from qms_cherga.qms_cherga.doctype.qms_service_time_summary.qms_service_time_summary import record_sample
+from qms_cherga.qms_cherga.doctype.qms_slot_reservation.qms_slot_reservation import release_ticket_reservations
+from qms_cherga.qms_cherga.doctype.qms_ticket_archive.qms_ticket_archive import create_history_view
+from qms_cherga.qms_cherga.doctype.qms_ticket_hourly_summary.qms_ticket_hourly_summary import rebuild_day
+from qms_cherga.utils import display_snapshot, live_queue, live_stats, wait_predictor
+from qms_cherga.utils.metrics import instrumented
+from qms_cherga.utils.realtime import office_room, publish_office_event
+
+# Складені індекси під "гарячі" запити API (див. qms_cherga/tests/test_query_plans.py)
+QMS_TICKET_INDEXES = {
+    # call_next_visitor, get_display_data (очікуючі): office + status [+ service], ORDER BY priority, creation
+    "office_status_priority_creation_index": ["office", "status", "priority", "creation"],
+    "office_status_service_index": ["office", "status", "service"],
+    # get_display_data (останні викликані): office + status, ORDER BY call_time
+    "office_status_call_time_index": ["office", "status", "call_time"],
+    # get_live_data (обслужені сьогодні): office + status + completion_time
+    "office_status_completion_time_index": ["office", "status", "completion_time"],
+    # Перевірка активного талону оператора
+    "operator_status_index": ["operator", "status"],
+    # Записи на прийом
+    "office_service_appointment_index": ["office", "service", "is_appointment", "appointment_datetime"],
+    # Архівація закритих талонів (QMS Ticket Archive): status + creation < горизонт
+    "status_creation_index": ["status", "creation"],
+    # Перерахунок погодинної аналітики за день офісу (QMS Ticket Hourly Summary)
+    "office_creation_index": ["office", "creation"],
+}
 
 
 class QMSTicket(Document):
@@ -29,7 +56,9 @@ class QMSTicket(Document):
         operator: DF.Link | None
         priority: DF.Int
         service: DF.Link
+        service_name: DF.Data | None
         service_point: DF.Link | None
+        service_point_name: DF.Data | None
         start_service_time: DF.Datetime | None
         status: DF.Literal["Scheduled", "Waiting", "Called",
                            "Serving", "Completed", "NoShow", "Cancelled", "Postponed"]
@@ -40,11 +69,51 @@ class QMSTicket(Document):
         visitor_phone: DF.Data | None
     # end: auto-generated types
 
+    @instrumented("QMS Ticket.validate")
+    def validate(self):
+        self.set_timing_fields()
+
+    def set_timing_fields(self):
+        """
+        Фактичний час очікування - при першому виклику (call_time - issue_time),
+        фактичний час обслуговування - при завершенні (completion_time - start_service_time).
+        Нові значення також потрапляють до денних агрегатів (див. record_timing_samples).
+        """
+        self.flags.timing_samples = []
+        previous = self.get_doc_before_save()
+        previous_status = previous.status if previous else None
+        if previous_status == self.status:
+            return
+
+        # Повторний виклик відкладеного талону не змінює час очікування
+        if self.status == "Called" and previous_status in (None, "Waiting") and self.call_time and self.issue_time:
+            self.actual_wait_time_mins = _minutes_between(self.issue_time, self.call_time)
+            self.flags.timing_samples.append(("Wait", self.call_time, self.actual_wait_time_mins))
+
+        if self.status == "Completed" and self.completion_time:
+            started = self.start_service_time or self.call_time
+            if started:
+                self.actual_service_time_mins = _minutes_between(started, self.completion_time)
+                self.flags.timing_samples.append(("Service", self.completion_time, self.actual_service_time_mins))
+
+    def record_timing_samples(self):
+        """Інкрементально оновлює QMS Service Time Summary (один upsert на значення)."""
+        for metric, moment, minutes in self.flags.timing_samples or []:
+            record_sample(self.office, self.service, get_date_str(get_datetime(moment)), metric, minutes)
+            if metric == "Service":
+                args = (self.office, self.service, minutes)
+                frappe.db.after_commit.add(lambda: wait_predictor.record_service_time(*args))
+        self.flags.timing_samples = []
+
+    @instrumented("QMS Ticket.on_update")
     def on_update(self):
         """Викликається після кожного збереження документу (існуючого або нового після after_insert)."""
+        self.record_timing_samples()
 
         frappe.logger("qms_realtime").debug(
             f"QMSTicket {self.name} on_update triggered. Status: {self.status}")
+        # Кеші інвалідуються до публікації, тож клієнт, що отримав подію, бачить свіжі дані
+        self.invalidate_office_caches()
         event_name_to_publish = 'qms_ticket_updated_doc'
         event_type_in_payload = 'qms_ticket_updated_doc'  # Тип всередині даних
         # Визначаємо, чи це була специфічна зміна статусу, яку треба обробити окремо
@@ -61,6 +130,47 @@ class QMSTicket(Document):
         if self._doc_before_save and self._doc_before_save.get("status") != self.status:
             self.publish_stats_update()
 
+        self.sync_live_queue()
+
+        # Скасований запис звільняє своє місце у слоті
+        if self.is_appointment and self.status == "Cancelled" and self.has_value_changed("status"):
+            release_ticket_reservations(self.name)
+
+    @instrumented("QMS Ticket.on_trash")
+    def on_trash(self):
+        self.sync_live_queue(status="Deleted")
+        self.invalidate_office_caches()
+        if self.is_appointment:
+            release_ticket_reservations(self.name)
+        # Погодинна аналітика бачить лише змінені талони; день видаленого перераховуємо без нього
+        if self.office and self.creation:
+            rebuild_day(self.office, self.creation, exclude=self.name)
+
+    def sync_live_queue(self, status=None):
+        """
+        Оновлює Redis-чергу офісу (utils/live_queue.py) після коміту транзакції,
+        тож рушій бачить лише закомічений стан талону.
+        """
+        args = (self.name, self.office, self.service, status or self.status, self.priority, self.creation)
+        frappe.db.after_commit.add(lambda: live_queue.sync_ticket(*args))
+
+    def invalidate_office_caches(self):
+        """
+        Знімок табло (utils/display_snapshot.py) та "живі" дані панелі оператора
+        (utils/live_stats.py) перебудуються при наступному запиті. Повторна
+        інвалідація після коміту відкидає дані, які могли зібрати до того,
+        як зміни стали видимі іншим з'єднанням.
+        """
+        office = self.office
+
+        def _invalidate():
+            display_snapshot.invalidate(office)
+            live_stats.invalidate(office)
+
+        _invalidate()
+        frappe.db.after_commit.add(_invalidate)
+
+    @instrumented("QMS Ticket.after_insert")
     def after_insert(self):
         # """Викликається тільки після першого збереження нового документу."""
         # frappe.logger("qms_realtime").debug(
@@ -98,12 +208,8 @@ class QMSTicket(Document):
         frappe.logger("qms_realtime").info(
             f"QMSTicket {self.name}: Publishing event 'qms_stats_updated' to room '{room}' for stats refresh.")
 
-        frappe.publish_realtime(
-            event='qms_stats_updated',  # Загальна подія для оновлення статистики
-            message=stats_message,
-            # room=room,
-            after_commit=True
-        )
+        # Загальна подія для оновлення статистики, лише в кімнату офісу
+        publish_office_event(self.office, 'qms_stats_updated', stats_message)
 
     # --- Налаштування DocType ---
     # У визначенні DocType 'QMS Ticket' (через UI або qms_ticket.json):
@@ -111,6 +217,7 @@ class QMSTicket(Document):
     #    (Або 'python:autoname', якщо ви хочете вказати ім'я методу явно).
     # 2. Приберіть інші правила Autoname ('naming_series', 'prompt', 'field:...' тощо).
 
+    @instrumented("QMS Ticket.autoname")
     def autoname(self):
         """
         Цей метод автоматично викликається Frappe для встановлення
@@ -128,7 +235,7 @@ class QMSTicket(Document):
         # 3. Отримання наступного номера послідовності
         try:
             # Передаємо дату для консистентності
-            next_num = self.get_next_ticket_sequence_orm(current_date_str)
+            next_num = self.get_next_ticket_sequence(current_date_str)
         except Exception as e:
             # Логуємо помилку і перериваємо процес, якщо лічильник недоступний
             frappe.log_error(frappe.get_traceback(),
@@ -160,6 +267,7 @@ class QMSTicket(Document):
             # Або якщо потрібне числове значення:
             # self.ticket_number = next_num
 
+    @instrumented("QMS Ticket.before_insert")
     def before_insert(self):
         # Метод autoname вже встановив self.name.
         # Цей метод тепер можна використовувати для іншої логіки,
@@ -182,86 +290,27 @@ class QMSTicket(Document):
         # Якщо статус не встановлено, за замовчуванням "Waiting"
         if not self.status:
             self.status = "Waiting"
+        if self.status == "Waiting" and not self.estimated_wait_time_mins:
+            # Оцінка з кешованого стану (utils/wait_predictor.py); люди попереду - для відповіді кіоску
+            estimate = wait_predictor.estimate_wait(self.office, self.service)
+            self.estimated_wait_time_mins = estimate["estimated_wait_time_mins"]
+            self.flags.people_ahead = estimate["people_ahead"]
 
-    # Метод get_next_ticket_sequence_orm залишається без змін (як у попередньому варіанті)
-    def get_next_ticket_sequence_orm(self, current_date_str):
+    def get_next_ticket_sequence(self, current_date_str):
         """
-        Отримує наступний номер послідовності з 'QMS Daily Counter'.
-        (Код ідентичний попередньому)
+        Отримує наступний номер послідовності з 'QMS Daily Counter'
+        одним атомарним оператором (без повторів та очікувань).
         """
         if not self.office:
             frappe.throw("Не вказано 'Office' для генерації послідовності")
 
-        counter_doc_name = f"{self.office}-{current_date_str}"
-        new_number = 0
-        max_attempts = 5  # Кількість спроб
-
-        for attempt in range(max_attempts):
-            counter_doc = None
-            try:
-                # Use exists for check
-                if frappe.db.exists("QMS Daily Counter", counter_doc_name):
-                    # Use get_doc for loading
-                    counter_doc = frappe.get_doc(
-                        "QMS Daily Counter", counter_doc_name)
-                    # Re-read from DB before incrementing
-                    counter_doc.load_from_db()
-                    new_number = cint(counter_doc.last_number) + 1  # Use cint
-                    counter_doc.last_number = new_number
-                else:
-                    # Create new counter document
-                    new_number = 1
-                    counter_doc = frappe.new_doc("QMS Daily Counter")
-                    counter_doc.name = counter_doc_name  # Set name explicitly
-                    counter_doc.office = self.office
-                    counter_doc.date = current_date_str
-                    counter_doc.last_number = new_number
-
-                # Save the counter doc
-                counter_doc.flags.ignore_permissions = True
-                counter_doc.save(ignore_version=True)
-                frappe.db.commit()  # Commit immediately
-
-                # If save successful, return the number
-                return new_number
-
-            except frappe.DuplicateEntryError:
-                frappe.db.rollback()
-                frappe.log_warning(
-                    f"Attempt {attempt + 1}: Duplicate entry error for {counter_doc_name}. Retrying.", "QMSTicket ORM Counter")
-
-            except Exception as e:
-                frappe.db.rollback()
-                frappe.log_error(frappe.get_traceback(
-                ), f"QMS Ticket Counter Error (ORM Attempt {attempt + 1})")
-                # Перекидаємо помилку, щоб її зловили у методі autoname
-                raise frappe._(
-                    "Не вдалося оновити лічильник талонів: {0}").format(e)
-
-            # Wait before retrying
-            time.sleep(0.1 + (0.1 * attempt))  # Progressive delay
-
-        # If loop finishes without returning
-        frappe.db.rollback()
-        # Перекидаємо помилку, щоб її зловили у методі autoname
-        raise _(
-            f"Не вдалося отримати унікальний номер талону для офісу {self.office} ({current_date_str}) після {max_attempts} спроб (ORM метод). Можливе високе навантаження."
-        )
+        return allocate_next_number(self.office, current_date_str)
 
     def _get_common_realtime_data_fields(self):
-        """Збирає загальні поля для WebSocket повідомлень."""
-        service_name = self.get(
-            "service_name")  # Спробувати отримати, якщо поле додано в doc
-        if not service_name and self.service:
-            service_name = frappe.db.get_value(
-                "QMS Service", self.service, "service_name")
-
-        # Спробувати отримати, якщо поле додано в doc
-        service_point_name = self.get("service_point_name")
-        if not service_point_name and self.service_point:
-            service_point_name = frappe.db.get_value(
-                "QMS Service Point", self.service_point, "point_name")
-
+        """
+        Збирає загальні поля для WebSocket повідомлень.
+        Назви послуги та точки вже збережені в талоні (fetch_from), тож запитів до БД немає.
+        """
         # Подумайте, чи потрібен service_point_number і як його отримати, якщо він відрізняється від point_name
         service_point_number = self.get(
             "service_point_number")  # або інша логіка отримання
@@ -273,9 +322,9 @@ class QMSTicket(Document):
             "office": self.office,
             "status": self.status,
             "service": self.service,
-            "service_name": service_name or frappe._("Unknown Service"),
+            "service_name": self.service_name or _("Unknown Service"),
             "service_point": self.service_point,
-            "service_point_name": service_point_name or (_("N/A") if self.status == "Called" or self.status == "Serving" else None),
+            "service_point_name": self.service_point_name or (_("N/A") if self.status == "Called" or self.status == "Serving" else None),
             "service_point_number": service_point_number,  # Може бути None
             "operator": self.operator,
             "call_time": str(self.call_time) if self.call_time else None,
@@ -303,16 +352,34 @@ class QMSTicket(Document):
         frappe.logger("qms_realtime").info(
             f"QMSTicket {self.name}: Publishing event '{event_name_for_socket}' to room '{room}' with payload: {message_payload}")
 
-        frappe.publish_realtime(
-            event=event_name_for_socket,
-            message=message_payload,
-            # room=room,
-            after_commit=True
-        )
+        publish_office_event(self.office, event_name_for_socket, message_payload)
+
+
+def _minutes_between(start, end) -> int:
+    return max(round(time_diff_in_seconds(end, start) / 60), 0)
+
+
+def on_doctype_update():
+    """Викликається Frappe після синхронізації DocType (встановлення та міграції)."""
+    add_qms_ticket_indexes()
+    # Нові колонки талону мають з'явитись і в поданні історії
+    create_history_view()
+
+
+def add_qms_ticket_indexes():
+    for index_name, fields in QMS_TICKET_INDEXES.items():
+        frappe.db.add_index("QMS Ticket", fields, index_name=index_name)
 
 
-def office_room(office_id: str):
+def update_denormalized_names(link_field: str, link_value: str, name_field: str, new_name: str):
     """
-    Генерує ім'я кімнати для WebSocket на основі ID офісу.
+    Оновлює збережену назву (service_name / service_point_name) в усіх талонах,
+    що посилаються на перейменовану послугу чи точку. Викликається з їхніх on_update.
     """
-    return f'qms_office:{office_id}'
+    frappe.db.set_value(
+        "QMS Ticket",
+        {link_field: link_value},
+        name_field,
+        new_name,
+        update_modified=False,
+    )
@@ -0,0 +1,128 @@
+# Copyright (c) 2025, Maxym Sysoiev and contributors
+# For license information, please see license.txt
+
+import time
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, cint, now, now_datetime
+
+# "Гаряча" таблиця QMS Ticket тримає лише останні дні; закриті талони, старші за
+# горизонт, щоночі переносяться сюди пакетами (INSERT ... SELECT + DELETE в одній
+# транзакції). Звіти читають обидві таблиці через подання HISTORY_VIEW.
+#
+# site_config.json: qms_ticket_archive_days - горизонт архівації в днях (за замовчуванням 3)
+DEFAULT_ARCHIVE_AFTER_DAYS = 3
+ARCHIVE_BATCH_SIZE = 1000
+# Запас до тайм-ауту черги default; решту перенесе наступний запуск
+MAX_RUN_SECONDS = 240
+
+CLOSED_STATUSES = ("Completed", "NoShow", "Cancelled")
+HISTORY_VIEW = "qms_ticket_history"
+
+ARCHIVE_INDEXES = {
+	"office_status_creation_index": ["office", "status", "creation"],
+	"office_issue_time_index": ["office", "issue_time"],
+	"office_creation_index": ["office", "creation"],
+}
+
+
+class QMSTicketArchive(Document):
+	pass
+
+
+def on_doctype_update():
+	for index_name, fields in ARCHIVE_INDEXES.items():
+		frappe.db.add_index("QMS Ticket Archive", fields, index_name=index_name)
+	create_history_view()
+
+
+def get_archive_cutoff(days: int | None = None) -> str:
+	if days is None:
+		days = cint(frappe.conf.get("qms_ticket_archive_days") or DEFAULT_ARCHIVE_AFTER_DAYS)
+	return add_days(now_datetime(), -max(days, 1)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def archive_closed_tickets(days: int | None = None, batch_size: int = ARCHIVE_BATCH_SIZE,
+		max_seconds: float = MAX_RUN_SECONDS) -> int:
+	"""
+	Переносить закриті талони, створені раніше за горизонт, в архів. Кожен пакет -
+	окрема транзакція. Хуки QMS Ticket не викликаються: закриті талони вже не в
+	Redis-черзі та не на табло; їхні QMS Slot Reservation видаляються в тій самій транзакції. Повертає кількість перенесених талонів.
+	"""
+	cutoff = get_archive_cutoff(days)
+	deadline = time.monotonic() + max_seconds
+	columns = get_shared_columns()
+	moved = 0
+
+	while time.monotonic() < deadline:
+		count = archive_batch(cutoff, columns, batch_size)
+		frappe.db.commit()
+		moved += count
+		if count < batch_size:
+			break
+
+	return moved
+
+
+def archive_batch(cutoff: str, columns: list, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+	names = frappe.db.sql_list(
+		f"""
+		SELECT name FROM {_quote("tabQMS Ticket")}
+		WHERE status IN %(statuses)s AND creation < %(cutoff)s
+		ORDER BY creation
+		LIMIT %(limit)s
+		""",
+		{"statuses": CLOSED_STATUSES, "cutoff": cutoff, "limit": cint(batch_size)},
+	)
+	if not names:
+		return 0
+
+	column_list = ", ".join(_quote(column) for column in columns)
+	frappe.db.sql(
+		f"""
+		INSERT INTO {_quote("tabQMS Ticket Archive")} ({column_list}, {_quote("archived_on")})
+		SELECT {column_list}, %(now)s FROM {_quote("tabQMS Ticket")}
+		WHERE name IN %(names)s
+		""",
+		{"names": names, "now": now()},
+	)
+	# Місця у слотах закритих талонів уже не потрібні, а посилання на перенесений
+	# талон зламало б валідацію QMS Slot Reservation
+	frappe.db.sql(f"DELETE FROM {_quote('tabQMS Slot Reservation')} WHERE ticket IN %(names)s", {"names": names})
+	frappe.db.sql(f"DELETE FROM {_quote('tabQMS Ticket')} WHERE name IN %(names)s", {"names": names})
+	return len(names)
+
+
+def get_shared_columns() -> list:
+	"""Колонки, спільні для QMS Ticket та архіву (архів може відставати на міграцію)."""
+	archive_columns = set(frappe.db.get_table_columns("QMS Ticket Archive"))
+	return [column for column in frappe.db.get_table_columns("QMS Ticket") if column in archive_columns]
+
+
+def create_history_view():
+	"""
+	Подання HISTORY_VIEW: гарячі та архівні талони з ознакою is_archived. Створюється
+	під час міграції (DDL у MariaDB завершує транзакцію), після синхронізації обох DocType.
+	"""
+	if not (frappe.db.table_exists("QMS Ticket") and frappe.db.table_exists("QMS Ticket Archive")):
+		return
+
+	column_list = ", ".join(_quote(column) for column in get_shared_columns())
+	frappe.db.sql_ddl(
+		f"""
+		CREATE OR REPLACE VIEW {_quote(HISTORY_VIEW)} AS
+		SELECT {column_list}, 0 AS is_archived FROM {_quote("tabQMS Ticket")}
+		UNION ALL
+		SELECT {column_list}, 1 AS is_archived FROM {_quote("tabQMS Ticket Archive")}
+		"""
+	)
+
+
+def history_table():
+	"""Подання HISTORY_VIEW для frappe.qb: frappe.qb.from_(history_table())..."""
+	return frappe.qb.Table(HISTORY_VIEW)
+
+
+def _quote(identifier: str) -> str:
+	return f'"{identifier}"' if frappe.db.db_type == "postgres" else f"`{identifier}`"
@@ -0,0 +1,106 @@
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import uuid
+from datetime import time
+
+import frappe
+from frappe.tests import IntegrationTestCase
+from frappe.utils import add_days, now_datetime
+
+from qms_cherga.qms_cherga.doctype.qms_slot_reservation.qms_slot_reservation import reserve_seat
+from qms_cherga.qms_cherga.doctype.qms_ticket_archive.qms_ticket_archive import (
+	archive_closed_tickets,
+	history_table,
+)
+from qms_cherga.tests.test_api import (
+	create_test_office,
+	create_test_organization,
+	create_test_schedule,
+	create_test_service,
+	create_test_ticket,
+	safe_delete_doc,
+)
+
+# On IntegrationTestCase, the doctype test records and all
+# link-field test record dependencies are recursively loaded
+# Use these module variables to add/remove to/from that list
+EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+
+
+class IntegrationTestQMSTicketArchive(IntegrationTestCase):
+	"""
+	Integration tests for QMSTicketArchive.
+	Use this class for testing interactions between multiple components.
+	"""
+
+	def setUp(self):
+		suffix = uuid.uuid4().hex[:6]
+		organization = create_test_organization(f"Archive Org {suffix}")
+		self.addCleanup(safe_delete_doc, "QMS Organization", organization.name)
+		schedule = create_test_schedule(
+			f"Archive Schedule {suffix}",
+			rules=[{"day_of_week": "Monday", "start_time": time(9, 0), "end_time": time(18, 0)}])
+		self.addCleanup(safe_delete_doc, "QMS Schedule", schedule.name)
+		self.office = create_test_office(organization.name, schedule.name, f"AR{suffix}".upper()).name
+		self.addCleanup(safe_delete_doc, "QMS Office", self.office)
+		self.service = create_test_service(organization.name, f"Archive Service {suffix}").name
+		self.addCleanup(safe_delete_doc, "QMS Service", self.service)
+		self.addCleanup(self._delete_tickets)
+
+	def _delete_tickets(self):
+		frappe.db.delete("QMS Ticket", {"office": self.office})
+		frappe.db.delete("QMS Ticket Archive", {"office": self.office})
+		frappe.db.delete("QMS Slot Reservation", {"office": self.office})
+
+	def _ticket(self, status, age_days):
+		ticket = create_test_ticket(self.office, self.service, status=status)
+		created = add_days(now_datetime(), -age_days)
+		frappe.db.set_value("QMS Ticket", ticket.name, {"creation": created, "issue_time": created},
+			update_modified=False)
+		return ticket.name
+
+	def test_only_old_closed_tickets_are_moved(self):
+		old_closed = [self._ticket("Completed", 10), self._ticket("NoShow", 10), self._ticket("Cancelled", 5)]
+		old_open = self._ticket("Waiting", 10)
+		recent_closed = self._ticket("Completed", 0)
+
+		# Пакети по одному талону - перевіряємо цикл по пакетах
+		moved = archive_closed_tickets(days=3, batch_size=1)
+
+		self.assertGreaterEqual(moved, len(old_closed))
+		for name in old_closed:
+			self.assertFalse(frappe.db.exists("QMS Ticket", name))
+			self.assertTrue(frappe.db.exists("QMS Ticket Archive", name))
+		self.assertEqual(frappe.db.get_value("QMS Ticket Archive", old_closed[0], "service"), self.service)
+		self.assertTrue(frappe.db.get_value("QMS Ticket Archive", old_closed[0], "archived_on"))
+		for name in (old_open, recent_closed):
+			self.assertTrue(frappe.db.exists("QMS Ticket", name))
+			self.assertFalse(frappe.db.exists("QMS Ticket Archive", name))
+
+	def test_history_view_unions_live_and_archive(self):
+		archived = self._ticket("Completed", 10)
+		live = self._ticket("Waiting", 0)
+		archive_closed_tickets(days=3)
+
+		history = history_table()
+		rows = dict(
+			frappe.qb.from_(history)
+			.select(history.name, history.is_archived)
+			.where(history.office == self.office)
+			.run()
+		)
+		self.assertEqual(rows, {archived: 1, live: 0})
+
+	def test_archived_ticket_releases_slot_reservations(self):
+		archived = self._ticket("Completed", 10)
+		live = self._ticket("Waiting", 0)
+		slot_start = add_days(now_datetime(), -10).replace(minute=0, second=0, microsecond=0)
+		reserve_seat(self.office, self.service, slot_start, archived, capacity=2)
+		reserve_seat(self.office, self.service, slot_start, live, capacity=2)
+
+		archive_closed_tickets(days=3)
+
+		self.assertFalse(frappe.db.exists("QMS Slot Reservation", {"ticket": archived}))
+		self.assertTrue(frappe.db.exists("QMS Slot Reservation", {"ticket": live}))
@@ -0,0 +1,239 @@
+# Copyright (c) 2025, Maxym Sysoiev and contributors
+# For license information, please see license.txt
+
+import time
+from datetime import timedelta
+
+import frappe
+from frappe.model.document import Document
+from frappe.query_builder.functions import Min, Sum
+from frappe.utils import add_days, add_to_date, get_datetime, getdate, now, now_datetime
+
+from qms_cherga.qms_cherga.doctype.qms_service_time_summary.qms_service_time_summary import (
+	HISTOGRAM_BOUNDS,
+	histogram_field,
+)
+from qms_cherga.qms_cherga.doctype.qms_ticket_archive.qms_ticket_archive import history_table
+
+# Погодинні агрегати талонів (гаряча таблиця та архів через подання історії).
+# Кожен запуск бере талони, змінені після позначки (watermark), і повністю
+# перераховує дні (офіс + дата видачі), яких вони стосуються: перерахунок дня
+# ідемпотентний, тож зміна статусу чи повторна обробка не подвоює лічильники.
+# Година - початок години видачі талону (creation) у системній часовій зоні.
+# Видалений талон позначка не побачить, тож QMSTicket.on_trash перераховує його день сам.
+WATERMARK_KEY = "qms_analytics_watermark"
+# Талони, змінені в останні секунди, можуть належати ще не закомітованим транзакціям
+SETTLE_SECONDS = 60
+# Вікно позначки за один крок: день змін
+WINDOW_DAYS = 1
+MAX_RUN_SECONDS = 240
+
+HIST_SIZE = len(HISTOGRAM_BOUNDS) + 1
+WAIT_HIST_FIELDS = tuple(f"wait_hist_{i}" for i in range(HIST_SIZE))
+SERVICE_HIST_FIELDS = tuple(f"service_hist_{i}" for i in range(HIST_SIZE))
+COUNT_FIELDS = ("issued", "completed", "no_show", "cancelled", "wait_count", "wait_total_mins",
+	"service_count", "service_total_mins", *WAIT_HIST_FIELDS, *SERVICE_HIST_FIELDS)
+STATUS_FIELDS = {"Completed": "completed", "NoShow": "no_show", "Cancelled": "cancelled"}
+
+GROUP_BY_FIELDS = ("office", "service", "operator", "date", "hour", "hour_of_day")
+REPORT_PERCENTILES = (50, 90)
+
+
+class QMSTicketHourlySummary(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("QMS Ticket Hourly Summary", ["office", "date"], index_name="office_date_index")
+	frappe.db.add_index("QMS Ticket Hourly Summary", ["date"], index_name="date_index")
+
+
+# --- Матеріалізація ---
+
+
+def refresh(until=None, since=None, max_seconds: float = MAX_RUN_SECONDS) -> int:
+	"""
+	Обробляє зміни талонів від позначки до `until` (за замовчуванням - зараз мінус
+	SETTLE_SECONDS) вікнами по WINDOW_DAYS; позначка зберігається після кожного
+	вікна. Явний `since` замінює збережену позначку і не перезаписує її.
+	Повертає кількість перерахованих днів офісів.
+	"""
+	upper = get_datetime(until) if until else add_to_date(now_datetime(), seconds=-SETTLE_SECONDS)
+	persist = since is None
+	watermark = get_watermark() if persist else get_datetime(since)
+	if watermark is None:
+		watermark = _first_modified()
+		if watermark is None:
+			return 0
+		watermark -= timedelta(microseconds=1)
+
+	deadline = time.monotonic() + max_seconds
+	refreshed = 0
+	while watermark < upper and time.monotonic() < deadline:
+		window_end = min(add_days(watermark, WINDOW_DAYS), upper)
+		for office, day in get_changed_days(watermark, window_end):
+			rebuild_day(office, day)
+			refreshed += 1
+		if persist:
+			set_watermark(window_end)
+		frappe.db.commit()
+		watermark = window_end
+
+	return refreshed
+
+
+def get_watermark():
+	value = frappe.db.get_default(WATERMARK_KEY)
+	return get_datetime(value) if value else None
+
+
+def set_watermark(value):
+	frappe.db.set_default(WATERMARK_KEY, get_datetime(value).strftime("%Y-%m-%d %H:%M:%S.%f"))
+
+
+def _first_modified():
+	history = history_table()
+	first = frappe.qb.from_(history).select(Min(history.modified)).run()[0][0]
+	return get_datetime(first) if first else None
+
+
+def get_changed_days(after, until) -> set:
+	"""(офіс, дата видачі) талонів, змінених у проміжку (after, until]."""
+	history = history_table()
+	rows = (
+		frappe.qb.from_(history)
+		.select(history.office, history.creation)
+		.where((history.modified > after) & (history.modified <= until))
+		.run()
+	)
+	return {(office, getdate(creation)) for office, creation in rows}
+
+
+def rebuild_day(office: str, day, exclude: str | None = None):
+	"""
+	Замінює погодинні рядки офісу за день агрегатами з історії талонів.
+	`exclude` - талон, що видаляється в поточній транзакції (QMSTicket.on_trash).
+	"""
+	day = getdate(day)
+	history = history_table()
+	query = (
+		frappe.qb.from_(history)
+		.select(history.service, history.operator, history.status, history.creation, history.call_time,
+			history.start_service_time, history.actual_wait_time_mins, history.actual_service_time_mins)
+		.where((history.office == office) & (history.creation >= day) & (history.creation < add_days(day, 1)))
+	)
+	if exclude:
+		query = query.where(history.name != exclude)
+	tickets = query.run(as_dict=True)
+
+	frappe.db.delete("QMS Ticket Hourly Summary", {"office": office, "date": day})
+	rows = aggregate(tickets)
+	if not rows:
+		return
+
+	timestamp = now()
+	user = frappe.session.user if getattr(frappe.local, "session", None) else "Administrator"
+	fields = ["name", "office", "service", "operator", "hour", "date", "hour_of_day", *COUNT_FIELDS,
+		"creation", "modified", "owner", "modified_by", "docstatus", "idx"]
+	values = [
+		(frappe.generate_hash(length=20), office, service, operator, hour, day, hour.hour,
+			*(counts[field] for field in COUNT_FIELDS), timestamp, timestamp, user, user, 0, 0)
+		for (service, operator, hour), counts in sorted(rows.items(), key=lambda item: item[0][2])
+	]
+	frappe.db.bulk_insert("QMS Ticket Hourly Summary", fields, values)
+
+
+def aggregate(tickets: list) -> dict:
+	"""{(послуга, оператор, година): лічильники} для талонів одного офісу."""
+	rows = {}
+	for ticket in tickets:
+		hour = get_datetime(ticket["creation"]).replace(minute=0, second=0, microsecond=0)
+		key = (ticket["service"], ticket["operator"] or None, hour)
+		counts = rows.get(key)
+		if counts is None:
+			counts = rows[key] = dict.fromkeys(COUNT_FIELDS, 0)
+
+		counts["issued"] += 1
+		if ticket["status"] in STATUS_FIELDS:
+			counts[STATUS_FIELDS[ticket["status"]]] += 1
+		if ticket["call_time"]:
+			wait = ticket["actual_wait_time_mins"] or 0
+			counts["wait_count"] += 1
+			counts["wait_total_mins"] += wait
+			counts[f"wait_{histogram_field(wait)}"] += 1
+		if ticket["status"] == "Completed" and ticket["start_service_time"]:
+			service_mins = ticket["actual_service_time_mins"] or 0
+			counts["service_count"] += 1
+			counts["service_total_mins"] += service_mins
+			counts[f"service_{histogram_field(service_mins)}"] += 1
+	return rows
+
+
+# --- Звіти ---
+
+
+def get_report(from_date, to_date=None, group_by=("office",), office=None, service=None, operator=None) -> list:
+	"""
+	Сумує погодинні рядки за діапазон дат, групуючи за `group_by` (підмножина
+	GROUP_BY_FIELDS). Середні та перцентилі рахуються з сум і гістограм.
+	"""
+	summary = frappe.qb.DocType("QMS Ticket Hourly Summary")
+	query = (
+		frappe.qb.from_(summary)
+		.select(*(summary.field(field) for field in group_by),
+			*(Sum(summary.field(field)).as_(field) for field in COUNT_FIELDS))
+		.where(summary.date >= getdate(from_date))
+		.where(summary.date <= getdate(to_date or from_date))
+	)
+	for field, value in (("office", office), ("service", service), ("operator", operator)):
+		if value:
+			query = query.where(summary.field(field) == value)
+	if group_by:
+		query = query.groupby(*(summary.field(field) for field in group_by)).orderby(*(summary.field(field) for field in group_by))
+
+	return [summarize_row(row, group_by) for row in query.run(as_dict=True)]
+
+
+def summarize_row(row, group_by=()) -> dict:
+	wait_hist = [int(row.get(field) or 0) for field in WAIT_HIST_FIELDS]
+	service_hist = [int(row.get(field) or 0) for field in SERVICE_HIST_FIELDS]
+	wait_count = int(row.get("wait_count") or 0)
+	service_count = int(row.get("service_count") or 0)
+
+	result = {field: row.get(field) for field in group_by}
+	result.update({
+		"issued": int(row.get("issued") or 0),
+		"completed": int(row.get("completed") or 0),
+		"no_show": int(row.get("no_show") or 0),
+		"cancelled": int(row.get("cancelled") or 0),
+		"avg_wait_mins": round((row.get("wait_total_mins") or 0) / wait_count, 2) if wait_count else None,
+		"avg_service_mins": round((row.get("service_total_mins") or 0) / service_count, 2) if service_count else None,
+		"wait_histogram": wait_hist,
+		"service_histogram": service_hist,
+	})
+	for pct in REPORT_PERCENTILES:
+		result[f"p{pct}_wait_mins"] = histogram_percentile(wait_hist, pct)
+		result[f"p{pct}_service_mins"] = histogram_percentile(service_hist, pct)
+	return result
+
+
+def histogram_percentile(histogram: list, pct: float):
+	"""
+	Оцінка перцентиля з гістограми (межі HISTOGRAM_BOUNDS): лінійна інтерполяція
+	всередині кошика; для відкритого останнього кошика - його нижня межа.
+	"""
+	total = sum(histogram)
+	if not total:
+		return None
+	target = pct / 100 * total
+	cumulative = 0
+	lower = 0
+	for i, count in enumerate(histogram):
+		upper = HISTOGRAM_BOUNDS[i] if i < len(HISTOGRAM_BOUNDS) else None
+		if count and cumulative + count >= target:
+			if upper is None:
+				return lower
+			return round(lower + (upper - lower) * (target - cumulative) / count, 1)
+		cumulative += count
+		lower = upper if upper is not None else lower
+	return lower
@@ -0,0 +1,139 @@
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import uuid
+from datetime import time
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+from frappe.utils import add_to_date, getdate, now_datetime
+
+from qms_cherga.qms_cherga.doctype.qms_ticket_hourly_summary.qms_ticket_hourly_summary import (
+	get_report,
+	histogram_percentile,
+	refresh,
+)
+from qms_cherga.tests.test_api import (
+	create_test_office,
+	create_test_organization,
+	create_test_schedule,
+	create_test_service,
+	create_test_ticket,
+	safe_delete_doc,
+)
+
+# On IntegrationTestCase, the doctype test records and all
+# link-field test record dependencies are recursively loaded
+# Use these module variables to add/remove to/from that list
+EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+
+
+class UnitTestQMSTicketHourlySummary(UnitTestCase):
+	"""
+	Unit tests for QMSTicketHourlySummary.
+	Use this class for testing individual functions and methods.
+	"""
+
+	def test_histogram_percentile(self):
+		# Межі кошиків: 5, 10, 15, 30, 60
+		self.assertIsNone(histogram_percentile([0, 0, 0, 0, 0, 0], 50))
+		self.assertEqual(histogram_percentile([4, 0, 0, 0, 0, 0], 50), 2.5)
+		self.assertEqual(histogram_percentile([2, 2, 0, 0, 0, 0], 90), 9.0)
+		# Відкритий останній кошик - його нижня межа
+		self.assertEqual(histogram_percentile([0, 0, 0, 0, 0, 3], 90), 60)
+
+
+class IntegrationTestQMSTicketHourlySummary(IntegrationTestCase):
+	"""
+	Integration tests for QMSTicketHourlySummary.
+	Use this class for testing interactions between multiple components.
+	"""
+
+	def setUp(self):
+		suffix = uuid.uuid4().hex[:6]
+		organization = create_test_organization(f"Analytics Org {suffix}")
+		self.addCleanup(safe_delete_doc, "QMS Organization", organization.name)
+		schedule = create_test_schedule(
+			f"Analytics Schedule {suffix}",
+			rules=[{"day_of_week": "Monday", "start_time": time(9, 0), "end_time": time(18, 0)}])
+		self.addCleanup(safe_delete_doc, "QMS Schedule", schedule.name)
+		self.office = create_test_office(organization.name, schedule.name, f"AN{suffix}".upper()).name
+		self.addCleanup(safe_delete_doc, "QMS Office", self.office)
+		self.service = create_test_service(organization.name, f"Analytics Service {suffix}").name
+		self.addCleanup(safe_delete_doc, "QMS Service", self.service)
+		self.addCleanup(self._delete_rows)
+
+		self.hour = now_datetime().replace(minute=0, second=0, microsecond=0)
+		# Явна позначка: збережена позначка сайту не змінюється
+		self.since = add_to_date(now_datetime(), minutes=-1)
+
+	def _delete_rows(self):
+		frappe.db.delete("QMS Ticket", {"office": self.office})
+		frappe.db.delete("QMS Ticket Hourly Summary", {"office": self.office})
+
+	def _ticket(self, status, wait_mins=None, service_mins=None):
+		ticket = create_test_ticket(self.office, self.service, status=status)
+		values = {"creation": self.hour}
+		if wait_mins is not None:
+			values.update(call_time=add_to_date(self.hour, minutes=wait_mins), actual_wait_time_mins=wait_mins)
+		if service_mins is not None:
+			values.update(start_service_time=add_to_date(self.hour, minutes=wait_mins),
+				actual_service_time_mins=service_mins)
+		frappe.db.set_value("QMS Ticket", ticket.name, values, update_modified=False)
+		return ticket.name
+
+	def _hourly_rows(self):
+		return frappe.get_all("QMS Ticket Hourly Summary",
+			filters={"office": self.office},
+			fields=["service", "hour", "hour_of_day", "issued", "completed", "no_show", "wait_count",
+				"wait_total_mins", "service_count"])
+
+	def test_refresh_recomputes_changed_days(self):
+		self._ticket("Completed", wait_mins=4, service_mins=6)
+		self._ticket("Completed", wait_mins=12, service_mins=8)
+		waiting = self._ticket("Waiting")
+
+		refresh(until=now_datetime(), since=self.since)
+		rows = self._hourly_rows()
+		self.assertEqual(len(rows), 1)
+		row = rows[0]
+		self.assertEqual(row.service, self.service)
+		self.assertEqual(row.hour, self.hour)
+		self.assertEqual(row.hour_of_day, self.hour.hour)
+		self.assertEqual((row.issued, row.completed, row.no_show), (3, 2, 0))
+		self.assertEqual((row.wait_count, row.wait_total_mins, row.service_count), (2, 16, 2))
+
+		# Зміна статусу перераховує день, а не додає рядок повторно
+		frappe.db.set_value("QMS Ticket", waiting, "status", "NoShow")
+		refresh(until=now_datetime(), since=self.since)
+		rows = self._hourly_rows()
+		self.assertEqual(len(rows), 1)
+		self.assertEqual((rows[0].issued, rows[0].completed, rows[0].no_show), (3, 2, 1))
+
+	def test_report_groups_by_service_with_percentiles(self):
+		for wait in (2, 4, 7, 12):
+			self._ticket("Completed", wait_mins=wait, service_mins=3)
+		refresh(until=now_datetime(), since=self.since)
+
+		report = get_report(getdate(self.hour), group_by=["service"], office=self.office)
+		self.assertEqual(len(report), 1)
+		row = report[0]
+		self.assertEqual(row["service"], self.service)
+		self.assertEqual((row["issued"], row["completed"]), (4, 4))
+		self.assertEqual(row["avg_wait_mins"], 6.25)
+		self.assertEqual(row["avg_service_mins"], 3)
+		self.assertEqual(row["wait_histogram"], [2, 1, 1, 0, 0, 0])
+		self.assertEqual(row["p50_wait_mins"], 5.0)
+		self.assertEqual(row["p50_service_mins"], 2.5)
+
+	def test_deleted_ticket_is_subtracted(self):
+		self._ticket("Completed", wait_mins=4, service_mins=6)
+		deleted = self._ticket("Waiting")
+		refresh(until=now_datetime(), since=self.since)
+		self.assertEqual(self._hourly_rows()[0].issued, 2)
+
+		frappe.delete_doc("QMS Ticket", deleted, ignore_permissions=True, force=True)
+		rows = self._hourly_rows()
+		self.assertEqual(len(rows), 1)
+		self.assertEqual((rows[0].issued, rows[0].completed), (1, 1))
@@ -0,0 +1,25 @@
+// Обробники socket.io, які Frappe підключає з qms_cherga/realtime/handlers.js.
+// Дозволяють клієнтам (кіоск, табло, оператор) приєднуватися до кімнати свого офісу,
+// куди бекенд публікує події через qms_cherga.utils.realtime.publish_office_event.
+
+const OFFICE_ROOM_PREFIX = "qms_office:";
+
+function qms_handlers(socket) {
+	socket.on("join_room", (room) => {
+		if (typeof room !== "string" || !room.startsWith(OFFICE_ROOM_PREFIX)) {
+			socket.emit("room_join_error", { room, error: "Invalid room" });
+			return;
+		}
+		socket.join(room);
+		socket.emit("room_joined", room);
+	});
+
+	socket.on("leave_room", (room) => {
+		if (typeof room === "string" && room.startsWith(OFFICE_ROOM_PREFIX)) {
+			socket.leave(room);
+			socket.emit("room_left", room);
+		}
+	});
+}
+
+module.exports = qms_handlers;
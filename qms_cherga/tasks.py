@@ -0,0 +1,122 @@
+import frappe
+from frappe.utils import add_days, get_system_timezone, now_datetime, today
+
+from qms_cherga.qms_cherga.doctype.qms_daily_counter.qms_daily_counter import (
+    compact_counters,
+    precreate_counters,
+)
+from qms_cherga.qms_cherga.doctype.qms_schedule.qms_schedule import get_intervals_for_date, resolve_timezone
+from qms_cherga.qms_cherga.doctype.qms_ticket_archive.qms_ticket_archive import archive_closed_tickets
+from qms_cherga.qms_cherga.doctype.qms_ticket_hourly_summary.qms_ticket_hourly_summary import (
+    refresh as refresh_hourly_summary,
+)
+from qms_cherga.utils import live_queue
+from qms_cherga.utils.bulk_transitions import bulk_transition
+from qms_cherga.utils.office_context import get_office_context
+
+
+def sweep_closed_offices():
+    """
+    Планувальник (hooks.py, кожні 15 хвилин): прибирає талони офісів, що вже
+    закрились. Викликані, але не обслужені - NoShow; очікуючі та відкладені - Cancelled.
+    Талони на обслуговуванні оператор завершує сам.
+    """
+    for office in frappe.get_all("QMS Office", fields=["name"]):
+        try:
+            sweep_office(office)
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(frappe.get_traceback(), f"QMS End Of Day Sweep Error for Office {office.name}")
+
+
+def sweep_office(office) -> dict:
+    """
+    Поки офіс працює, прибираються лише талони попередніх днів; після закінчення
+    останнього робочого інтервалу дня (або у неробочий день) - усі талони,
+    створені до цього моменту.
+    """
+    cutoff = get_sweep_cutoff(office)
+    return {
+        "NoShow": bulk_transition(office.name, "NoShow", ("Called",), created_before=cutoff),
+        "Cancelled": bulk_transition(office.name, "Cancelled", ("Waiting", "Postponed"), created_before=cutoff),
+    }
+
+
+def get_sweep_cutoff(office):
+    """Межа прибирання у системній часовій зоні (як зберігається creation)."""
+    system_tz = resolve_timezone(get_system_timezone())
+    office_ctx = get_office_context(office.name)
+    now_local = now_datetime().replace(tzinfo=system_tz).astimezone(office_ctx.tz)
+    compiled = office_ctx.compiled_schedule()
+
+    intervals = get_intervals_for_date(compiled, now_local.date()) if compiled else []
+    seconds = now_local.hour * 3600 + now_local.minute * 60 + now_local.second
+    if intervals and seconds < intervals[-1][1]:
+        # Офіс ще працюватиме сьогодні - лише залишки попередніх днів
+        cutoff_local = now_local.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        cutoff_local = now_local
+
+    return cutoff_local.astimezone(system_tz).replace(tzinfo=None)
+
+
+def archive_old_tickets():
+    """
+    Планувальник (hooks.py, щоночі): переносить закриті талони, старші за горизонт
+    (qms_ticket_archive_days), у QMS Ticket Archive, щоб гаряча таблиця лишалась малою.
+    """
+    try:
+        moved = archive_closed_tickets()
+    except Exception:
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(), "QMS Ticket Archive Error")
+        return
+    frappe.logger("qms_archive").info(f"Archived {moved} closed QMS tickets")
+
+
+def prepare_daily_counters():
+    """
+    Планувальник (hooks.py, щовечора): рядки лічильників талонів на сьогодні
+    (якщо завдання пропустило запуск) і на завтра, та згортання старих рядків.
+    """
+    try:
+        offices = frappe.get_all("QMS Office", pluck="name")
+        for date_str in (today(), add_days(today(), 1)):
+            precreate_counters(date_str, offices)
+        compacted = compact_counters()
+        frappe.db.commit()
+    except Exception:
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(), "QMS Daily Counter Preparation Error")
+        return
+    frappe.logger("qms_counters").info(f"Prepared daily counters for {len(offices)} offices, compacted {compacted} rows")
+
+
+def refresh_ticket_analytics():
+    """
+    Планувальник (hooks.py, кожні 10 хвилин): перераховує погодинну аналітику
+    (QMS Ticket Hourly Summary) для днів, талони яких змінились після позначки.
+    """
+    try:
+        refresh_hourly_summary()
+    except Exception:
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(), "QMS Ticket Analytics Refresh Error")
+
+
+def repair_live_queues():
+    """
+    Планувальник (hooks.py, кожні 5 хвилин): звіряє черги Redis із БД і перебудовує
+    чергу офісу при розбіжностях (напр., втрачена синхронізація після коміту).
+    """
+    for office in frappe.get_all("QMS Office", pluck="name"):
+        try:
+            report = live_queue.check_consistency(office, repair=True)
+        except Exception:
+            frappe.log_error(frappe.get_traceback(), f"QMS Live Queue Repair Error for Office {office}")
+            continue
+        if not report["consistent"]:
+            frappe.logger("qms_live_queue").warning(
+                f"Rebuilt live queue for office {office}: {len(report['missing'])} missing, "
+                f"{len(report['extra'])} extra, {len(report['mismatched'])} mismatched")
@@ -14,9 +14,16 @@ from qms_cherga.api import (
     create_live_queue_ticket,
     call_next_visitor,
     is_office_open,  # Ця функція не повертає стандартний словник, тести залишаються
+    get_kiosk_bootstrap,
     get_kiosk_services,
-    get_display_data
+    get_display_data,
+    get_live_data,
+    get_service_time_stats,
+    start_service,
+    finish_service
 )
+from qms_cherga.utils import live_queue, live_stats, office_context, operator_profile, wait_predictor
+from qms_cherga.utils.office_context import get_office_context
 
 
 def safe_delete_doc(doctype, name):
@@ -121,9 +128,9 @@ def create_test_ticket(office_name, service_name, status="Waiting", **kwargs):
     ticket.issue_time = now_datetime()
     for key, value in kwargs.items():
         ticket.set(key, value)
-        ticket.insert(ignore_permissions=True)
-        ticket.reload()
-        return ticket
+    ticket.insert(ignore_permissions=True)
+    ticket.reload()
+    return ticket
 
 # --- Основний клас тестів ---
 
@@ -509,6 +516,186 @@ class TestQMSApi(FrappeTestCase):
         self.assertEqual(response.get("data", {}).get(
             "ticket_info", {}).get("name"), t_first.name)
 
+    def test_operator_profile_cache(self):
+        operator_profile.clear_cache()
+        before = operator_profile.get_cache_stats()
+
+        profile = operator_profile.get_profile(self.test_user.name)
+        self.assertEqual(profile["skills"], [self.service1.name])
+        self.assertEqual(profile["office"], self.office.name)
+        self.assertIn(self.service_point.name, [p["name"] for p in profile["service_points"]])
+
+        with self.assertQueryCount(0):
+            self.assertEqual(operator_profile.get_profile(self.test_user.name), profile)
+
+        stats = operator_profile.get_cache_stats()
+        self.assertEqual(stats["misses"] - before["misses"], 1)
+        self.assertEqual(stats["hits"] - before["hits"], 1)
+
+        # Нова точка обслуговування офісу скидає кеш профілів
+        frappe.set_user("Administrator")
+        point = create_test_service_point(self.office.name, f"API Вікно {uuid.uuid4().hex[:4]}")
+        self.addCleanup(safe_delete_doc, "QMS Service Point", point.name)
+        profile = operator_profile.get_profile(self.test_user.name)
+        self.assertIn(point.name, [p["name"] for p in profile["service_points"]])
+
+    def test_operator_profile_missing_entry_expires(self):
+        user = f"missing-{uuid.uuid4().hex[:8]}@example.com"
+        with freeze_time("2025-04-30 08:05:00") as frozen:
+            self.assertIsNone(operator_profile.get_profile(user))
+            with self.assertQueryCount(0):
+                self.assertIsNone(operator_profile.get_profile(user))
+
+            # Після NEGATIVE_TTL_SEC профіль знову шукається в БД
+            misses = operator_profile.get_cache_stats()["misses"]
+            frozen.tick(operator_profile.NEGATIVE_TTL_SEC)
+            self.assertIsNone(operator_profile.get_profile(user))
+            self.assertEqual(operator_profile.get_cache_stats()["misses"], misses + 1)
+
+    @freeze_time("2025-04-30 08:05:00")
+    def test_live_queue_consistency_and_rebuild(self):
+        frappe.db.delete(
+            "QMS Ticket", {"office": self.office.name, "status": "Waiting"})
+        live_queue.rebuild_office(self.office.name)
+        ticket = create_test_ticket(
+            self.office.name, self.service1.name, status="Waiting")
+        self.addCleanup(safe_delete_doc, "QMS Ticket", ticket.name)
+        frappe.db.commit()
+
+        # on_update тримає рушій у синхроні з БД (після коміту)
+        self.assertTrue(live_queue.check_consistency(
+            self.office.name)["consistent"])
+        self.assertEqual(live_queue.get_next_candidates(
+            self.office.name, [self.service1.name])[0][0], ticket.name)
+
+        # Зміни в обхід ORM виявляються перевіркою та виправляються перебудовою
+        frappe.db.set_value("QMS Ticket", ticket.name,
+                            "status", "Cancelled", update_modified=False)
+        report = live_queue.check_consistency(self.office.name, repair=True)
+        self.assertFalse(report["consistent"])
+        self.assertIn(ticket.name, report["extra"])
+        self.assertTrue(live_queue.check_consistency(
+            self.office.name)["consistent"])
+
+    def test_live_queue_rebuild_keeps_concurrent_sync(self):
+        frappe.db.delete(
+            "QMS Ticket", {"office": self.office.name, "status": "Waiting"})
+        live_queue.rebuild_office(self.office.name)
+        ticket = create_test_ticket(
+            self.office.name, self.service1.name, status="Waiting")
+        self.addCleanup(safe_delete_doc, "QMS Ticket", ticket.name)
+
+        # Талон синхронізується після того, як перебудова вже прочитала БД
+        read_waiting = live_queue._get_waiting_from_db
+
+        def racing_read(office):
+            rows = [row for row in read_waiting(office) if row.name != ticket.name]
+            live_queue.sync_ticket(ticket.name, office, ticket.service, "Waiting",
+                                   ticket.priority, ticket.creation)
+            return rows
+
+        live_queue._get_waiting_from_db = racing_read
+        self.addCleanup(setattr, live_queue, "_get_waiting_from_db", read_waiting)
+        live_queue.rebuild_office(self.office.name)
+
+        self.assertEqual(live_queue.queue_position(
+            self.office.name, self.service1.name, ticket.name), 0)
+
+    @freeze_time("2025-04-30 08:05:00")
+    def test_ticket_keeps_service_and_point_names(self):
+        frappe.set_user("Administrator")
+        ticket = create_test_ticket(
+            self.office.name, self.service1.name, status="Called", service_point=self.service_point.name)
+        self.addCleanup(safe_delete_doc, "QMS Ticket", ticket.name)
+        self.assertEqual(ticket.service_name, self.service1.service_name)
+        self.assertEqual(ticket.service_point_name,
+                         self.service_point.point_name)
+
+        # Публікація події не звертається до БД
+        with self.assertQueryCount(0):
+            ticket.publish_event("qms_ticket_updated_doc", ticket.status)
+
+        # Перейменування точки оновлює назву в уже створених талонах
+        point = frappe.get_doc("QMS Service Point", self.service_point.name)
+        original_name = point.point_name
+        point.point_name = "API Вікно 1 (нове)"
+        point.save(ignore_permissions=True)
+        self.addCleanup(frappe.db.set_value, "QMS Service Point",
+                        point.name, "point_name", original_name)
+        self.assertEqual(frappe.db.get_value(
+            "QMS Ticket", ticket.name, "service_point_name"), "API Вікно 1 (нове)")
+
+    @freeze_time("2025-04-30 08:05:00")
+    def test_get_live_data_query_count_and_invalidation(self):
+        frappe.get_cached_doc("QMS Office", self.office.name)
+        live_stats.invalidate(self.office.name)
+
+        # Холодний кеш: один GROUP BY та один запит відкладених талонів
+        with self.assertQueryCount(2):
+            cold = get_live_data(office=self.office.name, as_dict=True)
+        # Теплий кеш: жодного запиту
+        with self.assertQueryCount(0):
+            warm = get_live_data(office=self.office.name, as_dict=True)
+        self.assertEqual(warm["stats"], cold["stats"])
+
+        # Перехід талону інвалідує кеш
+        ticket = create_test_ticket(
+            self.office.name, self.service1.name, status="Waiting")
+        self.addCleanup(safe_delete_doc, "QMS Ticket", ticket.name)
+        fresh = get_live_data(office=self.office.name, as_dict=True)
+        self.assertEqual(fresh["stats"]["waiting"],
+                         cold["stats"]["waiting"] + 1)
+
+        postponed = create_test_ticket(
+            self.office.name, self.service1.name, status="Postponed")
+        self.addCleanup(safe_delete_doc, "QMS Ticket", postponed.name)
+        fresh = get_live_data(office=self.office.name, as_dict=True)
+        self.assertIn(postponed.name, [t.name for t in fresh["postponed_tickets"]])
+        self.assertEqual(fresh["postponed_tickets"][0].service_name,
+                         self.service1.service_name)
+
+    def test_transitions_set_times_and_update_daily_summary(self):
+        frappe.set_user("Administrator")
+        frappe.db.delete("QMS Service Time Summary", {"office": self.office.name})
+        frappe.cache().hdel(wait_predictor.EWMA_CACHE_KEY,
+                            f"{self.office.name}::{self.service1.name}")
+        with freeze_time("2025-04-30 08:05:00") as frozen:
+            ticket = create_test_ticket(
+                self.office.name, self.service1.name, status="Waiting")
+            self.addCleanup(safe_delete_doc, "QMS Ticket", ticket.name)
+
+            frozen.move_to("2025-04-30 08:17:00")
+            ticket.status = "Called"
+            ticket.call_time = now_datetime()
+            ticket.operator = self.test_user.name
+            ticket.save(ignore_permissions=True)
+            self.assertEqual(ticket.actual_wait_time_mins, 12)
+
+            frappe.set_user(self.test_user.name)
+            frozen.move_to("2025-04-30 08:20:00")
+            start_service(ticket.name)
+            frozen.move_to("2025-04-30 08:30:00")
+            finish_service(ticket.name)
+
+            self.assertEqual(frappe.db.get_value(
+                "QMS Ticket", ticket.name, "actual_service_time_mins"), 10)
+
+            stats = get_service_time_stats(self.office.name)["data"]["services"][self.service1.name]
+            self.assertEqual(stats["wait"]["count"], 1)
+            self.assertEqual(stats["wait"]["mean"], 12)
+            self.assertEqual(stats["service"]["mean"], 10)
+
+            # Завершення оновлює EWMA тривалості; новий талон отримує оцінку
+            self.assertEqual(wait_predictor.get_service_mins(
+                self.office.name, self.service1.name), 10)
+            frappe.set_user("Administrator")
+            ahead = live_queue.queue_length(self.office.name, self.service1.name)
+            next_ticket = create_test_ticket(
+                self.office.name, self.service1.name, status="Waiting")
+            self.addCleanup(safe_delete_doc, "QMS Ticket", next_ticket.name)
+            self.assertEqual(next_ticket.estimated_wait_time_mins, wait_predictor.predict_wait_mins(
+                ahead, 10, wait_predictor.get_on_shift_operators(self.office.name, self.service1.name)))
+
     # --- Тести для get_kiosk_services (ОНОВЛЕНО) ---
 
     @freeze_time("2025-04-30 08:05:00")  # Робочий час
@@ -568,6 +755,53 @@ class TestQMSApi(FrappeTestCase):
         self.assertEqual(len(kiosk_data.get("categories", [])), 0)
         self.assertEqual(len(kiosk_data.get("services_no_category", [])), 0)
 
+    @freeze_time("2025-04-30 08:05:00")  # Середа 11:05 за Києвом, перерва о 13:00
+    def test_get_kiosk_bootstrap_cached_and_invalidated(self):
+        frappe.set_user("Guest")
+        get_kiosk_bootstrap(office=self.office.name)  # прогрів кешу
+
+        with self.assertQueryCount(0):
+            response = get_kiosk_bootstrap(office=self.office.name)
+
+        self.assertEqual(response.get("status"), "success", response)
+        data = response["data"]
+        self.assertEqual(data["office"]["office_name"], self.office.office_name)
+        self.assertEqual(data["office"]["organization_name"], self.organization.organization_name)
+        self.assertTrue(data["is_open"])
+        self.assertEqual(data["next_transition"]["type"], "close")
+        self.assertTrue(data["next_transition"]["at"].startswith("2025-04-30T13:00:00"))
+        self.assertEqual([s["id"] for s in data["services_no_category"]], [self.service1.name])
+
+        # Зміна послуги скидає кеш усіх кіосків
+        frappe.set_user("Administrator")
+        service = frappe.get_doc("QMS Service", self.service1.name)
+        service.icon = "kiosk-bootstrap-icon"
+        service.save(ignore_permissions=True)
+        self.addCleanup(frappe.db.set_value, "QMS Service", self.service1.name, "icon", self.service1.icon)
+
+        data = get_kiosk_bootstrap(office=self.office.name)["data"]
+        self.assertEqual(data["services_no_category"][0]["icon"], "kiosk-bootstrap-icon")
+
+    def test_office_context_memoized_and_invalidated(self):
+        office_context.invalidate(self.office.name)
+        ctx = get_office_context(self.office.name)
+        self.assertEqual(ctx.schedule, self.schedule.name)
+        self.assertEqual(ctx.tz.key, self.test_timezone)
+        self.assertEqual(ctx.organization_name, self.organization.organization_name)
+
+        # Наступний запит (новий frappe.local) бере контекст з кешу процесу
+        frappe.local.qms_office_context = {}
+        with self.assertQueryCount(0):
+            self.assertIs(get_office_context(self.office.name), ctx)
+        self.assertIsNone(get_office_context("no-such-office"))
+
+        office = frappe.get_doc("QMS Office", self.office.name)
+        office.display_message_text = "Office context test"
+        office.save(ignore_permissions=True)
+        self.addCleanup(frappe.db.set_value, "QMS Office", self.office.name, "display_message_text", None)
+        self.addCleanup(office_context.invalidate, self.office.name)
+        self.assertEqual(get_office_context(self.office.name).display_message_text, "Office context test")
+
     # --- Тести для get_display_data (ОНОВЛЕНО) ---
 
     @freeze_time("2025-04-30 08:05:00")  # Робочий час
@@ -641,6 +875,31 @@ class TestQMSApi(FrappeTestCase):
         self.assertEqual(
             waiting_tickets[1]['service'], self.service1.service_name)
 
+    @freeze_time("2025-04-30 08:05:00")  # Робочий час
+    def test_get_display_data_etag(self):
+        frappe.set_user("Guest")
+        first = get_display_data(
+            office=self.office.name, limit_called=3, limit_waiting=10)
+        etag = first.get("data", {}).get("etag")
+        self.assertTrue(etag)
+
+        unchanged = get_display_data(
+            office=self.office.name, limit_called=3, limit_waiting=10, etag=etag)
+        self.assertEqual(unchanged.get("data"), {
+                         "unchanged": True, "etag": etag})
+
+        # Зміна талону офісу змінює ETag
+        frappe.set_user("Administrator")
+        ticket = create_test_ticket(
+            self.office.name, self.service1.name, status="Waiting")
+        self.addCleanup(safe_delete_doc, "QMS Ticket", ticket.name)
+        frappe.set_user("Guest")
+        changed = get_display_data(
+            office=self.office.name, limit_called=3, limit_waiting=10, etag=etag)
+        self.assertNotEqual(changed.get("data", {}).get("etag"), etag)
+        self.assertIn(ticket.ticket_number, [
+                      row["ticket"] for row in changed["data"]["waiting"]])
+
     @freeze_time("2025-04-30 05:55:00")  # Перед відкриттям
     def test_get_display_data_office_closed(self):
         frappe.set_user("Guest")
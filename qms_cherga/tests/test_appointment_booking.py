@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, get_date_str, today
+
+from qms_cherga.api import create_appointment_ticket, get_available_appointment_slots
+from qms_cherga.tests.test_api import (
+    create_test_office,
+    create_test_operator,
+    create_test_organization,
+    create_test_schedule,
+    create_test_service,
+    create_test_user,
+    safe_delete_doc,
+)
+
+OPERATORS = 3
+CLIENTS = 16
+SLOT_TIMES = ("10:00:00", "10:15:00", "10:30:00")
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def _booking_worker(site, sites_path, service, office, slot_datetimes):
+    """Окремий клієнт з власним з'єднанням: намагається записатися на кожен слот."""
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    frappe.set_user("Administrator")
+    try:
+        outcomes = []
+        for slot in slot_datetimes:
+            response = create_appointment_ticket(service, office, slot)
+            outcomes.append((slot, "OK" if response.get("status") == "success" else response.get("error_code")))
+        return outcomes
+    finally:
+        frappe.destroy()
+
+
+class TestAppointmentBooking(FrappeTestCase):
+    """16 клієнтів одночасно бронюють ті самі слоти з місткістю 3."""
+
+    def setUp(self):
+        suffix = uuid.uuid4().hex[:6]
+        self.organization = create_test_organization(f"Booking Org {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Organization", self.organization.name)
+        self.schedule = create_test_schedule(
+            f"Booking Schedule {suffix}",
+            rules=[{"day_of_week": day, "start_time": time(9, 0), "end_time": time(18, 0)} for day in WEEKDAYS])
+        self.addCleanup(safe_delete_doc, "QMS Schedule", self.schedule.name)
+        self.office = create_test_office(
+            self.organization.name, self.schedule.name, f"BK{suffix}".upper())
+        self.addCleanup(safe_delete_doc, "QMS Office", self.office.name)
+        self.service = create_test_service(
+            self.organization.name, f"Booking Service {suffix}", avg_duration_mins=15)
+        self.addCleanup(safe_delete_doc, "QMS Service", self.service.name)
+
+        for i in range(OPERATORS):
+            user = create_test_user(f"bk_op_{i}_{suffix}@example.com", f"BK Operator {i}")
+            self.addCleanup(safe_delete_doc, "User", user.name)
+            operator = create_test_operator(user.name, self.office.name, skills_list=[self.service.name])
+            self.addCleanup(safe_delete_doc, "QMS Operator", operator.name)
+
+        self.addCleanup(self._delete_bookings)
+        self.booking_date = get_date_str(add_days(today(), 7))
+        frappe.db.commit()
+
+    def _delete_bookings(self):
+        frappe.db.delete("QMS Slot Reservation", {"office": self.office.name})
+        frappe.db.delete("QMS Ticket", {"office": self.office.name})
+        frappe.db.commit()
+
+    def test_slots_are_never_overbooked(self):
+        slot_datetimes = [f"{self.booking_date} {slot_time}" for slot_time in SLOT_TIMES]
+        site, sites_path = frappe.local.site, frappe.local.sites_path
+        with ThreadPoolExecutor(max_workers=CLIENTS) as executor:
+            futures = [
+                executor.submit(_booking_worker, site, sites_path,
+                                self.service.name, self.office.name, slot_datetimes)
+                for _ in range(CLIENTS)
+            ]
+            results = [outcome for future in futures for outcome in future.result()]
+        # Нова транзакція, щоб побачити зміни, закомічені потоками
+        frappe.db.commit()
+
+        self.assertEqual(set(code for _slot, code in results), {"OK", "SLOT_TAKEN"})
+        booked = Counter(slot for slot, code in results if code == "OK")
+        self.assertEqual(booked, Counter({slot: OPERATORS for slot in slot_datetimes}))
+
+        reservations = frappe.get_all(
+            "QMS Slot Reservation",
+            filters={"office": self.office.name},
+            fields=["slot_start", "seat_index", "ticket"],
+        )
+        self.assertEqual(len(reservations), OPERATORS * len(SLOT_TIMES))
+        self.assertEqual(
+            frappe.db.count("QMS Ticket", {"office": self.office.name, "is_appointment": 1}),
+            OPERATORS * len(SLOT_TIMES))
+        for slot_datetime in slot_datetimes:
+            seats = sorted(r.seat_index for r in reservations if str(r.slot_start) == slot_datetime)
+            self.assertEqual(seats, list(range(OPERATORS)))
+
+        # Заповнені слоти більше не пропонуються
+        response = get_available_appointment_slots(
+            self.service.name, self.office.name, self.booking_date)
+        offered = {slot["time"] + ":00" for slot in response["data"]["slots"]}
+        self.assertFalse(offered & set(SLOT_TIMES))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import json
+import time
+import uuid
+from datetime import time as dt_time
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from qms_cherga import api
+from qms_cherga.tests.test_api import (
+    create_test_office,
+    create_test_organization,
+    create_test_schedule,
+    safe_delete_doc,
+)
+from qms_cherga.utils import board_registry
+from qms_cherga.utils.cache import pipeline
+
+
+def _set_last_seen(office, board_id, age_sec):
+    pipe, make_key = pipeline()
+    pipe.hset(make_key(board_registry.REGISTRY_CACHE_KEY), f"{office}|{board_id}",
+              json.dumps({"last_seen": time.time() - age_sec}))
+    pipe.execute()
+
+
+class TestBoardRegistry(FrappeTestCase):
+    def setUp(self):
+        suffix = uuid.uuid4().hex[:6]
+        organization = create_test_organization(f"Board Org {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Organization", organization.name)
+        schedule = create_test_schedule(
+            f"Board Schedule {suffix}",
+            rules=[{"day_of_week": "Monday", "start_time": dt_time(9, 0), "end_time": dt_time(18, 0)}])
+        self.addCleanup(safe_delete_doc, "QMS Schedule", schedule.name)
+        self.office = create_test_office(organization.name, schedule.name, f"BR{suffix}".upper()).name
+        self.addCleanup(safe_delete_doc, "QMS Office", self.office)
+        self.addCleanup(frappe.set_user, "Administrator")
+        self.addCleanup(self._forget_boards)
+
+    def _forget_boards(self):
+        for board_id in ("hall", "corridor", "basement", "removed", "entrance"):
+            frappe.cache().hdel(board_registry.REGISTRY_CACHE_KEY, f"{self.office}|{board_id}")
+        frappe.cache().delete_value(f"{board_registry.BOARD_IDS_CACHE_KEY}:{self.office}")
+
+    def test_boards_classified_by_heartbeat_age(self):
+        board_registry.record_heartbeat(self.office, "hall")
+        _set_last_seen(self.office, "corridor", board_registry.ONLINE_WITHIN_SEC + 10)
+        _set_last_seen(self.office, "basement", board_registry.STALE_WITHIN_SEC + 10)
+        _set_last_seen(self.office, "removed", board_registry.FORGET_AFTER_SEC + 10)
+
+        boards = board_registry.get_boards(self.office)[self.office]
+        self.assertEqual({state: [b["board_id"] for b in boards[state]] for state in board_registry.BOARD_STATES},
+                         {"online": ["hall"], "stale": ["corridor"], "offline": ["basement"]})
+        # Давно мовчазне табло видалено з реєстру
+        self.assertNotIn("removed", str(frappe.cache().hkeys(board_registry.REGISTRY_CACHE_KEY)))
+
+    def test_heartbeat_answers_directly_without_db_or_publish(self):
+        api.get_office_info(self.office)  # прогріває контекст офісу
+        frappe.set_user("Guest")
+        with self.assertQueryCount(0):
+            response = api.display_board_heartbeat(office_id=self.office, board_id="entrance",
+                                                   client_timestamp="2025-01-01T10:00:00Z")
+        self.assertEqual(response["status"], "success")
+        self.assertTrue(response["data"]["server_time"])
+        self.assertEqual(response["data"]["client_timestamp_received"], "2025-01-01T10:00:00Z")
+
+        frappe.set_user("Administrator")
+        status = api.get_display_board_status(office=self.office)["data"]["offices"][self.office]
+        self.assertEqual([board["board_id"] for board in status["online"]], ["entrance"])
+
+    def test_status_endpoint_requires_manager(self):
+        frappe.set_user("Guest")
+        self.assertEqual(api.get_display_board_status()["status"], "error")
+        self.assertEqual(frappe.response.status_code, 403)
+
+    def test_heartbeat_rejects_bad_ids_and_caps_boards_per_office(self):
+        response = api.display_board_heartbeat(office_id=self.office, board_id="x" * 65)
+        self.assertEqual(response["error_code"], "INVALID_BOARD_ID")
+        self.assertEqual(api.display_board_heartbeat(office_id=self.office, board_id="hall<script>")["status"], "error")
+
+        limit = 3
+        original = board_registry.MAX_BOARDS_PER_OFFICE
+        board_registry.MAX_BOARDS_PER_OFFICE = limit
+        self.addCleanup(setattr, board_registry, "MAX_BOARDS_PER_OFFICE", original)
+        boards = [f"board-{i}" for i in range(limit)]
+        self.addCleanup(lambda: [frappe.cache().hdel(board_registry.REGISTRY_CACHE_KEY, f"{self.office}|{b}")
+                                 for b in boards])
+
+        for board_id in boards:
+            self.assertIsNotNone(board_registry.record_heartbeat(self.office, board_id))
+        self.assertIsNone(board_registry.record_heartbeat(self.office, "one-too-many"))
+        # Відоме табло продовжує надсилати сигнали
+        self.assertIsNotNone(board_registry.record_heartbeat(self.office, boards[0]))
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import uuid
+from datetime import time
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, add_to_date, get_datetime
+from freezegun import freeze_time
+
+from qms_cherga.api import bulk_update_tickets
+from qms_cherga.tasks import sweep_office
+from qms_cherga.tests.test_api import (
+    create_test_office,
+    create_test_organization,
+    create_test_schedule,
+    create_test_service,
+    safe_delete_doc,
+)
+from qms_cherga.utils import live_queue
+
+TICKETS = 2500
+
+
+class TestBulkTransitions(FrappeTestCase):
+    def setUp(self):
+        suffix = uuid.uuid4().hex[:6]
+        self.organization = create_test_organization(f"Bulk Org {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Organization", self.organization.name)
+        # Середа 09:00-13:00 (UTC)
+        self.schedule = create_test_schedule(
+            f"Bulk Schedule {suffix}",
+            rules=[{"day_of_week": "Wednesday", "start_time": time(9, 0), "end_time": time(13, 0)}])
+        self.addCleanup(safe_delete_doc, "QMS Schedule", self.schedule.name)
+        self.office = create_test_office(
+            self.organization.name, self.schedule.name, f"BLK{suffix}".upper())
+        self.addCleanup(safe_delete_doc, "QMS Office", self.office.name)
+        self.service = create_test_service(self.organization.name, f"Bulk Service {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Service", self.service.name)
+        self.addCleanup(self._delete_tickets)
+        self.suffix = suffix
+
+    def _delete_tickets(self):
+        frappe.db.delete("QMS Ticket", {"office": self.office.name})
+        frappe.db.commit()
+        live_queue.rebuild_office(self.office.name)
+
+    def _insert_tickets(self, statuses, created, **extra):
+        values = []
+        for i, status in enumerate(statuses):
+            name = f"BLK-{self.suffix}-{uuid.uuid4().hex[:8]}"
+            ts = add_to_date(created, seconds=i)
+            values.append((name, self.office.name, self.service.name, status, f"{i:04d}",
+                           extra.get("is_appointment", 0), extra.get("appointment_datetime"),
+                           ts, ts, ts, "Administrator", "Administrator"))
+        frappe.db.bulk_insert(
+            "QMS Ticket",
+            fields=["name", "office", "service", "status", "ticket_number", "is_appointment",
+                    "appointment_datetime", "issue_time", "creation", "modified", "owner", "modified_by"],
+            values=values,
+        )
+        return [row[0] for row in values]
+
+    def test_bulk_cancel_is_set_based(self):
+        created = get_datetime("2025-04-30 09:00:00")
+        self._insert_tickets(["Waiting"] * TICKETS, created)
+        self._insert_tickets(["Serving"] * 3, created)
+        frappe.db.commit()
+        live_queue.rebuild_office(self.office.name)
+
+        response = bulk_update_tickets(
+            self.office.name, "Cancelled", statuses=frappe.as_json(["Waiting"]))
+
+        self.assertEqual(response.get("status"), "success", response)
+        self.assertEqual(response["data"]["count"], TICKETS)
+        self.assertEqual(frappe.db.count("QMS Ticket", {"office": self.office.name, "status": "Cancelled"}), TICKETS)
+        self.assertEqual(frappe.db.count("QMS Ticket", {"office": self.office.name, "status": "Serving"}), 3)
+        # Redis-черга оновлена після коміту
+        self.assertTrue(live_queue.check_consistency(self.office.name)["consistent"])
+
+    def test_bulk_default_statuses_skip_serving(self):
+        created = get_datetime("2025-04-30 09:00:00")
+        open_tickets = self._insert_tickets(["Waiting", "Called", "Postponed"], created)
+        serving = self._insert_tickets(["Serving"], created)
+        frappe.db.commit()
+
+        response = bulk_update_tickets(self.office.name, "Cancelled")
+
+        self.assertEqual(response["data"]["count"], len(open_tickets))
+        self.assertEqual(frappe.db.get_value("QMS Ticket", serving[0], "status"), "Serving")
+
+        # Явно вказаний "Serving" дозволений
+        response = bulk_update_tickets(self.office.name, "Cancelled", statuses=frappe.as_json(["Serving"]))
+        self.assertEqual(response["data"]["count"], 1)
+
+    def test_bulk_update_rejects_unsupported_status(self):
+        response = bulk_update_tickets(self.office.name, "Completed")
+        self.assertEqual(response.get("error_code"), "INVALID_TARGET_STATUS")
+
+    @freeze_time("2025-04-30 14:00:00")  # Середа, після закриття
+    def test_sweep_after_close_keeps_future_appointments(self):
+        today_start = get_datetime("2025-04-30 08:00:00")
+        waiting = self._insert_tickets(["Waiting", "Postponed"], today_start)
+        called = self._insert_tickets(["Called"], today_start)
+        serving = self._insert_tickets(["Serving"], today_start)
+        future = self._insert_tickets(["Waiting"], today_start, is_appointment=1,
+                                      appointment_datetime=add_days(today_start, 7))
+        frappe.db.commit()
+
+        office = frappe.get_doc("QMS Office", self.office.name)
+        self.assertEqual(sweep_office(office), {"NoShow": 1, "Cancelled": 2})
+
+        statuses = dict(frappe.get_all(
+            "QMS Ticket", filters={"office": self.office.name}, fields=["name", "status"], as_list=True))
+        self.assertEqual({statuses[name] for name in waiting}, {"Cancelled"})
+        self.assertEqual(statuses[called[0]], "NoShow")
+        self.assertEqual(statuses[serving[0]], "Serving")
+        self.assertEqual(statuses[future[0]], "Waiting")
+
+    @freeze_time("2025-04-30 10:00:00")  # Середа, офіс працює
+    def test_sweep_while_open_only_touches_previous_days(self):
+        yesterday = self._insert_tickets(["Waiting"], get_datetime("2025-04-29 12:00:00"))
+        today = self._insert_tickets(["Waiting"], get_datetime("2025-04-30 09:30:00"))
+        frappe.db.commit()
+
+        office = frappe.get_doc("QMS Office", self.office.name)
+        self.assertEqual(sweep_office(office), {"NoShow": 0, "Cancelled": 1})
+        self.assertEqual(frappe.db.get_value("QMS Ticket", yesterday[0], "status"), "Cancelled")
+        self.assertEqual(frappe.db.get_value("QMS Ticket", today[0], "status"), "Waiting")
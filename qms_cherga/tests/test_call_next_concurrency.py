@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from qms_cherga.api import call_next_visitor, finish_service
+from qms_cherga.tests.test_api import (
+    create_test_office,
+    create_test_operator,
+    create_test_organization,
+    create_test_schedule,
+    create_test_service,
+    create_test_service_point,
+    create_test_user,
+    safe_delete_doc,
+)
+from qms_cherga.utils import live_queue
+
+OPERATORS = 20
+TICKETS = 1000
+
+
+def _operator_worker(site, sites_path, user, service_point):
+    """Оператор у власному потоці та з власним з'єднанням: викликає і завершує, поки є черга."""
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    frappe.set_user(user)
+    claimed, errors = [], []
+    try:
+        while True:
+            response = call_next_visitor(service_point_name=service_point)
+            if response.get("status") == "info":
+                break
+            if response.get("status") != "success":
+                errors.append(response)
+                break
+            ticket_name = response["data"]["ticket_info"].name
+            claimed.append(ticket_name)
+            finished = finish_service(ticket_name)
+            if finished.get("status") != "success":
+                errors.append(finished)
+                break
+        return claimed, errors
+    finally:
+        frappe.destroy()
+
+
+class TestCallNextConcurrency(FrappeTestCase):
+    """20 операторів одночасно розбирають чергу з 1000 талонів."""
+
+    def setUp(self):
+        suffix = uuid.uuid4().hex[:6]
+        self.organization = create_test_organization(f"Concurrency Org {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Organization", self.organization.name)
+        self.schedule = create_test_schedule(f"Concurrency Schedule {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Schedule", self.schedule.name)
+        self.office = create_test_office(
+            self.organization.name, self.schedule.name, f"CC{suffix}".upper())
+        self.addCleanup(safe_delete_doc, "QMS Office", self.office.name)
+        self.service = create_test_service(self.organization.name, f"Concurrency Service {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Service", self.service.name)
+
+        self.operators = []
+        for i in range(OPERATORS):
+            user = create_test_user(f"cc_op_{i}_{suffix}@example.com", f"CC Operator {i}")
+            self.addCleanup(safe_delete_doc, "User", user.name)
+            operator = create_test_operator(user.name, self.office.name, skills_list=[self.service.name])
+            self.addCleanup(safe_delete_doc, "QMS Operator", operator.name)
+            point = create_test_service_point(self.office.name, f"CC Window {i}")
+            self.addCleanup(safe_delete_doc, "QMS Service Point", point.name)
+            self.operators.append((user.name, point.name))
+
+        self.ticket_names = self._bulk_create_waiting_tickets(suffix)
+        self.addCleanup(self._delete_tickets)
+        frappe.db.commit()
+        live_queue.rebuild_office(self.office.name)
+
+    def _bulk_create_waiting_tickets(self, suffix):
+        start = now_datetime()
+        names, values = [], []
+        for i in range(TICKETS):
+            name = f"CC-{suffix}-{i:04d}"
+            created = add_to_date(start, seconds=i)
+            names.append(name)
+            values.append((name, self.office.name, self.service.name, "Waiting", i % 3, f"{i:04d}",
+                           created, created, created, "Administrator", "Administrator"))
+        frappe.db.bulk_insert(
+            "QMS Ticket",
+            fields=["name", "office", "service", "status", "priority", "ticket_number",
+                    "issue_time", "creation", "modified", "owner", "modified_by"],
+            values=values,
+        )
+        return names
+
+    def _delete_tickets(self):
+        frappe.db.delete("QMS Ticket", {"office": self.office.name})
+        frappe.db.commit()
+        live_queue.rebuild_office(self.office.name)
+
+    def test_every_ticket_is_claimed_exactly_once(self):
+        site, sites_path = frappe.local.site, frappe.local.sites_path
+        with ThreadPoolExecutor(max_workers=OPERATORS) as executor:
+            futures = [
+                executor.submit(_operator_worker, site, sites_path, user, point)
+                for user, point in self.operators
+            ]
+            results = [future.result() for future in futures]
+        # Нова транзакція, щоб побачити зміни, закомічені потоками
+        frappe.db.commit()
+
+        claimed = [name for names, _errors in results for name in names]
+        errors = [error for _names, errs in results for error in errs]
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(claimed), TICKETS)
+        self.assertEqual(sorted(claimed), sorted(self.ticket_names))
+        self.assertEqual(
+            frappe.db.count("QMS Ticket", {"office": self.office.name, "status": "Completed"}), TICKETS)
+        self.assertTrue(live_queue.check_consistency(self.office.name)["consistent"])
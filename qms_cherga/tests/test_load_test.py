@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import json
+import os
+import tempfile
+import uuid
+from datetime import time
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from qms_cherga.tests.test_api import (
+    assign_service_to_office,
+    create_test_office,
+    create_test_operator,
+    create_test_organization,
+    create_test_schedule,
+    create_test_service,
+    create_test_service_point,
+    create_test_user,
+    safe_delete_doc,
+)
+from qms_cherga.utils import live_queue, load_test
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+class TestLoadTestReport(FrappeTestCase):
+    def test_percentiles_use_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(load_test.percentile(values, 50), 50)
+        self.assertEqual(load_test.percentile(values, 95), 95)
+        self.assertEqual(load_test.percentile(values, 99), 99)
+        self.assertEqual(load_test.percentile([7], 99), 7)
+        self.assertEqual(load_test.percentile([], 50), 0)
+
+    def test_recorder_summary(self):
+        recorder = load_test.Recorder()
+        for ms in (10, 20, 30, 40):
+            recorder.record("get_display_data", ms, ok=True)
+        recorder.record("create_live_queue_ticket", 50, ok=False)
+
+        summary = recorder.summary(elapsed_sec=2)
+        board = summary["endpoints"]["get_display_data"]
+        self.assertEqual((board["count"], board["errors"], board["p50_ms"], board["p99_ms"]), (4, 0, 20, 40))
+        self.assertEqual(board["throughput_rps"], 2)
+        self.assertEqual(summary["endpoints"]["create_live_queue_ticket"]["error_rate"], 1)
+        self.assertEqual(summary["totals"], {"count": 5, "errors": 1, "error_rate": 0.2, "throughput_rps": 2.5})
+
+
+class TestLoadTestRun(FrappeTestCase):
+    """Короткий прогін усіх акторів напряму через api.py."""
+
+    def setUp(self):
+        suffix = uuid.uuid4().hex[:6]
+        self.organization = create_test_organization(f"Load Org {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Organization", self.organization.name)
+        # Офіс працює цілодобово, тож кіоски видають талони незалежно від часу запуску
+        self.schedule = create_test_schedule(
+            f"Load Schedule {suffix}",
+            rules=[{"day_of_week": day, "start_time": time(0, 0), "end_time": time(23, 59, 59)} for day in WEEKDAYS])
+        self.addCleanup(safe_delete_doc, "QMS Schedule", self.schedule.name)
+        self.office = create_test_office(self.organization.name, self.schedule.name, f"LT{suffix}".upper())
+        self.addCleanup(safe_delete_doc, "QMS Office", self.office.name)
+        self.service = create_test_service(self.organization.name, f"Load Service {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Service", self.service.name)
+        assign_service_to_office(self.office.name, self.service.name)
+
+        for i in range(2):
+            user = create_test_user(f"lt_op_{i}_{suffix}@example.com", f"LT Operator {i}")
+            self.addCleanup(safe_delete_doc, "User", user.name)
+            operator = create_test_operator(user.name, self.office.name, skills_list=[self.service.name])
+            self.addCleanup(safe_delete_doc, "QMS Operator", operator.name)
+            point = create_test_service_point(self.office.name, f"LT Window {i}")
+            self.addCleanup(safe_delete_doc, "QMS Service Point", point.name)
+
+        self.addCleanup(self._delete_tickets)
+        frappe.db.commit()
+
+    def _delete_tickets(self):
+        frappe.db.delete("QMS Ticket", {"office": self.office.name})
+        frappe.db.commit()
+        live_queue.rebuild_office(self.office.name)
+
+    def test_run_reports_every_endpoint(self):
+        output = os.path.join(tempfile.mkdtemp(), "report.json")
+        report = load_test.run(
+            self.office.name, kiosks=2, operators=2, boards=3, duration=3,
+            kiosk_interval=0.2, board_interval=0.2, service_secs=0.1, idle_secs=0.1, output=output)
+        frappe.db.commit()
+
+        with open(output) as f:
+            self.assertEqual(json.load(f)["totals"], report["totals"])
+
+        for endpoint in ("get_kiosk_bootstrap", "create_live_queue_ticket", "get_operator_dashboard_data",
+                         "call_next_visitor", "start_service", "finish_service", "get_display_data"):
+            self.assertIn(endpoint, report["endpoints"])
+            self.assertEqual(report["endpoints"][endpoint]["errors"], 0, endpoint)
+            self.assertGreater(report["endpoints"][endpoint]["p95_ms"], 0)
+        self.assertGreater(frappe.db.count("QMS Ticket", {"office": self.office.name, "status": "Completed"}), 0)
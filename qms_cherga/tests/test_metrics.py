@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import inspect
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from qms_cherga import api
+from qms_cherga.utils import metrics
+
+
+@metrics.instrumented("test.inner")
+def _inner_call():
+    frappe.db.sql("SELECT 1")
+
+
+@metrics.instrumented("test.outer")
+def _outer_call():
+    frappe.db.sql("SELECT 1")
+    _inner_call()
+
+
+@metrics.instrumented("test.failing")
+def _failing_call():
+    raise frappe.ValidationError("boom")
+
+
+class TestMetrics(FrappeTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.addCleanup(frappe.set_user, "Administrator")
+
+    def test_every_whitelisted_api_function_is_instrumented(self):
+        for name, fn in inspect.getmembers(api, inspect.isfunction):
+            if fn.__module__ != api.__name__ or fn not in frappe.whitelisted or name == "get_metrics":
+                continue
+            self.assertTrue(hasattr(fn, "__wrapped__"), name)
+
+    def test_sql_counted_for_nested_calls(self):
+        _outer_call()
+        totals = metrics.get_totals()
+
+        # Зовнішній виклик враховує і запит вкладеного
+        self.assertEqual(totals[("qms_call_sql_queries", "test.outer", "2")], 1)
+        self.assertEqual(totals[("qms_call_sql_queries", "test.outer", "sum")], 2)
+        self.assertEqual(totals[("qms_call_sql_queries", "test.inner", "1")], 1)
+        self.assertGreater(totals[("qms_call_sql_duration_seconds", "test.outer", "sum")], 0)
+        # Після виклику frappe.db.sql знову метод класу
+        self.assertNotIn("sql", vars(frappe.local.db))
+
+    def test_prometheus_export(self):
+        _outer_call()
+        self.assertRaises(frappe.ValidationError, _failing_call)
+        text = metrics.render_prometheus()
+
+        self.assertIn("# TYPE qms_call_duration_seconds histogram", text)
+        self.assertIn('qms_call_sql_queries_bucket{endpoint="test.outer",le="1"} 0', text)
+        self.assertIn('qms_call_sql_queries_bucket{endpoint="test.outer",le="+Inf"} 1', text)
+        self.assertIn('qms_call_sql_queries_count{endpoint="test.outer"} 1', text)
+        self.assertIn('qms_call_errors_total{endpoint="test.failing"} 1', text)
+        self.assertIn('qms_call_errors_total{endpoint="test.outer"} 0', text)
+
+    def test_slow_call_logs_queries(self):
+        frappe.conf.qms_slow_call_ms = 1
+        self.addCleanup(frappe.conf.pop, "qms_slow_call_ms")
+        with patch.object(metrics, "_log_slow_call") as log_slow_call:
+            metrics.instrumented("test.slow")(lambda: frappe.db.sql("SELECT SLEEP(0.01)"))()
+
+        endpoint, _elapsed, frame = log_slow_call.call_args.args
+        self.assertEqual(endpoint, "test.slow")
+        self.assertEqual(frame.query_count, 1)
+        self.assertIn("SLEEP", str(frame.queries[0][0]))
+
+    def test_export_is_guarded(self):
+        frappe.set_user("Guest")
+        self.assertEqual(api.get_metrics()["status"], "error")
+        self.assertEqual(frappe.response.status_code, 403)
+
+        frappe.conf.qms_metrics_token = "scrape-secret"
+        self.addCleanup(frappe.conf.pop, "qms_metrics_token")
+        self.assertEqual(api.get_metrics(token="wrong")["status"], "error")
+        response = api.get_metrics(token="scrape-secret")
+        self.assertEqual(response.content_type, metrics.PROMETHEUS_CONTENT_TYPE)
+
+        frappe.set_user("Administrator")
+        self.assertIn(b"# TYPE qms_call_errors_total counter", api.get_metrics().get_data())
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import time
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from qms_cherga.api import call_next_visitor, get_display_data, get_live_data
+from qms_cherga.qms_cherga.doctype.qms_ticket.qms_ticket import QMS_TICKET_INDEXES
+from qms_cherga.tests.test_api import (
+    assign_service_to_office,
+    create_test_office,
+    create_test_operator,
+    create_test_organization,
+    create_test_schedule,
+    create_test_service,
+    create_test_service_point,
+    create_test_user,
+    safe_delete_doc,
+)
+from qms_cherga.utils import display_snapshot, live_queue, live_stats
+
+TICKET_TABLE = re.compile(r"`tabQMS Ticket`")
+FOR_UPDATE = re.compile(r"\s+for\s+update(\s+skip\s+locked)?\s*$", re.IGNORECASE)
+# Рік роботи кількох офісів у мініатюрі: на майже порожній таблиці оптимізатор
+# може чесно обрати повний перегляд, і перевірка плану стала б випадковою
+HISTORY_DAYS = 60
+TICKETS_PER_DAY = 100
+NOISE_OFFICES = 3
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+@contextmanager
+def capture_ticket_queries():
+    """SELECT-запити до QMS Ticket, які виконує код усередині блоку (із параметрами)."""
+    db = frappe.db
+    previous = db.sql
+    captured = []
+
+    def sql(query, *args, **kwargs):
+        text = str(query)
+        if TICKET_TABLE.search(text) and text.lstrip().lower().startswith("select"):
+            captured.append((text, args[0] if args else kwargs.get("values")))
+        return previous(query, *args, **kwargs)
+
+    db.sql = sql
+    try:
+        yield captured
+    finally:
+        db.sql = previous
+
+
+class TestQMSTicketQueryPlans(FrappeTestCase):
+    """Падає, якщо будь-який запит до QMS Ticket, виконаний ендпоінтами api.py, перестає використовувати індекс."""
+
+    created_docs = []
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if frappe.db.db_type != "mariadb":
+            return
+        suffix = uuid.uuid4().hex[:6]
+        try:
+            organization = create_test_organization(f"Plan Org {suffix}")
+            cls.created_docs.append(("QMS Organization", organization.name))
+            # Офіс працює цілодобово, тож табло та виклик ідуть робочим шляхом
+            schedule = create_test_schedule(
+                f"Plan Schedule {suffix}",
+                rules=[{"day_of_week": day, "start_time": time(0, 0), "end_time": time(23, 59, 59)}
+                       for day in WEEKDAYS])
+            cls.created_docs.append(("QMS Schedule", schedule.name))
+            cls.office = create_test_office(organization.name, schedule.name, f"QP{suffix}".upper())
+            cls.created_docs.append(("QMS Office", cls.office.name))
+            cls.services = [create_test_service(organization.name, f"Plan Service {suffix} {i}") for i in range(3)]
+            cls.created_docs += [("QMS Service", service.name) for service in cls.services]
+            cls.service_point = create_test_service_point(cls.office.name, f"Plan Window {suffix}")
+            cls.created_docs.append(("QMS Service Point", cls.service_point.name))
+            cls.user = create_test_user(f"plan_op_{suffix}@example.com", "Plan Operator")
+            cls.created_docs.append(("User", cls.user.name))
+            operator = create_test_operator(cls.user.name, cls.office.name,
+                                            skills_list=[service.name for service in cls.services])
+            cls.created_docs.append(("QMS Operator", operator.name))
+            for service in cls.services:
+                assign_service_to_office(cls.office.name, service.name)
+
+            cls.offices = [cls.office.name, *(f"{cls.office.name}-NOISE-{i}" for i in range(NOISE_OFFICES))]
+            cls._seed_tickets(suffix)
+            frappe.db.commit()
+            frappe.db.sql("ANALYZE TABLE `tabQMS Ticket`")
+            live_queue.rebuild_office(cls.office.name)
+        except Exception:
+            cls.tearDownClass()
+            raise
+
+    @classmethod
+    def _seed_tickets(cls, suffix):
+        """Закриті талони за HISTORY_DAYS днів у кількох офісах і відкриті - сьогодні."""
+        now = now_datetime()
+        services = [service.name for service in cls.services]
+        values = []
+
+        def add(office, status, created, **extra):
+            name = f"QP-{suffix}-{len(values):06d}"
+            values.append((
+                name, office, services[len(values) % len(services)], status, f"{len(values) % 1000:03d}",
+                extra.get("operator"), extra.get("call_time"), extra.get("completion_time"),
+                created, created, created, "Administrator", "Administrator",
+            ))
+
+        for office in cls.offices:
+            for day in range(1, HISTORY_DAYS + 1):
+                for i in range(TICKETS_PER_DAY):
+                    created = add_to_date(now, days=-day, minutes=i)
+                    status = ("Completed", "Completed", "Completed", "NoShow", "Cancelled")[i % 5]
+                    finished = add_to_date(created, minutes=20)
+                    add(office, status, created, call_time=add_to_date(created, minutes=10),
+                        completion_time=finished if status != "Cancelled" else None)
+            today_start = add_to_date(now, hours=-2)
+            for i in range(30):
+                add(office, "Waiting", add_to_date(today_start, minutes=i))
+            for i in range(5):
+                created = add_to_date(today_start, minutes=i)
+                add(office, "Called", created, call_time=add_to_date(now, minutes=-i - 1),
+                    operator=f"someone-{i}@example.com")
+                add(office, "Postponed", created)
+                add(office, "Completed", created, call_time=created, completion_time=add_to_date(created, minutes=5))
+
+        frappe.db.bulk_insert(
+            "QMS Ticket",
+            fields=["name", "office", "service", "status", "ticket_number", "operator", "call_time",
+                    "completion_time", "issue_time", "creation", "modified", "owner", "modified_by"],
+            values=values,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        if getattr(cls, "offices", None):
+            frappe.db.delete("QMS Ticket", {"office": ["in", cls.offices]})
+            live_queue.rebuild_office(cls.office.name)
+        for doctype, name in reversed(cls.created_docs):
+            safe_delete_doc(doctype, name)
+        cls.created_docs = []
+        frappe.db.commit()
+        super().tearDownClass()
+
+    def setUp(self):
+        if frappe.db.db_type != "mariadb":
+            self.skipTest("EXPLAIN plan checks are MariaDB-specific")
+        self.addCleanup(frappe.set_user, "Administrator")
+
+    def _endpoint_queries(self) -> dict:
+        """Запускає ендпоінти з холодними кешами та повертає їхні запити до QMS Ticket."""
+        office = self.office.name
+        display_snapshot.invalidate(office)
+        live_stats.invalidate(office)
+
+        queries = {}
+        frappe.set_user("Guest")
+        with capture_ticket_queries() as queries["get_display_data"]:
+            self.assertEqual(get_display_data(office)["data"]["office_status"], "open")
+
+        frappe.set_user(self.user.name)
+        with capture_ticket_queries() as queries["get_live_data"]:
+            self.assertEqual(get_live_data(office)["status"], "success")
+        with capture_ticket_queries() as queries["call_next_visitor"]:
+            response = call_next_visitor(self.service_point.name)
+        self.assertEqual(response["status"], "success", response)
+
+        frappe.set_user("Administrator")
+        with capture_ticket_queries() as queries["live_queue.rebuild_office"]:
+            live_queue.rebuild_office(office)
+        return queries
+
+    def test_composite_indexes_exist(self):
+        existing = {row.Key_name for row in frappe.db.sql(
+            "SHOW INDEX FROM `tabQMS Ticket`", as_dict=True)}
+        for index_name in QMS_TICKET_INDEXES:
+            self.assertIn(index_name, existing)
+
+    def test_endpoint_queries_use_an_index(self):
+        for endpoint, queries in self._endpoint_queries().items():
+            self.assertTrue(queries, f"{endpoint} ran no QMS Ticket queries")
+            for query, values in queries:
+                with self.subTest(endpoint=endpoint, query=query):
+                    plan = frappe.db.sql(f"EXPLAIN {FOR_UPDATE.sub('', query)}", values, as_dict=True)
+                    for row in plan:
+                        if row.table != "tabQMS Ticket":
+                            continue
+                        self.assertNotEqual(row.type, "ALL", f"{endpoint} does a full scan: {row}")
+                        self.assertTrue(row.key, f"{endpoint} uses no index: {row}")
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import uuid
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from qms_cherga import api
+from qms_cherga.utils import metrics, rate_limit
+
+
+class TestRateLimit(FrappeTestCase):
+    def setUp(self):
+        self.client = f"test-{uuid.uuid4().hex[:8]}"
+        frappe.conf.qms_rate_limits = {"get_display_data": {"capacity": 3, "rate": 0.01, "key": "ip"}}
+        self.addCleanup(frappe.conf.pop, "qms_rate_limits")
+
+    def test_bucket_allows_burst_then_sheds(self):
+        results = [rate_limit.check("get_display_data", client_key=self.client) for _ in range(4)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        # Один токен на 100 с при швидкості 0.01/с
+        self.assertGreater(results[3], 0)
+        # Інший клієнт має власне відро
+        self.assertEqual(rate_limit.check("get_display_data", client_key=f"{self.client}-other"), 0)
+
+    def test_rotating_kiosk_ids_hit_ip_limit(self):
+        frappe.conf.qms_rate_limits = {
+            "create_live_queue_ticket": {"capacity": 2, "rate": 0.01, "key": "kiosk", "ip_factor": 2}}
+        frappe.local.request_ip = self.client
+        self.addCleanup(setattr, frappe.local, "request_ip", None)
+
+        # Кожен запит - новий X-Kiosk-ID, але спільне відро IP на 2 * 2 токени
+        results = [
+            rate_limit.check("create_live_queue_ticket", client_key=f"kiosk:{self.client}-{i}")
+            for i in range(5)
+        ]
+        self.assertEqual(results[:4], [0, 0, 0, 0])
+        self.assertGreater(results[4], 0)
+
+    def test_zero_capacity_disables_limit(self):
+        frappe.conf.qms_rate_limits = {"get_display_data": {"capacity": 0}}
+        self.assertIsNone(rate_limit.get_limit("get_display_data"))
+        self.assertEqual(rate_limit.check("get_display_data", client_key=self.client), 0)
+
+    def test_guest_request_over_limit_gets_cheap_429(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        frappe.local.request = frappe._dict(headers={})
+        frappe.local.request_ip = self.client
+        self.addCleanup(setattr, frappe.local, "request", None)
+        frappe.set_user("Guest")
+        self.addCleanup(frappe.set_user, "Administrator")
+
+        for _ in range(3):
+            rate_limit.check("get_display_data", client_key=f"ip:{self.client}")
+
+        with self.assertQueryCount(0):
+            response = api.get_display_data(office="any-office")
+        self.assertEqual(response["error_code"], "RATE_LIMITED")
+        self.assertGreater(response["data"]["retry_after_sec"], 0)
+        self.assertEqual(frappe.response.status_code, 429)
+        self.assertIn('qms_requests_shed_total{endpoint="get_display_data"} 1', metrics.render_prometheus())
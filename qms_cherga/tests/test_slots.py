@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import time as timer
+from datetime import date, datetime
+
+from frappe.tests.utils import FrappeTestCase
+
+from qms_cherga.utils.slots import MAX_RANGE_DAYS, build_availability, day_grid, format_slots
+
+HOUR = 3600
+
+# Пн-Пт 09:00-13:00 та 14:00-18:00, субота 10:00-14:00, неділя вихідна
+COMPILED = {
+    "rules": {
+        **{weekday: [(9 * HOUR, 13 * HOUR), (14 * HOUR, 18 * HOUR)] for weekday in range(5)},
+        5: [(10 * HOUR, 14 * HOUR)],
+        6: [],
+    },
+    "exceptions": {"2025-05-01": []},
+}
+
+
+class TestSlotEngine(FrappeTestCase):
+    def test_day_grid_fits_slots_into_intervals(self):
+        self.assertEqual(day_grid([(9 * HOUR, 10 * HOUR)], 20), [540, 560, 580])
+        # Останній слот, що не вміщається в інтервал, не генерується
+        self.assertEqual(day_grid([(9 * HOUR, 10 * HOUR)], 25), [540, 565])
+        self.assertEqual(day_grid([(9 * HOUR, 9 * HOUR + 600)], 15), [])
+
+    def test_range_statuses_bookings_and_past_slots(self):
+        now_local = datetime(2025, 4, 30, 12, 10, 30)  # середа
+        booked = {"2025-05-02": {9 * 60, 9 * 60 + 30}}
+        days = build_availability(COMPILED, date(2025, 4, 29), 6, 30, booked, now_local)
+
+        self.assertEqual([d["status"] for d in days], ["past", "open", "closed", "open", "open", "closed"])
+        # Сьогодні: лише слоти, що починаються після поточного часу
+        self.assertEqual(days[1]["slots"][0], 12 * 60 + 30)
+        # Зайняті слоти віднімаються
+        self.assertEqual(days[3]["slots"][:2], [10 * 60, 10 * 60 + 30])
+        self.assertEqual(len(days[4]["slots"]), 8)
+
+        formatted = format_slots(days[4]["date"], days[4]["slots"][:1])
+        self.assertEqual(formatted, [{"time": "10:00", "datetime": "2025-05-03 10:00:00"}])
+
+    def test_benchmark_well_under_5ms_per_office_day(self):
+        now_local = datetime(2025, 4, 28, 8, 0)
+        booked = {
+            f"2025-05-{day:02d}": set(range(9 * 60, 13 * 60, 10)) for day in range(2, 29)
+        }
+
+        best = float("inf")
+        for _ in range(5):
+            started = timer.perf_counter()
+            days = build_availability(COMPILED, date(2025, 4, 28), MAX_RANGE_DAYS, 5, booked, now_local)
+            for day in days:
+                format_slots(day["date"], day["slots"])
+            best = min(best, timer.perf_counter() - started)
+
+        per_day_ms = best * 1000 / MAX_RANGE_DAYS
+        self.assertLess(per_day_ms, 1.0, f"{per_day_ms:.3f} ms per office-day")
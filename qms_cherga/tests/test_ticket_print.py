@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+import os
+import time as timer
+import unittest
+import uuid
+from datetime import time
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from qms_cherga.tests.test_api import (
+    create_test_office,
+    create_test_organization,
+    create_test_schedule,
+    create_test_service,
+    create_test_ticket,
+    safe_delete_doc,
+)
+from qms_cherga.utils import live_queue
+from qms_cherga.utils.ticket_print import (
+    ESCPOS_CUT,
+    ESCPOS_ENCODING,
+    ESCPOS_INIT,
+    get_ticket_print_context,
+    render_escpos,
+)
+
+PRINT_FORMAT = "QMS Ticket Thermal"
+# Порівняння швидкодії залежить від навантаження машини - лише на вимогу:
+# QMS_RUN_BENCHMARKS=1 bench --site <site> run-tests --module qms_cherga.tests.test_ticket_print
+
+
+class TestTicketPrint(FrappeTestCase):
+    def setUp(self):
+        suffix = uuid.uuid4().hex[:6]
+        self.organization = create_test_organization(f"Print Org {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Organization", self.organization.name)
+        self.schedule = create_test_schedule(
+            f"Print Schedule {suffix}",
+            rules=[{"day_of_week": "Wednesday", "start_time": time(9, 0), "end_time": time(13, 0)}])
+        self.addCleanup(safe_delete_doc, "QMS Schedule", self.schedule.name)
+        self.office = create_test_office(
+            self.organization.name, self.schedule.name, f"PRN{suffix}".upper())
+        self.addCleanup(safe_delete_doc, "QMS Office", self.office.name)
+        self.service = create_test_service(self.organization.name, f"Print Service {suffix}")
+        self.addCleanup(safe_delete_doc, "QMS Service", self.service.name)
+
+        self.first = create_test_ticket(self.office.name, self.service.name)
+        self.addCleanup(safe_delete_doc, "QMS Ticket", self.first.name)
+        self.ticket = create_test_ticket(self.office.name, self.service.name)
+        self.addCleanup(safe_delete_doc, "QMS Ticket", self.ticket.name)
+        frappe.db.commit()
+        live_queue.rebuild_office(self.office.name)
+
+    def test_context_from_cache_without_queries(self):
+        get_ticket_print_context(self.ticket)  # прогрів кешу документів
+
+        with self.assertQueryCount(0):
+            context = get_ticket_print_context(self.ticket)
+
+        self.assertEqual(context["org_name"], self.organization.organization_name)
+        self.assertEqual(context["office_name"], self.office.office_name)
+        self.assertEqual(context["service_name"], self.service.service_name)
+        self.assertEqual(context["people_ahead"], 1)
+        self.assertEqual(context["display_number"], self.ticket.ticket_number.split("-")[-1])
+
+    def test_escpos_stream(self):
+        payload = render_escpos(get_ticket_print_context(self.ticket))
+
+        self.assertTrue(payload.startswith(ESCPOS_INIT))
+        self.assertTrue(payload.endswith(ESCPOS_CUT))
+        self.assertIn(self.service.service_name.encode(ESCPOS_ENCODING), payload)
+        self.assertIn("Осіб у черзі перед вами: 1".encode(ESCPOS_ENCODING), payload)
+
+    def test_print_format_renders(self):
+        html = frappe.get_print("QMS Ticket", self.ticket.name, PRINT_FORMAT, doc=self.ticket, no_letterhead=1)
+        self.assertIn(self.service.service_name, html)
+
+    @unittest.skipUnless(os.environ.get("QMS_RUN_BENCHMARKS"), "benchmark: set QMS_RUN_BENCHMARKS=1")
+    def test_benchmark_escpos_vs_print_format(self):
+        # HTML-шлях без wkhtmltopdf: уже сам рендер Jinja-формату повільніший за ESC/POS
+        timings = benchmark_print_paths(self.ticket)
+        frappe.logger("qms_benchmark").info(
+            f"QMS Ticket Thermal: html {timings['html_ms']:.2f} ms, escpos {timings['escpos_ms']:.2f} ms")
+        self.assertLess(timings["escpos_ms"], timings["html_ms"])
+
+
+def benchmark_print_paths(ticket, rounds: int = 20) -> dict:
+    """Найкращий час із `rounds` рендерів для друкованого формату та ESC/POS, мс."""
+
+    def best_of(render):
+        best = float("inf")
+        for _ in range(rounds):
+            started = timer.perf_counter()
+            render()
+            best = min(best, timer.perf_counter() - started)
+        return best * 1000
+
+    return {
+        "html_ms": best_of(lambda: frappe.get_print(
+            "QMS Ticket", ticket.name, PRINT_FORMAT, doc=ticket, no_letterhead=1)),
+        "escpos_ms": best_of(lambda: render_escpos(get_ticket_print_context(ticket))),
+    }
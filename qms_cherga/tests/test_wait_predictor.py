@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2025, Maxym Sysoiev and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, get_datetime
+
+from qms_cherga.utils import wait_predictor
+from qms_cherga.utils.wait_predictor import ewma, predict_wait_mins, replay, summarize_errors
+
+
+class TestWaitPredictor(FrappeTestCase):
+    def test_ewma(self):
+        self.assertEqual(ewma(None, 10), 10)
+        self.assertAlmostEqual(ewma(10, 20, alpha=0.2), 12)
+
+    def test_predict_wait_mins(self):
+        self.assertEqual(predict_wait_mins(0, 10, 2), 0)
+        self.assertEqual(predict_wait_mins(3, 10, 2), 15)
+        # Без операторів оцінка рахується як для одного вікна
+        self.assertEqual(predict_wait_mins(2, 7, 0), 14)
+
+    def test_summarize_errors(self):
+        self.assertEqual(summarize_errors([])["n"], 0)
+        stats = summarize_errors([2, -2, 4, -4])
+        self.assertEqual(stats["mae"], 3)
+        self.assertEqual(stats["bias"], 0)
+        self.assertEqual(stats["p90_abs"], 4)
+
+    def test_replay_on_steady_queue_is_exact(self):
+        # Одне вікно, обслуговування рівно 10 хв, талони видаються всі одразу о 09:00
+        start = get_datetime("2025-04-30 09:00:00")
+        tickets = []
+        for i in range(5):
+            call_time = add_to_date(start, minutes=10 * i)
+            tickets.append({
+                "office": "OFF", "service": "SRV", "operator": "op-1",
+                "issue_time": start,
+                "call_time": call_time,
+                "start_service_time": call_time,
+                "completion_time": add_to_date(call_time, minutes=10),
+            })
+
+        stats = replay(tickets, {"SRV": 10})
+        self.assertEqual(stats["n"], 5)
+        self.assertEqual(stats["mae"], 0)
+        self.assertEqual(stats["bias"], 0)
+
+    def test_replay_learns_service_time(self):
+        # Заявлена тривалість 30 хв, фактична - 5; талони приходять парами кожні 10 хв.
+        # Помиляється лише прогноз для другого талону першої пари, далі діє EWMA
+        start = get_datetime("2025-04-30 09:00:00")
+        tickets = []
+        for i in range(20):
+            issue_time = add_to_date(start, minutes=10 * i)
+            for position in range(2):
+                call_time = add_to_date(issue_time, minutes=5 * position)
+                tickets.append({
+                    "office": "OFF", "service": "SRV", "operator": "op-1",
+                    "issue_time": issue_time,
+                    "call_time": call_time,
+                    "start_service_time": call_time,
+                    "completion_time": add_to_date(call_time, minutes=5),
+                })
+
+        stats = replay(tickets, {"SRV": 30})
+        self.assertEqual(stats["n"], 40)
+        self.assertAlmostEqual(stats["mae"], 25 / 40, places=2)
+        self.assertEqual(stats["p90_abs"], 0)
+
+    def test_get_service_mins_falls_back_to_default(self):
+        self.assertEqual(
+            wait_predictor.get_service_mins("no-such-office", "no-such-service"),
+            wait_predictor.DEFAULT_SERVICE_MINS,
+        )
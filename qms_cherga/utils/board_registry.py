@@ -0,0 +1,122 @@
+import json
+import re
+import time
+
+import frappe
+
+from qms_cherga.utils.cache import decode, pipeline
+
+# Реєстр живості табло: кожне табло періодично надсилає heartbeat, який записується
+# в один хеш Redis (поле "office|board_id" -> JSON з часом останнього сигналу).
+# Статус обчислюється під час читання з віку сигналу, тож список усіх табло всіх
+# офісів - один HGETALL. TTL ключа оновлюється кожним сигналом; записи табло, що
+# мовчать довше за FORGET_AFTER_SEC, видаляються під час читання.
+#
+# board_id надсилає гість, тож формат і довжина обмежені BOARD_ID_PATTERN, а кількість
+# табло офісу - MAX_BOARDS_PER_OFFICE (множина id табло офісу, SCARD перед додаванням).
+REGISTRY_CACHE_KEY = "qms_display_board_heartbeats"
+BOARD_IDS_CACHE_KEY = "qms_display_board_ids"
+BOARD_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.:-]{1,64}$")
+MAX_BOARDS_PER_OFFICE = 50
+CLIENT_TIMESTAMP_MAX_LENGTH = 40
+HEARTBEAT_INTERVAL_SEC = 30
+ONLINE_WITHIN_SEC = 75  # 2.5 інтервали: один пропущений сигнал ще не робить табло stale
+STALE_WITHIN_SEC = 300
+FORGET_AFTER_SEC = 7 * 24 * 3600
+
+BOARD_STATES = ("online", "stale", "offline")
+
+
+def _field(office: str, board_id: str) -> str:
+    return f"{office}|{board_id}"
+
+
+def _ids_key(office: str) -> str:
+    return f"{BOARD_IDS_CACHE_KEY}:{office}"
+
+
+def is_valid_board_id(board_id) -> bool:
+    return isinstance(board_id, str) and bool(BOARD_ID_PATTERN.match(board_id))
+
+
+def record_heartbeat(office: str, board_id: str, client_timestamp: str | None = None) -> float | None:
+    """
+    Записує сигнал табло (HSET + EXPIRE одним пайплайном) і повертає його час (epoch).
+    None - нове табло, а в офісі вже MAX_BOARDS_PER_OFFICE табло.
+    """
+    pipe, make_key = pipeline()
+    ids_key = make_key(_ids_key(office))
+    pipe.sismember(ids_key, board_id)
+    pipe.scard(ids_key)
+    known, count = pipe.execute()
+    if not known and count >= MAX_BOARDS_PER_OFFICE:
+        return None
+
+    seen_at = time.time()
+    entry = {
+        "last_seen": seen_at,
+        "ip": frappe.local.request_ip if frappe.request else None,
+        "client_timestamp": (client_timestamp or None) and str(client_timestamp)[:CLIENT_TIMESTAMP_MAX_LENGTH],
+    }
+    key = make_key(REGISTRY_CACHE_KEY)
+    pipe.hset(key, _field(office, board_id), json.dumps(entry))
+    pipe.expire(key, FORGET_AFTER_SEC)
+    pipe.sadd(ids_key, board_id)
+    pipe.expire(ids_key, FORGET_AFTER_SEC)
+    pipe.execute()
+    return seen_at
+
+
+def get_state(age_sec: float) -> str:
+    if age_sec <= ONLINE_WITHIN_SEC:
+        return "online"
+    if age_sec <= STALE_WITHIN_SEC:
+        return "stale"
+    return "offline"
+
+
+def get_boards(office: str | None = None) -> dict:
+    """
+    {office: {"online": [...], "stale": [...], "offline": [...]}} з реєстру одним
+    читанням; табло в кожному списку відсортовані за часом останнього сигналу (новіші першими).
+    """
+    pipe, make_key = pipeline()
+    key = make_key(REGISTRY_CACHE_KEY)
+    pipe.hgetall(key)
+    raw = pipe.execute()[0] or {}
+
+    now = time.time()
+    offices = {}
+    forgotten = []
+    for field, value in raw.items():
+        field = decode(field)
+        board_office, _, board_id = field.partition("|")
+        entry = json.loads(decode(value))
+        age = max(now - entry["last_seen"], 0)
+        if age > FORGET_AFTER_SEC:
+            forgotten.append(field)
+            continue
+        if office and board_office != office:
+            continue
+        boards = offices.setdefault(board_office, {state: [] for state in BOARD_STATES})
+        boards[get_state(age)].append({
+            "board_id": board_id,
+            "last_seen": entry["last_seen"],
+            "age_sec": round(age),
+            "ip": entry.get("ip"),
+            "client_timestamp": entry.get("client_timestamp"),
+        })
+
+    if forgotten:
+        pipe, make_key = pipeline()
+        pipe.hdel(key, *forgotten)
+        for field in forgotten:
+            board_office, _, board_id = field.partition("|")
+            pipe.srem(make_key(_ids_key(board_office)), board_id)
+        pipe.execute()
+
+    for boards in offices.values():
+        for state in BOARD_STATES:
+            boards[state].sort(key=lambda board: board["age_sec"])
+    return offices
+
@@ -0,0 +1,102 @@
+import frappe
+from frappe.utils import now_datetime
+
+from qms_cherga.utils import display_snapshot, live_queue, live_stats
+from qms_cherga.utils.realtime import publish_office_event
+
+# Масові переходи талонів (закриття офісу, прибирання в кінці дня).
+# Замість get_doc + save на кожен талон - UPDATE пачками по BATCH_SIZE
+# та одна подія на офіс після коміту.
+BULK_TARGET_STATUSES = ("Cancelled", "NoShow")
+# За замовчуванням - лише талони, що ще не біля вікна; "Serving" лише явно
+OPEN_STATUSES = ("Waiting", "Called", "Postponed")
+ALLOWED_FROM_STATUSES = (*OPEN_STATUSES, "Serving")
+BATCH_SIZE = 1000
+
+
+def bulk_transition(office: str, target_status: str, from_statuses=OPEN_STATUSES,
+                    ticket_names=None, created_before=None) -> int:
+    """
+    Переводить талони офісу зі статусів `from_statuses` у `target_status`.
+
+    :param ticket_names: обмежити переліком талонів (None - усі талони офісу).
+    :param created_before: лише талони, створені раніше; майбутні записи на прийом не чіпаються.
+    :return: кількість змінених талонів.
+    """
+    if target_status not in BULK_TARGET_STATUSES:
+        frappe.throw(f"Unsupported bulk target status: {target_status}")
+    from_statuses = [status for status in from_statuses if status in ALLOWED_FROM_STATUSES]
+    if not office or not from_statuses or ticket_names == []:
+        return 0
+
+    filters = {"office": office, "status": ["in", from_statuses]}
+    or_filters = None
+    if ticket_names is not None:
+        filters["name"] = ["in", ticket_names]
+    if created_before:
+        filters["creation"] = ["<", created_before]
+        or_filters = {"is_appointment": 0, "appointment_datetime": ["<", created_before]}
+
+    timestamp = now_datetime()
+    values = {"status": target_status, "modified": timestamp, "modified_by": frappe.session.user}
+    if target_status == "NoShow":
+        values["completion_time"] = timestamp
+
+    changed, waiting, appointments = 0, [], []
+    while True:
+        # Кожна пачка після UPDATE більше не підпадає під фільтр статусів.
+        # FOR UPDATE: оператор не змінить талон пачки між читанням і UPDATE,
+        # тож кількість, подія та прибирання з Redis-черги відповідають реальним змінам.
+        batch = frappe.get_all(
+            "QMS Ticket",
+            filters=filters,
+            or_filters=or_filters,
+            fields=["name", "service", "status", "is_appointment"],
+            limit_page_length=BATCH_SIZE,
+            for_update=True,
+        )
+        if not batch:
+            break
+
+        names = [row.name for row in batch]
+        frappe.db.set_value(
+            "QMS Ticket",
+            {"name": ["in", names], "status": ["in", from_statuses]},
+            values,
+            update_modified=False,
+        )
+        changed += len(batch)
+        waiting += [(row.name, row.service) for row in batch if row.status == "Waiting"]
+        appointments += [row.name for row in batch if row.is_appointment]
+        if len(batch) < BATCH_SIZE:
+            break
+
+    if not changed:
+        return 0
+
+    # Скасований запис звільняє місце у слоті (як і QMSTicket.on_update)
+    if target_status == "Cancelled" and appointments:
+        frappe.db.delete("QMS Slot Reservation", {"ticket": ["in", appointments]})
+
+    _after_bulk_transition(office, target_status, changed, waiting)
+    return changed
+
+
+def _after_bulk_transition(office: str, target_status: str, count: int, waiting: list):
+    """Кеші, Redis-черга та одна агрегована подія - так само, як хуки QMSTicket для одного талону."""
+    display_snapshot.invalidate(office)
+    live_stats.invalidate(office)
+
+    def _sync():
+        display_snapshot.invalidate(office)
+        live_stats.invalidate(office)
+        if waiting:
+            live_queue.remove_tickets(office, waiting)
+
+    frappe.db.after_commit.add(_sync)
+    publish_office_event(office, "qms_stats_updated", {
+        "type": "qms_tickets_bulk_updated",
+        "office": office,
+        "status": target_status,
+        "count": count,
+    })
@@ -0,0 +1,28 @@
+import frappe
+
+
+def pipeline():
+    """
+    Повертає пайплайн Redis та функцію, що додає до ключа префікс сайту.
+    Команди пайплайна не проходять через обгортки frappe.cache(), тож ключі
+    треба передавати вже з префіксом: pipe.zadd(make_key("..."), ...).
+    """
+    cache = frappe.cache()
+    return cache.pipeline(), cache.make_key
+
+
+def decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def incr(key: str, amount: int = 1) -> int:
+    """Атомарний лічильник Redis (INCRBY) у просторі ключів сайту."""
+    pipe, make_key = pipeline()
+    pipe.incrby(make_key(key), amount)
+    return int(pipe.execute()[0])
+
+
+def get_int(key: str) -> int:
+    pipe, make_key = pipeline()
+    pipe.get(make_key(key))
+    return int(pipe.execute()[0] or 0)
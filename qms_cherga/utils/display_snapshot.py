@@ -0,0 +1,100 @@
+import hashlib
+
+import frappe
+from frappe import _
+from frappe.utils import get_datetime, today
+
+# Знімок даних табло на офіс. Ключ знімка містить версію офісу, тож
+# інвалідація - це просто нова версія; старі знімки зникають за TTL.
+SNAPSHOT_TTL_SEC = 3600
+
+
+def _version_key(office: str) -> str:
+    return f"qms_display_version:{office}"
+
+
+def _snapshot_key(office: str, version: str, limit_called: int, limit_waiting: int) -> str:
+    return f"qms_display_snapshot:{office}:{version}:{today()}:{limit_called}:{limit_waiting}"
+
+
+def get_version(office: str) -> str:
+    version = frappe.cache().get_value(_version_key(office))
+    if not version:
+        version = frappe.generate_hash(length=12)
+        frappe.cache().set_value(_version_key(office), version)
+    return version
+
+
+def invalidate(office: str):
+    """Нова версія офісу: наступне опитування табло перебудує знімок."""
+    if office:
+        frappe.cache().set_value(_version_key(office), frappe.generate_hash(length=12))
+
+
+def invalidate_all():
+    """Для змін, що зачіпають усі офіси (напр. перейменування послуги)."""
+    frappe.cache().delete_keys("qms_display_version:")
+
+
+def make_etag(office: str, limit_called: int, limit_waiting: int, *parts) -> str:
+    raw = "|".join(str(p) for p in (get_version(office), today(), limit_called, limit_waiting, *parts))
+    return hashlib.md5(raw.encode()).hexdigest()[:16]
+
+
+def get_snapshot(office: str, limit_called: int, limit_waiting: int) -> dict:
+    """Повертає {"last_called": [...], "waiting": [...]} з кешу або будує знімок з БД."""
+    key = _snapshot_key(office, get_version(office), limit_called, limit_waiting)
+    snapshot = frappe.cache().get_value(key)
+    if snapshot is None:
+        snapshot = build_snapshot(office, limit_called, limit_waiting)
+        frappe.cache().set_value(key, snapshot, expires_in_sec=SNAPSHOT_TTL_SEC)
+    return snapshot
+
+
+def build_snapshot(office: str, limit_called: int, limit_waiting: int) -> dict:
+    # --- Отримуємо останні викликані ---
+    last_called = []
+    potential_called = frappe.get_all(
+        "QMS Ticket",
+        filters={
+            "office": office,
+            "status": "Called",
+            # Обмежуємо сьогоднішнім днем для продуктивності
+            "call_time": [">=", today() + " 00:00:00"],
+        },
+        fields=["name", "ticket_number", "service_point_name", "call_time"],
+        # Сортуємо за часом виклику, найновіші зверху
+        order_by="call_time desc",
+        limit_page_length=limit_called
+    )
+
+    for ticket in potential_called:
+        call_time_dt = get_datetime(ticket.call_time) if ticket.call_time else None
+        last_called.append({
+            "ticket": _short_number(ticket.ticket_number) or ticket.name,
+            "window": ticket.service_point_name or "N/A",
+            "time": call_time_dt.strftime("%H:%M") if call_time_dt else "--:--"
+        })
+
+    # --- Отримуємо наступних у черзі ---
+    waiting_raw = frappe.get_all(
+        "QMS Ticket",
+        filters={"office": office, "status": "Waiting"},
+        fields=["name", "ticket_number", "service", "service_name"],
+        order_by="priority desc, creation asc",
+        limit_page_length=limit_waiting
+    )
+
+    waiting = [{
+        "ticket": _short_number(row.ticket_number) or row.name,
+        "service": row.service_name or _("Service not specified"),
+        "service_id": row.service  # ID для можливої стилізації на фронтенді
+    } for row in waiting_raw]
+
+    return {"last_called": last_called, "waiting": waiting}
+
+
+def _short_number(ticket_number):
+    if ticket_number and '-' in ticket_number:
+        return ticket_number.split('-')[-1]
+    return ticket_number
@@ -0,0 +1,181 @@
+from datetime import datetime, timedelta
+
+import frappe
+from frappe import _
+
+from qms_cherga.qms_cherga.doctype.qms_schedule.qms_schedule import get_intervals_for_date
+from qms_cherga.utils.office_context import get_office_context
+
+# Стартові дані кіоску на офіс. Інформація про офіс та графік - з контексту офісу
+# (utils/office_context.py), дерево послуг кешується тут. Як і знімок табло, ключ
+# містить версії: власну версію офісу (офіс та його призначення послуг) і спільну
+# версію довідників (послуги, категорії, організації).
+# Інвалідація - нова версія зараз і ще раз після коміту (дерево, зібране зі старих
+# рядків до коміту, інакше жило б під новою версією до TTL); старі записи зникають за TTL.
+BOOTSTRAP_TTL_SEC = 3600
+# Наступну зміну стану шукаємо в межах двох тижнів (винятки графіка можуть закривати дні поспіль)
+TRANSITION_LOOKAHEAD_DAYS = 14
+
+_SHARED_VERSION_KEY = "qms_kiosk_version"
+
+
+def _office_version_key(office: str) -> str:
+    return f"qms_kiosk_version:{office}"
+
+
+def _bootstrap_key(office: str, office_version: str, shared_version: str) -> str:
+    return f"qms_kiosk_bootstrap:{office}:{office_version}:{shared_version}"
+
+
+def _get_version(key: str) -> str:
+    version = frappe.cache().get_value(key)
+    if not version:
+        version = frappe.generate_hash(length=12)
+        frappe.cache().set_value(key, version)
+    return version
+
+
+def _bump_version(key: str):
+    def _bump():
+        frappe.cache().set_value(key, frappe.generate_hash(length=12))
+
+    _bump()
+    frappe.db.after_commit.add(_bump)
+
+
+def invalidate(office: str):
+    """Змінився офіс або його призначення послуг."""
+    if office:
+        _bump_version(_office_version_key(office))
+
+
+def invalidate_all():
+    """Змінились послуга, категорія чи організація - дані всіх кіосків застаріли."""
+    _bump_version(_SHARED_VERSION_KEY)
+
+
+def get_bootstrap(office: str) -> dict | None:
+    """
+    Стартові дані кіоску: кешована частина плюс стан роботи на поточний момент.
+    None - офісу не існує.
+    """
+    office_ctx = get_office_context(office)
+    if not office_ctx:
+        return None
+
+    key = _bootstrap_key(office, _get_version(_office_version_key(office)), _get_version(_SHARED_VERSION_KEY))
+    cached = frappe.cache().get_value(key)
+    if cached is None:
+        cached = build_service_tree(office)
+        frappe.cache().set_value(key, cached, expires_in_sec=BOOTSTRAP_TTL_SEC)
+
+    return {
+        "office": {
+            "name": office_ctx.name,
+            "office_name": office_ctx.office_name,
+            "organization": office_ctx.organization,
+            "organization_name": office_ctx.organization_name,
+            "timezone": office_ctx.timezone,
+            "address": office_ctx.address,
+            "contact_phone": office_ctx.contact_phone,
+        },
+        **cached,
+        **get_open_state(office_ctx),
+    }
+
+
+def build_service_tree(office: str) -> dict:
+    """
+    Активні послуги офісу у порядку призначень, згруповані за категоріями
+    (категорії - за display_order). Один запит з JOIN замість трьох.
+    """
+    rows = frappe.db.sql(
+        """
+        SELECT service.name, service.service_name, service.icon, service.category,
+            category.category_name, category.display_order
+        FROM `tabQMS Office Service Assignment` assignment
+        JOIN `tabQMS Service` service ON service.name = assignment.service
+        LEFT JOIN `tabQMS Service Category` category ON category.name = service.category
+        WHERE assignment.parent = %(office)s
+            AND assignment.parenttype = 'QMS Office'
+            AND assignment.is_active_in_office = 1
+            AND service.enabled = 1
+            AND service.live_queue_enabled = 1
+        ORDER BY assignment.idx ASC
+        """,
+        {"office": office},
+        as_dict=True,
+    )
+
+    categories = {}
+    services_no_category = []
+    for row in rows:
+        service_data = {"id": row.name, "label": row.service_name, "icon": row.icon or ""}
+        if row.category and row.category_name is not None:
+            category = categories.setdefault(row.category, {
+                "label": row.category_name,
+                "order": (row.display_order or 0, row.category_name),
+                "services": [],
+            })
+            category["services"].append(service_data)
+        else:
+            services_no_category.append(service_data)
+
+    return {
+        "categories": [
+            {"label": category["label"], "services": category["services"]}
+            for category in sorted(categories.values(), key=lambda category: category["order"])
+        ],
+        "services_no_category": services_no_category,
+    }
+
+
+def get_open_state(office_ctx) -> dict:
+    """Чи відкрито зараз та найближча зміна стану (ISO з часовою зоною офісу)."""
+    if not office_ctx.schedule:
+        return {
+            "is_open": False,
+            "next_transition": None,
+            "closed_message": _("Working schedule not configured for office '{0}'.").format(office_ctx.office_name),
+        }
+
+    is_open, transition = next_transition(office_ctx.compiled_schedule(), office_ctx.now_local())
+
+    return {
+        "is_open": is_open,
+        "next_transition": transition and {
+            "type": "close" if is_open else "open",
+            "at": transition.isoformat(),
+        },
+        "closed_message": None if is_open else _("Office '{0}' is currently closed.").format(office_ctx.office_name),
+    }
+
+
+def next_transition(compiled: dict, now_local: datetime) -> tuple:
+    """
+    (відкрито зараз, момент найближчої зміни стану або None).
+    Суміжні інтервали (13:00-14:00 та 14:00-18:00) вважаються одним.
+    """
+    seconds = now_local.hour * 3600 + now_local.minute * 60 + now_local.second
+    midnight = now_local.replace(hour=0, minute=0, second=0, microsecond=0)
+    is_open = any(start <= seconds < end for start, end in get_intervals_for_date(compiled, now_local.date()))
+
+    for offset in range(TRANSITION_LOOKAHEAD_DAYS + 1):
+        day = midnight + timedelta(days=offset)
+        for start, end in _merge(get_intervals_for_date(compiled, day.date())):
+            if is_open and offset == 0 and start <= seconds < end:
+                return True, day + timedelta(seconds=end)
+            if not is_open and (offset > 0 or start > seconds):
+                return False, day + timedelta(seconds=start)
+
+    return is_open, None
+
+
+def _merge(intervals: list) -> list:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
@@ -0,0 +1,232 @@
+import heapq
+
+import frappe
+from frappe.utils import cint, get_datetime
+
+from qms_cherga.utils.cache import decode, pipeline
+
+# Черга очікуючих талонів у Redis: один sorted set на пару (офіс, послуга).
+# Менший score = раніше в черзі: спершу вищий пріоритет, потім раніший creation.
+PRIORITY_LEVELS = 100
+PRIORITY_WEIGHT = 10**13  # більше за будь-який epoch у мілісекундах, score залишається точним у double
+
+DEFAULT_CANDIDATES = 5
+# Позначка "черга офісу завантажена" живе обмежено: після TTL черга перебудовується
+# з БД. Розбіжності між перебудовами прибирає tasks.repair_live_queues (hooks.py).
+READY_TTL_SEC = 3600
+# Журнал синхронізацій офісу (талон -> останній запис): перебудова повторює записи,
+# зроблені між її читанням БД і записом у Redis, інакше вона стерла б щойно доданий талон.
+# Повторюються саме записи, а не читання БД: знімок транзакції перебудови їх не бачить.
+JOURNAL_TTL_SEC = 120
+REBUILD_LOCK_TIMEOUT_SEC = 30
+
+
+def _queue_key(office: str, service: str) -> str:
+    return f"qms_live_queue:{office}:{service}"
+
+
+def _services_key(office: str) -> str:
+    return f"qms_live_queue_services:{office}"
+
+
+def _ready_key(office: str) -> str:
+    return f"qms_live_queue_ready:{office}"
+
+
+def _journal_key(office: str) -> str:
+    return f"qms_live_queue_journal:{office}"
+
+
+def _lock_key(office: str) -> str:
+    return f"qms_live_queue_rebuild:{office}"
+
+
+def ticket_score(priority, creation) -> int:
+    priority = min(max(cint(priority), 0), PRIORITY_LEVELS - 1)
+    creation_ms = int(get_datetime(creation).timestamp() * 1000)
+    return (PRIORITY_LEVELS - 1 - priority) * PRIORITY_WEIGHT + creation_ms
+
+
+def add_ticket(ticket_name: str, office: str, service: str, priority, creation):
+    pipe, key = pipeline()
+    score = ticket_score(priority, creation)
+    pipe.zadd(key(_queue_key(office, service)), {ticket_name: score})
+    pipe.sadd(key(_services_key(office)), service)
+    _journal(pipe, key, office, ticket_name, service, score)
+    pipe.execute()
+
+
+def remove_ticket(ticket_name: str, office: str, service: str):
+    pipe, key = pipeline()
+    pipe.zrem(key(_queue_key(office, service)), ticket_name)
+    _journal(pipe, key, office, ticket_name, service)
+    pipe.execute()
+
+
+def _journal(pipe, key, office: str, ticket_name: str, service: str, score=None):
+    """Запис у журнал: "service|score" - талон у черзі, "service|" - талон вилучено."""
+    pipe.hset(key(_journal_key(office)), ticket_name, f"{service}|{'' if score is None else score}")
+    pipe.expire(key(_journal_key(office)), JOURNAL_TTL_SEC)
+
+
+def remove_tickets(office: str, tickets: list):
+    """Видаляє пачку талонів [(ticket_name, service), ...] одним пайплайном."""
+    pipe, key = pipeline()
+    for ticket_name, service in tickets:
+        pipe.zrem(key(_queue_key(office, service)), ticket_name)
+        _journal(pipe, key, office, ticket_name, service)
+    pipe.execute()
+
+
+def sync_ticket(ticket_name: str, office: str, service: str, status: str, priority, creation):
+    """Приводить рушій у відповідність до стану талону: Waiting - в черзі, інакше - ні."""
+    if not office or not service:
+        return
+    if status == "Waiting":
+        add_ticket(ticket_name, office, service, priority, creation)
+    else:
+        remove_ticket(ticket_name, office, service)
+
+
+def get_next_candidates(office: str, services: list, limit: int = DEFAULT_CANDIDATES) -> list:
+    """
+    Зливає "голови" sorted set-ів послуг оператора і повертає до `limit`
+    кандидатів [(ticket_name, service), ...] у порядку черги.
+    """
+    if not services:
+        return []
+    ensure_office_loaded(office)
+
+    pipe, key = pipeline()
+    for service in services:
+        pipe.zrange(key(_queue_key(office, service)), 0, limit - 1, withscores=True)
+    heads = [
+        [(score, decode(member), service) for member, score in rows]
+        for service, rows in zip(services, pipe.execute(), strict=True)
+    ]
+    return [(name, service) for _score, name, service in heapq.merge(*heads)][:limit]
+
+
+def queue_length(office: str, service: str) -> int:
+    """Кількість очікуючих талонів послуги в офісі (ZCARD, O(1))."""
+    ensure_office_loaded(office)
+    pipe, key = pipeline()
+    pipe.zcard(key(_queue_key(office, service)))
+    return int(pipe.execute()[0])
+
+
+def queue_position(office: str, service: str, ticket_name: str):
+    """Скільки талонів послуги попереду (ZRANK, O(log n)); None - талон уже не в черзі."""
+    ensure_office_loaded(office)
+    pipe, key = pipeline()
+    pipe.zrank(key(_queue_key(office, service)), ticket_name)
+    rank = pipe.execute()[0]
+    return None if rank is None else int(rank)
+
+
+def ensure_office_loaded(office: str):
+    """Холодний старт: якщо черги офісу ще немає в Redis, будуємо її з БД."""
+    pipe, key = pipeline()
+    pipe.exists(key(_ready_key(office)))
+    if not pipe.execute()[0]:
+        rebuild_office(office)
+
+
+def rebuild_office(office: str) -> int:
+    """
+    Повністю перебудовує чергу офісу з БД. Повертає кількість талонів у черзі.
+
+    Перебудови офісу серіалізуються блокуванням Redis. Синхронізації, що відбулися
+    після читання БД (журнал офісу), повторюються поверх нової черги.
+    """
+    _pipe, key = pipeline()
+    with frappe.cache().lock(key(_lock_key(office)), timeout=REBUILD_LOCK_TIMEOUT_SEC,
+                             blocking_timeout=REBUILD_LOCK_TIMEOUT_SEC):
+        return _rebuild_office(office)
+
+
+def _rebuild_office(office: str) -> int:
+    pipe, key = pipeline()
+    pipe.delete(key(_journal_key(office)))
+    pipe.execute()
+
+    waiting = _get_waiting_from_db(office)
+
+    pipe, key = pipeline()
+    pipe.smembers(key(_services_key(office)))
+    old_services = {decode(s) for s in pipe.execute()[0]}
+
+    by_service = {}
+    for row in waiting:
+        by_service.setdefault(row.service, {})[row.name] = ticket_score(row.priority, row.creation)
+
+    # MULTI/EXEC: клієнти бачать або стару, або нову чергу повністю
+    pipe, key = pipeline()
+    for service in old_services | set(by_service):
+        pipe.delete(key(_queue_key(office, service)))
+    pipe.delete(key(_services_key(office)))
+    for service, mapping in by_service.items():
+        pipe.zadd(key(_queue_key(office, service)), mapping)
+        pipe.sadd(key(_services_key(office)), service)
+    pipe.set(key(_ready_key(office)), 1, ex=READY_TTL_SEC)
+    pipe.hgetall(key(_journal_key(office)))
+    pipe.delete(key(_journal_key(office)))
+    journal = pipe.execute()[-2]
+
+    if journal:
+        pipe, key = pipeline()
+        for ticket_name, entry in journal.items():
+            ticket_name = decode(ticket_name)
+            service, _, score = decode(entry).partition("|")
+            if score:
+                pipe.zadd(key(_queue_key(office, service)), {ticket_name: int(score)})
+                pipe.sadd(key(_services_key(office)), service)
+            else:
+                pipe.zrem(key(_queue_key(office, service)), ticket_name)
+        pipe.execute()
+    return len(waiting)
+
+
+def check_consistency(office: str, repair: bool = False) -> dict:
+    """
+    Порівнює рушій із SQL: талони, яких бракує в Redis, зайві талони
+    та талони з неправильним положенням у черзі.
+    З repair=True при розбіжностях черга офісу перебудовується.
+    """
+    expected = {
+        row.name: (row.service, ticket_score(row.priority, row.creation))
+        for row in _get_waiting_from_db(office)
+    }
+
+    pipe, key = pipeline()
+    pipe.smembers(key(_services_key(office)))
+    services = sorted(
+        {decode(s) for s in pipe.execute()[0]}
+        | {service for service, _score in expected.values()}
+    )
+    pipe, key = pipeline()
+    for service in services:
+        pipe.zrange(key(_queue_key(office, service)), 0, -1, withscores=True)
+    actual = {}
+    for service, rows in zip(services, pipe.execute(), strict=True):
+        for member, score in rows:
+            actual[decode(member)] = (service, int(score))
+
+    report = {
+        "office": office,
+        "missing": sorted(set(expected) - set(actual)),
+        "extra": sorted(set(actual) - set(expected)),
+        "mismatched": sorted(name for name in set(expected) & set(actual) if expected[name] != actual[name]),
+    }
+    report["consistent"] = not (report["missing"] or report["extra"] or report["mismatched"])
+    if repair and not report["consistent"]:
+        rebuild_office(office)
+    return report
+
+
+def _get_waiting_from_db(office: str):
+    return frappe.get_all(
+        "QMS Ticket",
+        filters={"office": office, "status": "Waiting"},
+        fields=["name", "service", "priority", "creation"],
+    )
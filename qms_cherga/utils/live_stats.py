@@ -0,0 +1,63 @@
+import frappe
+from frappe.utils import today
+
+# "Живі" дані панелі оператора на офіс: статистика черги та відкладені талони.
+# Кешуються ненадовго; переходи талонів інвалідують кеш одразу.
+LIVE_STATS_TTL_SEC = 10
+
+FINISHED_STATUSES = ("Completed", "NoShow")
+
+# Усі лічильники одним GROUP BY; обслужені рахуються лише за сьогодні
+LIVE_COUNTS_QUERY = """
+    SELECT status, COUNT(*)
+    FROM `tabQMS Ticket`
+    WHERE office = %(office)s
+        AND (
+            status IN ('Waiting', 'Serving')
+            OR (status IN %(finished)s AND completion_time >= %(today)s)
+        )
+    GROUP BY status
+"""
+
+
+def live_counts_values(office: str) -> dict:
+    return {"office": office, "finished": FINISHED_STATUSES, "today": today()}
+
+
+def _live_stats_key(office: str) -> str:
+    return f"qms_live_stats:{office}:{today()}"
+
+
+def invalidate(office: str):
+    if office:
+        frappe.cache().delete_value(_live_stats_key(office))
+
+
+def get_live_stats(office: str) -> dict:
+    """Повертає {"stats": {...}, "postponed_tickets": [...]} з кешу або з БД (два запити)."""
+    key = _live_stats_key(office)
+    live_stats = frappe.cache().get_value(key)
+    if live_stats is None:
+        live_stats = build_live_stats(office)
+        frappe.cache().set_value(key, live_stats, expires_in_sec=LIVE_STATS_TTL_SEC)
+    return live_stats
+
+
+def build_live_stats(office: str) -> dict:
+    counts = dict(frappe.db.sql(LIVE_COUNTS_QUERY, live_counts_values(office)))
+
+    stats = {
+        "waiting": counts.get("Waiting", 0),
+        "serving": counts.get("Serving", 0),
+        "finished_today": sum(counts.get(status, 0) for status in FINISHED_STATUSES),
+    }
+
+    # Назва послуги збережена в талоні, тож окремих запитів на кожен талон немає
+    postponed_tickets = frappe.get_all(
+        "QMS Ticket",
+        filters={"office": office, "status": "Postponed"},
+        fields=["name", "ticket_number", "service", "service_name"],
+        order_by="modified desc",
+    )
+
+    return {"stats": stats, "postponed_tickets": postponed_tickets}
@@ -0,0 +1,307 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from frappe.utils import cint, flt, now_datetime
+
+# Навантажувальний тест: кіоски видають талони, оператори циклічно викликають,
+# починають і завершують обслуговування, табло опитують get_display_data.
+# Запуск на тестовому сайті (створює реальні талони):
+#   bench --site test.local execute qms_cherga.utils.load_test.run \
+#       --kwargs "{'office': 'OFFICE-ID', 'kiosks': 10, 'boards': 50, 'duration': 60}"
+# Через HTTP (оператори - токени API "key:secret"):
+#   ... --kwargs "{'office': 'OFFICE-ID', 'transport': 'http', 'base_url': 'http://127.0.0.1:8000',
+#                  'operator_tokens': ['key:secret']}"
+API_PREFIX = "qms_cherga.api."
+PERCENTILES = (50, 95, 99)
+
+
+class Recorder:
+    """Потокобезпечний збір затримок (мс) та помилок за ендпоінтами."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, endpoint: str, elapsed_ms: float, ok: bool):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed_ms)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, elapsed_sec: float) -> dict:
+        with self._lock:
+            endpoints = {
+                endpoint: summarize_latencies(values, self.errors.get(endpoint, 0), elapsed_sec)
+                for endpoint, values in sorted(self.latencies.items())
+            }
+        calls = sum(stats["count"] for stats in endpoints.values())
+        errors = sum(stats["errors"] for stats in endpoints.values())
+        return {
+            "endpoints": endpoints,
+            "totals": {
+                "count": calls,
+                "errors": errors,
+                "error_rate": round(errors / calls, 4) if calls else 0,
+                "throughput_rps": round(calls / elapsed_sec, 2) if elapsed_sec else 0,
+            },
+        }
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Перцентиль методом найближчого рангу (значення з вибірки, без інтерполяції)."""
+    if not sorted_values:
+        return 0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(values: list, errors: int, elapsed_sec: float) -> dict:
+    ordered = sorted(values)
+    count = len(ordered)
+    stats = {
+        "count": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0,
+        "throughput_rps": round(count / elapsed_sec, 2) if elapsed_sec else 0,
+        "mean_ms": round(sum(ordered) / count, 2) if count else 0,
+        "max_ms": round(ordered[-1], 2) if count else 0,
+    }
+    for pct in PERCENTILES:
+        stats[f"p{pct}_ms"] = round(percentile(ordered, pct), 2)
+    return stats
+
+
+# --- Транспорти ---
+
+
+class DirectTransport:
+    """Виклик функцій api.py у процесі: кожен актор - окремий потік з власним з'єднанням."""
+
+    def __init__(self, site: str, sites_path: str):
+        self.site = site
+        self.sites_path = sites_path
+
+    def start(self, user: str | None):
+        frappe.init(site=self.site, sites_path=self.sites_path)
+        frappe.connect()
+        frappe.set_user(user or "Guest")
+
+    def call(self, method: str, **kwargs) -> tuple:
+        _reset_request_state()
+        try:
+            response = frappe.get_attr(API_PREFIX + method)(**kwargs)
+            # Кожен виклик - окремий "запит": нова транзакція бачить зміни інших акторів
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            return False, None
+        return _is_ok(response), response
+
+    def stop(self):
+        frappe.destroy()
+
+
+class HttpTransport:
+    """Виклики через HTTP до запущеного bench; гості - без автентифікації, оператори - токен API."""
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def start(self, token: str | None):
+        import requests
+
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"token {token}"
+
+    def call(self, method: str, **kwargs) -> tuple:
+        try:
+            http_response = self.session.post(
+                f"{self.base_url}/api/method/{API_PREFIX}{method}", data=kwargs, timeout=self.timeout)
+            response = http_response.json().get("message")
+        except Exception:
+            return False, None
+        return http_response.ok and _is_ok(response), response
+
+    def stop(self):
+        self.session.close()
+
+
+def _is_ok(response) -> bool:
+    # info (офіс закрито, черга порожня) - штатна відповідь, не помилка
+    return isinstance(response, dict) and response.get("status") in ("success", "info")
+
+
+def _reset_request_state():
+    """Скидає кеші рівня запиту (frappe.local), як це робить веб-сервер між запитами."""
+    for attr in ("cache", "document_cache", "qms_office_context"):
+        if isinstance(getattr(frappe.local, attr, None), dict):
+            setattr(frappe.local, attr, {})
+
+
+# --- Актори ---
+
+
+class Actor:
+    def __init__(self, transport_factory, recorder: Recorder, deadline: float, identity=None):
+        self.transport = transport_factory()
+        self.recorder = recorder
+        self.deadline = deadline
+        self.identity = identity
+
+    def call(self, method: str, **kwargs):
+        started = time.perf_counter()
+        ok, response = self.transport.call(method, **kwargs)
+        self.recorder.record(method, (time.perf_counter() - started) * 1000, ok)
+        return ok, response
+
+    def pause(self, seconds: float):
+        # Випадкове відхилення ±20%, щоб актори не синхронізувались
+        time.sleep(min(seconds * random.uniform(0.8, 1.2), max(self.deadline - time.monotonic(), 0)))
+
+    def running(self) -> bool:
+        return time.monotonic() < self.deadline
+
+    def run(self, *args):
+        self.transport.start(self.identity)
+        try:
+            self.loop(*args)
+        finally:
+            self.transport.stop()
+
+
+class KioskActor(Actor):
+    def loop(self, office: str, interval: float):
+        _ok, response = self.call("get_kiosk_bootstrap", office=office)
+        data = (response or {}).get("data") or {}
+        services = [
+            service["id"]
+            for group in [*(c["services"] for c in data.get("categories", [])), data.get("services_no_category", [])]
+            for service in group
+        ]
+        if not services:
+            return
+        while self.running():
+            self.call("create_live_queue_ticket", service=random.choice(services), office=office)
+            self.pause(interval)
+
+
+class OperatorActor(Actor):
+    def loop(self, office: str, service_secs: float, idle_secs: float):
+        ok, response = self.call("get_operator_dashboard_data")
+        data = (response or {}).get("data") or {}
+        points = data.get("service_points") or []
+        if not ok or not points:
+            return
+        point = random.choice(points)["name"]
+        if data.get("active_ticket"):
+            self.call("finish_service", ticket_name=data["active_ticket"]["name"])
+
+        while self.running():
+            ok, response = self.call("call_next_visitor", service_point_name=point)
+            ticket = ((response or {}).get("data") or {}).get("ticket_info")
+            if not ok or not ticket:
+                self.pause(idle_secs)
+                continue
+            self.call("start_service", ticket_name=ticket.get("name"))
+            self.pause(service_secs)
+            self.call("finish_service", ticket_name=ticket.get("name"))
+
+
+class BoardActor(Actor):
+    def loop(self, office: str, interval: float):
+        etag = None
+        while self.running():
+            _ok, response = self.call("get_display_data", office=office, etag=etag)
+            etag = ((response or {}).get("data") or {}).get("etag") or etag
+            self.pause(interval)
+
+
+# --- Запуск ---
+
+
+def run(office: str, kiosks: int = 5, operators: int = 3, boards: int = 10, duration: float = 60,
+        kiosk_interval: float = 5, board_interval: float = 3, service_secs: float = 2, idle_secs: float = 1,
+        transport: str = "direct", base_url: str | None = None, operator_tokens=None,
+        output: str | None = None) -> dict:
+    """
+    Запускає навантаження на `duration` секунд і повертає (та записує в JSON) звіт:
+    p50/p95/p99, пропускна здатність і частка помилок для кожного ендпоінта.
+    """
+    kiosks, operators, boards = cint(kiosks), cint(operators), cint(boards)
+    duration = flt(duration)
+
+    if transport == "http":
+        if not base_url:
+            frappe.throw("base_url is required for the http transport")
+        transport_factory = lambda: HttpTransport(base_url)  # noqa: E731
+        operator_identities = list(frappe.parse_json(operator_tokens) if isinstance(operator_tokens, str)
+                                   else operator_tokens or [])[:operators]
+    else:
+        site, sites_path = frappe.local.site, frappe.local.sites_path
+        transport_factory = lambda: DirectTransport(site, sites_path)  # noqa: E731
+        operator_identities = frappe.get_all(
+            "QMS Operator", filters={"default_office": office, "is_active": 1}, pluck="user", limit=operators)
+
+    recorder = Recorder()
+    started_at = now_datetime()
+    started = time.monotonic()
+    deadline = started + duration
+
+    actors = [
+        *[(KioskActor(transport_factory, recorder, deadline), (office, flt(kiosk_interval))) for _ in range(kiosks)],
+        *[(OperatorActor(transport_factory, recorder, deadline, user), (office, flt(service_secs), flt(idle_secs)))
+          for user in operator_identities],
+        *[(BoardActor(transport_factory, recorder, deadline), (office, flt(board_interval))) for _ in range(boards)],
+    ]
+    with ThreadPoolExecutor(max_workers=len(actors) or 1) as executor:
+        for future in [executor.submit(actor.run, *args) for actor, args in actors]:
+            future.result()
+
+    elapsed = time.monotonic() - started
+    report = {
+        "config": {
+            "office": office, "transport": transport, "kiosks": kiosks, "operators": len(operator_identities),
+            "boards": boards, "duration_sec": duration, "kiosk_interval": flt(kiosk_interval),
+            "board_interval": flt(board_interval), "service_secs": flt(service_secs),
+        },
+        "started_at": str(started_at),
+        "elapsed_sec": round(elapsed, 2),
+        **recorder.summary(elapsed),
+    }
+
+    output = output or frappe.get_site_path("load_tests", f"{started_at:%Y%m%d-%H%M%S}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    report["output"] = output
+    return report
+
+
+def compare(baseline: str, current: str) -> dict:
+    """Порівняння двох звітів: зміна p95 (мс) та пропускної здатності за ендпоінтами."""
+    with open(baseline) as f:
+        before = json.load(f)
+    with open(current) as f:
+        after = json.load(f)
+
+    diff = {}
+    for endpoint, stats in after["endpoints"].items():
+        base = before["endpoints"].get(endpoint)
+        if not base:
+            continue
+        diff[endpoint] = {
+            "p95_ms": [base["p95_ms"], stats["p95_ms"]],
+            "throughput_rps": [base["throughput_rps"], stats["throughput_rps"]],
+            "error_rate": [base["error_rate"], stats["error_rate"]],
+        }
+    return diff
@@ -0,0 +1,283 @@
+import functools
+import secrets
+import threading
+import time
+
+import frappe
+from frappe.utils import cint
+
+from qms_cherga.utils.cache import decode, pipeline
+
+# Інструментування API та хуків QMS Ticket: тривалість виклику, кількість SQL-запитів
+# і час у SQL. Спостереження накопичуються в пам'яті процесу (гістограми з фіксованими
+# кошиками) і раз на FLUSH_INTERVAL_SEC одним пайплайном додаються до хеша в Redis,
+# тож експорт бачить сумарні дані всіх воркерів. Експорт - api.get_metrics (Prometheus).
+#
+# Налаштування site_config.json:
+#   qms_slow_call_ms  - поріг повільного виклику, мс (0 - вимкнути журнал), за замовчуванням 1000
+#   qms_metrics_token - токен для збирача метрик (заголовок X-Metrics-Token або параметр token)
+METRICS_CACHE_KEY = "qms_metrics"
+FLUSH_INTERVAL_SEC = 10
+DEFAULT_SLOW_CALL_MS = 1000
+MAX_LOGGED_QUERIES = 100
+MAX_QUERY_LENGTH = 1000
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+# {метрика: (опис, кошики)}
+HISTOGRAMS = {
+    "qms_call_duration_seconds": ("Wall time of instrumented calls.", DURATION_BUCKETS),
+    "qms_call_sql_queries": ("SQL queries executed per call.", QUERY_BUCKETS),
+    "qms_call_sql_duration_seconds": ("Time spent in SQL per call.", DURATION_BUCKETS),
+}
+ERRORS_METRIC = "qms_call_errors_total"
+SHED_METRIC = "qms_requests_shed_total"
+
+_lock = threading.Lock()
+# {site: {"метрика|ендпоінт|кошик": значення}} - ще не передані в Redis
+_pending = {}
+# {site: time.monotonic() останньої передачі}
+_last_flush = {}
+
+
+class CallFrame:
+    """SQL-запити одного інструментованого виклику."""
+
+    __slots__ = ("queries", "query_count", "sql_time")
+
+    def __init__(self):
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.queries = []
+
+    def add_query(self, query, elapsed: float):
+        self.query_count += 1
+        self.sql_time += elapsed
+        if len(self.queries) < MAX_LOGGED_QUERIES:
+            self.queries.append((query, elapsed))
+
+
+def instrumented(name: str | None = None):
+    """
+    Декоратор: вимірює виклик і додає його до гістограм під іменем `name`
+    (за замовчуванням - ім'я функції). Для whitelisted-функцій ставиться під
+    @frappe.whitelist. Вкладені виклики (хуки талону всередині API) враховують
+    свої запити і в зовнішньому виклику.
+    """
+
+    def decorator(fn):
+        endpoint = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            frames = _frames()
+            outermost = not frames
+            restore_sql = _install_sql_hook() if outermost else None
+            frame = CallFrame()
+            frames.append(frame)
+            failed = True
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                frames.pop()
+                if restore_sql:
+                    restore_sql()
+                _observe(endpoint, elapsed, frame, failed)
+
+        return wrapper
+
+    return decorator
+
+
+def _frames() -> list:
+    if not hasattr(frappe.local, "qms_metrics_frames"):
+        frappe.local.qms_metrics_frames = []
+    return frappe.local.qms_metrics_frames
+
+
+def _install_sql_hook():
+    """
+    Підміняє frappe.db.sql на час зовнішнього виклику (атрибут екземпляра,
+    як і FrappeTestCase.assertQueryCount) і повертає функцію відновлення.
+    """
+    db = frappe.local.db
+    if not db:
+        return None
+
+    had_override = "sql" in vars(db)
+    previous = db.sql
+
+    def sql(query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return previous(query, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            executed = getattr(db, "last_query", None) or query
+            for frame in _frames():
+                frame.add_query(executed, elapsed)
+
+    db.sql = sql
+
+    def restore():
+        if had_override:
+            db.sql = previous
+        else:
+            del db.sql
+
+    return restore
+
+
+def _observe(endpoint: str, elapsed: float, frame: CallFrame, failed: bool):
+    site = frappe.local.site
+    with _lock:
+        pending = _pending.setdefault(site, {})
+        _add_observation(pending, "qms_call_duration_seconds", endpoint, elapsed)
+        _add_observation(pending, "qms_call_sql_queries", endpoint, frame.query_count)
+        _add_observation(pending, "qms_call_sql_duration_seconds", endpoint, frame.sql_time)
+        if failed:
+            field = f"{ERRORS_METRIC}|{endpoint}|"
+            pending[field] = pending.get(field, 0) + 1
+        due = time.monotonic() - _last_flush.get(site, 0) >= FLUSH_INTERVAL_SEC
+
+    _log_if_slow(endpoint, elapsed, frame)
+    if due:
+        _flush_quietly()
+
+
+def record_shed(endpoint: str):
+    """Запит, відкинутий обмеженням частоти (utils/rate_limit.py)."""
+    site = frappe.local.site
+    with _lock:
+        pending = _pending.setdefault(site, {})
+        field = f"{SHED_METRIC}|{endpoint}|"
+        pending[field] = pending.get(field, 0) + 1
+        due = time.monotonic() - _last_flush.get(site, 0) >= FLUSH_INTERVAL_SEC
+    if due:
+        _flush_quietly()
+
+
+def _log_if_slow(endpoint: str, elapsed: float, frame: CallFrame):
+    slow_call_ms = cint(frappe.conf.get("qms_slow_call_ms", DEFAULT_SLOW_CALL_MS))
+    if slow_call_ms and elapsed * 1000 >= slow_call_ms:
+        _log_slow_call(endpoint, elapsed, frame)
+
+
+def _flush_quietly():
+    try:
+        flush()
+    except Exception:
+        # Недоступний Redis не повинен ламати сам виклик; дані цього інтервалу втрачаються
+        frappe.logger("qms_metrics").warning("Failed to flush QMS metrics to Redis", exc_info=True)
+
+
+def _add_observation(pending: dict, metric: str, endpoint: str, value: float):
+    # Кошики зберігаються некумулятивно (перший кошик, що вміщує значення); сума - на експорті
+    bucket = next((le for le in HISTOGRAMS[metric][1] if value <= le), "+Inf")
+    for field, amount in ((f"{metric}|{endpoint}|{bucket}", 1), (f"{metric}|{endpoint}|sum", value)):
+        pending[field] = pending.get(field, 0) + amount
+
+
+def _log_slow_call(endpoint: str, elapsed: float, frame: CallFrame):
+    lines = [
+        f"Slow call {endpoint}: {elapsed * 1000:.1f} ms, "
+        f"{frame.query_count} SQL queries, {frame.sql_time * 1000:.1f} ms in SQL"
+    ]
+    for query, query_elapsed in frame.queries:
+        lines.append(f"  {query_elapsed * 1000:8.1f} ms  {str(decode(query))[:MAX_QUERY_LENGTH]}")
+    if frame.query_count > len(frame.queries):
+        lines.append(f"  ... {frame.query_count - len(frame.queries)} more")
+    frappe.logger("qms_metrics").warning("\n".join(lines))
+
+
+def flush():
+    """Передає накопичені спостереження процесу в Redis (HINCRBYFLOAT)."""
+    site = frappe.local.site
+    with _lock:
+        pending = _pending.pop(site, None)
+        _last_flush[site] = time.monotonic()
+    if not pending:
+        return
+
+    pipe, make_key = pipeline()
+    key = make_key(METRICS_CACHE_KEY)
+    for field, amount in pending.items():
+        pipe.hincrbyfloat(key, field, amount)
+    pipe.execute()
+
+
+def reset():
+    with _lock:
+        _pending.pop(frappe.local.site, None)
+    frappe.cache().delete_value(METRICS_CACHE_KEY)
+
+
+def get_totals() -> dict:
+    """{(метрика, ендпоінт, кошик): значення} з Redis, разом з ще не переданими даними процесу."""
+    flush()
+    pipe, make_key = pipeline()
+    pipe.hgetall(make_key(METRICS_CACHE_KEY))
+    raw = pipe.execute()[0] or {}
+    return {tuple(decode(field).split("|", 2)): float(decode(value)) for field, value in raw.items()}
+
+
+def render_prometheus() -> str:
+    """Текстовий формат експозиції Prometheus 0.0.4."""
+    totals = get_totals()
+    endpoints = sorted({endpoint for _metric, endpoint, _part in totals})
+    lines = []
+
+    for metric, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for endpoint in endpoints:
+            label = f'endpoint="{_escape_label(endpoint)}"'
+            cumulative = 0
+            bucket_lines = []
+            for le in (*buckets, "+Inf"):
+                cumulative += totals.get((metric, endpoint, str(le)), 0)
+                bucket_lines.append(f'{metric}_bucket{{{label},le="{le}"}} {_format_number(cumulative)}')
+            if not cumulative:
+                continue
+            lines += bucket_lines
+            lines.append(f"{metric}_sum{{{label}}} {_format_number(totals.get((metric, endpoint, 'sum'), 0))}")
+            lines.append(f"{metric}_count{{{label}}} {_format_number(cumulative)}")
+
+    lines += [f"# HELP {ERRORS_METRIC} Instrumented calls that raised an exception.",
+              f"# TYPE {ERRORS_METRIC} counter"]
+    for endpoint in endpoints:
+        errors = totals.get((ERRORS_METRIC, endpoint, ""), 0)
+        lines.append(f'{ERRORS_METRIC}{{endpoint="{_escape_label(endpoint)}"}} {_format_number(errors)}')
+
+    shed = sorted((endpoint, value) for (metric, endpoint, _part), value in totals.items() if metric == SHED_METRIC)
+    lines += [f"# HELP {SHED_METRIC} Requests rejected by the rate limiter with HTTP 429.",
+              f"# TYPE {SHED_METRIC} counter"]
+    for endpoint, value in shed:
+        lines.append(f'{SHED_METRIC}{{endpoint="{_escape_label(endpoint)}"}} {_format_number(value)}')
+
+    return "\n".join(lines) + "\n"
+
+
+def has_export_access(token: str | None = None) -> bool:
+    """Доступ до метрик: System Manager або токен зі site_config (qms_metrics_token)."""
+    expected = frappe.conf.get("qms_metrics_token")
+    supplied = token
+    if not supplied and frappe.request:
+        supplied = frappe.get_request_header("X-Metrics-Token")
+    if expected and supplied and secrets.compare_digest(str(supplied), str(expected)):
+        return True
+    return "System Manager" in frappe.get_roles()
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(round(value, 6))
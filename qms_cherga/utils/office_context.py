@@ -0,0 +1,137 @@
+from typing import NamedTuple
+
+import frappe
+from frappe.utils import get_system_timezone, now_datetime
+
+from qms_cherga.qms_cherga.doctype.qms_schedule.qms_schedule import (
+    get_compiled_schedule,
+    is_open_at,
+    resolve_timezone,
+)
+
+# Контекст офісу для API: поля офісу, ефективний графік (власний або організації)
+# та tzinfo. Запам'ятовується на запит (frappe.local) і на процес; актуальність
+# процесного кешу перевіряється версією офісу в Redis, яку змінюють QMS Office
+# та QMS Organization при збереженні. Перевірка версії - один HGET на запит.
+VERSION_CACHE_KEY = "qms_office_context_version"
+
+# {(site, office): (version, OfficeContext)}
+_process_cache = {}
+
+
+class OfficeContext(NamedTuple):
+    name: str
+    office_name: str
+    organization: str | None
+    organization_name: str | None
+    timezone: str | None
+    tz: object
+    schedule: str | None
+    address: str | None
+    contact_phone: str | None
+    display_message_text: str | None
+
+    def now_local(self):
+        # now_datetime() - наївний час у системній зоні сайту, а не в зоні процесу
+        return now_datetime().replace(tzinfo=resolve_timezone(get_system_timezone())).astimezone(self.tz)
+
+    def compiled_schedule(self) -> dict | None:
+        return get_compiled_schedule(self.schedule) if self.schedule else None
+
+    def is_open(self, local_dt=None) -> bool:
+        if not self.schedule:
+            return False
+        return is_open_at(self.compiled_schedule(), local_dt or self.now_local())
+
+
+def get_office_context(office: str) -> OfficeContext | None:
+    """Контекст офісу або None, якщо офісу не існує."""
+    if not office:
+        return None
+
+    memo = _request_memo()
+    if office in memo:
+        return memo[office]
+
+    version = _get_version(office)
+    key = (frappe.local.site, office)
+    cached = _process_cache.get(key)
+    if cached and cached[0] == version:
+        context = cached[1]
+    else:
+        context = build_office_context(office)
+        if context:
+            _process_cache[key] = (version, context)
+
+    memo[office] = context
+    return context
+
+
+def build_office_context(office: str) -> OfficeContext | None:
+    data = frappe.db.get_value(
+        "QMS Office", office,
+        ["name", "office_name", "organization", "timezone", "schedule", "address", "contact_phone",
+         "display_message_text"],
+        as_dict=True,
+    )
+    if not data:
+        return None
+
+    organization = frappe.db.get_value(
+        "QMS Organization", data.organization, ["organization_name", "default_schedule"], as_dict=True
+    ) if data.organization else None
+    organization = organization or frappe._dict()
+
+    return OfficeContext(
+        name=data.name,
+        office_name=data.office_name,
+        organization=data.organization,
+        organization_name=organization.organization_name,
+        timezone=data.timezone,
+        tz=resolve_timezone(data.timezone),
+        schedule=data.schedule or organization.default_schedule,
+        address=data.address,
+        contact_phone=data.contact_phone,
+        display_message_text=data.display_message_text,
+    )
+
+
+def invalidate(office: str):
+    """
+    Нова версія офісу зараз і ще раз після коміту: інший воркер міг перебудувати
+    контекст зі старих рядків і запам'ятати його під версією, виданою до коміту.
+    """
+    if not office:
+        return
+
+    def _invalidate():
+        frappe.cache().hset(VERSION_CACHE_KEY, office, frappe.generate_hash(length=12))
+        _request_memo().pop(office, None)
+
+    _invalidate()
+    frappe.db.after_commit.add(_invalidate)
+
+
+def invalidate_all():
+    """Зміна організації (назва, графік за замовчуванням) зачіпає всі її офіси."""
+
+    def _invalidate():
+        frappe.cache().delete_value(VERSION_CACHE_KEY)
+        _request_memo().clear()
+
+    _invalidate()
+    frappe.db.after_commit.add(_invalidate)
+
+
+def _get_version(office: str) -> str:
+    version = frappe.cache().hget(VERSION_CACHE_KEY, office)
+    if not version:
+        version = frappe.generate_hash(length=12)
+        frappe.cache().hset(VERSION_CACHE_KEY, office, version)
+    return version
+
+
+def _request_memo() -> dict:
+    if not hasattr(frappe.local, "qms_office_context"):
+        frappe.local.qms_office_context = {}
+    return frappe.local.qms_office_context
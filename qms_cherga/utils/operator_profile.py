@@ -0,0 +1,88 @@
+import time
+
+import frappe
+
+from qms_cherga.utils.cache import get_int, incr
+
+# Профіль активного оператора за користувачем: навички, офіс та точки обслуговування
+# офісу. Гарячий шлях оператора (виклик наступного, панель) читає профіль з кешу
+# без запитів до БД. Кеш скидається повністю при зміні будь-якого оператора, точки
+# обслуговування чи офісу - це рідкісні адміністративні зміни; повторно - після коміту.
+PROFILE_CACHE_KEY = "qms_operator_profile"
+# Відсутність оператора кешується ненадовго: новий оператор не чекатиме наступної зміни
+NEGATIVE_TTL_SEC = 60
+HITS_KEY = "qms_operator_profile:hits"
+MISSES_KEY = "qms_operator_profile:misses"
+
+
+def get_profile(user: str) -> dict | None:
+    """
+    {"name", "full_name", "user", "office", "office_name", "skills": [...],
+     "service_points": [{"name", "point_name"}, ...]}; None - активного оператора немає.
+    """
+    profile = frappe.cache().hget(PROFILE_CACHE_KEY, user)
+    if profile is not None and not _is_expired_miss(profile):
+        incr(HITS_KEY)
+        return None if "missing_since" in profile else profile
+
+    incr(MISSES_KEY)
+    # Відсутність оператора теж кешується (на NEGATIVE_TTL_SEC), щоб не питати БД щоразу
+    profile = build_profile(user)
+    frappe.cache().hset(PROFILE_CACHE_KEY, user, profile or {"missing_since": time.time()})
+    return profile
+
+
+def _is_expired_miss(profile: dict) -> bool:
+    return "missing_since" in profile and time.time() - profile["missing_since"] >= NEGATIVE_TTL_SEC
+
+
+def build_profile(user: str) -> dict | None:
+    operator = frappe.db.get_value(
+        "QMS Operator", {"user": user, "is_active": 1}, ["name", "full_name", "user", "default_office"], as_dict=True
+    )
+    if not operator:
+        return None
+
+    skills = frappe.get_all(
+        "QMS Operator Skill",
+        filters={"parent": operator.name, "parenttype": "QMS Operator"},
+        pluck="service",
+        order_by="idx asc",
+    )
+    office = operator.default_office
+    service_points = frappe.get_all(
+        "QMS Service Point",
+        filters={"office": office, "is_active": 1},
+        fields=["name", "point_name"],
+        order_by="point_name",
+    ) if office else []
+
+    return {
+        "name": operator.name,
+        "full_name": operator.full_name,
+        "user": operator.user,
+        "office": office,
+        "office_name": frappe.db.get_value("QMS Office", office, "office_name") if office else None,
+        "skills": skills,
+        "service_points": [dict(point) for point in service_points],
+    }
+
+
+def find_service_point(profile: dict, service_point: str) -> dict | None:
+    return next((point for point in profile["service_points"] if point["name"] == service_point), None)
+
+
+def clear_cache():
+    """Скидає кеш зараз і після коміту: профіль, зібраний до коміту, був би застарілим."""
+
+    def _clear():
+        frappe.cache().delete_value(PROFILE_CACHE_KEY)
+
+    _clear()
+    frappe.db.after_commit.add(_clear)
+
+
+def get_cache_stats() -> dict:
+    hits, misses = get_int(HITS_KEY), get_int(MISSES_KEY)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else None}
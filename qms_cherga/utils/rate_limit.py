@@ -0,0 +1,147 @@
+import functools
+
+import frappe
+from frappe.utils import cint, flt
+
+from qms_cherga.utils import metrics
+from qms_cherga.utils.response import rate_limited_response
+
+# Token bucket у Redis для гостьових ендпоінтів (кіоски, табло). Кожен клієнт має
+# відро на `capacity` запитів, що поповнюється зі швидкістю `rate` запитів/с.
+# Порожнє відро - відповідь 429 до будь-якої роботи з БД і без запису в Error Log.
+#
+# Ключ клієнта ("key"):
+#   ip     - frappe.local.request_ip
+#   kiosk  - заголовок X-Kiosk-ID (кіоск задає його сам), інакше IP
+#   office - офіс із параметрів запиту: спільне відро для всіх клієнтів офісу
+#   board  - board_id табло з параметрів запиту, інакше IP
+#
+# kiosk і board задає сам клієнт, тож для них діє ще й зовнішнє відро на IP
+# з місткістю та швидкістю в "ip_factor" разів більшими (кілька кіосків за одним
+# NAT): нові ідентифікатори на кожен запит не дають обійти обмеження.
+#
+# Перевизначення в site_config.json (capacity 0 вимикає обмеження ендпоінта):
+#   "qms_rate_limits": {"get_display_data": {"capacity": 60, "rate": 20, "key": "office"}}
+DEFAULT_LIMITS = {
+    "create_appointment_ticket": {"capacity": 5, "rate": 0.1, "key": "ip"},
+    "create_live_queue_ticket": {"capacity": 10, "rate": 0.5, "key": "kiosk"},
+    "get_kiosk_bootstrap": {"capacity": 10, "rate": 0.2, "key": "kiosk"},
+    "get_kiosk_services": {"capacity": 10, "rate": 0.2, "key": "kiosk"},
+    "get_ticket_escpos": {"capacity": 10, "rate": 0.5, "key": "kiosk"},
+    "get_display_data": {"capacity": 30, "rate": 5, "key": "ip"},
+    "ping_display_board": {"capacity": 5, "rate": 0.2, "key": "board"},
+    "display_board_heartbeat": {"capacity": 5, "rate": 0.2, "key": "board"},
+}
+CLIENT_CHOSEN_KEYS = ("kiosk", "board")
+DEFAULT_IP_FACTOR = 10
+KIOSK_HEADER = "X-Kiosk-ID"
+OFFICE_ARGS = ("office", "office_id")
+
+# Атомарне поповнення та списання; час - з годинника Redis, однаковий для всіх воркерів
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, retry_after}
+"""
+
+_script = None
+
+
+def rate_limited(endpoint: str | None = None):
+    """
+    Декоратор для allow_guest-функцій api.py: ставиться під @instrumented, тож
+    відкинуті запити видно і в метриках виклику, і в qms_requests_shed_total.
+    Обмежуються лише гостьові HTTP-запити; виклики з коду та користувачі з сесією - ні.
+    """
+
+    def decorator(fn):
+        name = endpoint or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if frappe.request and frappe.session.user == "Guest":
+                retry_after = check(name, kwargs)
+                if retry_after:
+                    metrics.record_shed(name)
+                    return rate_limited_response(retry_after)
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_limit(endpoint: str) -> dict | None:
+    limit = {**DEFAULT_LIMITS.get(endpoint, {}), **((frappe.conf.get("qms_rate_limits") or {}).get(endpoint) or {})}
+    if cint(limit.get("capacity")) <= 0 or flt(limit.get("rate")) <= 0:
+        return None
+    return limit
+
+
+def get_client_key(kind: str, kwargs: dict) -> str:
+    if kind == "office":
+        office = next((kwargs[arg] for arg in OFFICE_ARGS if kwargs.get(arg)), None)
+        if office:
+            return f"office:{office}"
+    elif kind == "board":
+        board = kwargs.get("board_id")
+        if board:
+            return f"board:{str(board)[:64]}"
+    elif kind == "kiosk":
+        kiosk = frappe.get_request_header(KIOSK_HEADER)
+        if kiosk:
+            return f"kiosk:{kiosk[:64]}"
+    return f"ip:{_request_ip()}"
+
+
+def _request_ip() -> str | None:
+    return getattr(frappe.local, "request_ip", None)
+
+
+def check(endpoint: str, kwargs: dict | None = None, client_key: str | None = None) -> int:
+    """Списує токен клієнта; 0 - запит дозволено, інакше - секунд до наступного токена."""
+    limit = get_limit(endpoint)
+    if not limit:
+        return 0
+    kind = limit.get("key", "ip")
+    client_key = client_key or get_client_key(kind, kwargs or {})
+    buckets = [(client_key, limit["capacity"], limit["rate"])]
+    ip = _request_ip()
+    if kind in CLIENT_CHOSEN_KEYS and ip and client_key != f"ip:{ip}":
+        factor = flt(limit.get("ip_factor") or DEFAULT_IP_FACTOR)
+        buckets.insert(0, (f"ip:{ip}", cint(limit["capacity"] * factor), flt(limit["rate"]) * factor))
+
+    try:
+        for key, capacity, rate in buckets:
+            allowed, retry_after = consume(f"qms_rate_limit:{endpoint}:{key}", capacity, rate)
+            if not allowed:
+                return max(cint(retry_after), 1)
+    except Exception:
+        # Недоступний Redis не повинен зупиняти кіоски: пропускаємо запит
+        frappe.logger("qms_rate_limit").warning(f"Rate limit check failed for {endpoint}", exc_info=True)
+    return 0
+
+
+def consume(key: str, capacity: int, rate: float) -> tuple:
+    global _script
+    cache = frappe.cache()
+    if _script is None:
+        _script = cache.register_script(TOKEN_BUCKET_SCRIPT)
+    allowed, retry_after = _script(keys=[cache.make_key(key)], args=[cint(capacity), flt(rate)], client=cache)
+    return int(allowed), int(retry_after)
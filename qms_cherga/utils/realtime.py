@@ -0,0 +1,37 @@
+import frappe
+
+from qms_cherga.utils import cache
+
+
+def office_room(office_id: str):
+    """
+    Генерує ім'я кімнати для WebSocket на основі ID офісу.
+    Клієнти приєднуються до неї через подію 'join_room' (realtime/handlers.js).
+    """
+    return f'qms_office:{office_id}'
+
+
+def _sequence_key(office_id: str) -> str:
+    return f"qms_office_seq:{office_id}"
+
+
+def current_sequence(office_id: str) -> int:
+    """Номер останньої події, опублікованої в кімнату офісу (0, якщо подій ще не було)."""
+    return cache.get_int(_sequence_key(office_id))
+
+
+def publish_office_event(office_id: str, event: str, message: dict, after_commit: bool = True):
+    """
+    Публікує подію лише в кімнату офісу. Кожне повідомлення отримує `seq` -
+    монотонно зростаючий номер у межах офісу, тож клієнт бачить пропуски
+    та перезавантажує дані лише тоді, коли щось пропустив.
+    Номер призначається після коміту, тож відкочені транзакції не створюють пропусків.
+    """
+    def _publish():
+        payload = dict(message, seq=cache.incr(_sequence_key(office_id)))
+        frappe.publish_realtime(event=event, message=payload, room=office_room(office_id))
+
+    if after_commit:
+        frappe.db.after_commit.add(_publish)
+    else:
+        _publish()
@@ -39,3 +39,17 @@ def error_response(message, error_code=None, details=None, http_status_code=400)
 def info_response(message, data=None):
     """Повертає стандартну інформаційну відповідь (HTTP 200)."""
     return _build_response("info", message=message, data=data, http_status_code=200)
+
+
+def rate_limited_response(retry_after_sec: int):
+    """
+    Відповідь 429 для відкинутого запиту (utils/rate_limit.py). Без Error Log та
+    перекладу повідомлення: вона має бути дешевшою за сам запит.
+    """
+    frappe.response.status_code = 429
+    return {
+        "status": "error",
+        "message": "Too many requests. Please retry later.",
+        "error_code": "RATE_LIMITED",
+        "data": {"retry_after_sec": retry_after_sec},
+    }
@@ -0,0 +1,81 @@
+from bisect import bisect_left
+from datetime import timedelta
+
+from qms_cherga.qms_cherga.doctype.qms_schedule.qms_schedule import get_intervals_for_date
+
+# Рушій слотів попереднього запису. Слот - ціле число хвилин від початку доби
+# (у часовій зоні офісу); сітка дня будується через range(), без datetime в циклі.
+MAX_RANGE_DAYS = 60
+MINUTES_PER_DAY = 24 * 60
+
+# Готові підписи "HH:MM" для кожної хвилини доби
+_MINUTE_LABELS = tuple(f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(MINUTES_PER_DAY))
+
+
+def day_grid(intervals, duration_mins: int) -> list:
+    """
+    Початки слотів (хвилини) для робочих інтервалів дня у секундах.
+    Слот має повністю вміщатися в інтервал.
+    """
+    grid = []
+    for start_sec, end_sec in intervals:
+        start = -(-start_sec // 60)  # округлення вгору до хвилини
+        grid.extend(range(start, end_sec // 60 - duration_mins + 1, duration_mins))
+    return grid
+
+
+def minute_of_day(local_dt) -> int:
+    return local_dt.hour * 60 + local_dt.minute
+
+
+def build_availability(compiled: dict, start_date, days: int, duration_mins: int,
+                       booked: dict, now_local) -> list:
+    """
+    Доступність на `days` днів, починаючи з `start_date`.
+
+    :param compiled: скомпільований графік (див. qms_schedule.get_compiled_schedule).
+    :param booked: {"YYYY-MM-DD": {хвилина, ...}} - зайняті слоти в зоні офісу.
+    :param now_local: поточний час у зоні офісу; слоти, що вже почались, недоступні.
+    :return: [{"date": "YYYY-MM-DD", "status": "open" | "closed" | "past", "slots": [хвилина, ...]}]
+    """
+    today = now_local.date()
+    # Перший слот сьогодні - не раніше поточної (неповної) хвилини
+    now_minute = minute_of_day(now_local) + (1 if now_local.second or now_local.microsecond else 0)
+    grids = {}
+    availability = []
+
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        date_str = day.isoformat()
+        if day < today:
+            availability.append({"date": date_str, "status": "past", "slots": []})
+            continue
+
+        intervals = get_intervals_for_date(compiled, day)
+        if not intervals:
+            availability.append({"date": date_str, "status": "closed", "slots": []})
+            continue
+
+        # Однакові інтервали (типовий тиждень) дають однакову сітку
+        grid_key = tuple(intervals)
+        grid = grids.get(grid_key)
+        if grid is None:
+            grid = grids[grid_key] = day_grid(intervals, duration_mins)
+
+        slots = grid
+        if day == today:
+            slots = slots[bisect_left(slots, now_minute):]
+        taken = booked.get(date_str)
+        if taken:
+            slots = [minute for minute in slots if minute not in taken]
+        availability.append({"date": date_str, "status": "open", "slots": slots})
+
+    return availability
+
+
+def format_slots(date_str: str, slots: list) -> list:
+    """Хвилини -> [{"time": "HH:MM", "datetime": "YYYY-MM-DD HH:MM:SS"}] для API."""
+    return [
+        {"time": _MINUTE_LABELS[minute], "datetime": f"{date_str} {_MINUTE_LABELS[minute]}:00"}
+        for minute in slots
+    ]
@@ -0,0 +1,99 @@
+import frappe
+from frappe.utils import format_date, format_time
+
+from qms_cherga.utils import live_queue
+from qms_cherga.utils.office_context import get_office_context
+
+# Друк талону без запитів до БД: офіс та організація - з контексту офісу,
+# назва послуги - денормалізоване поле талону, черга перед відвідувачем - ZRANK у Redis.
+# Той самий контекст використовують Jinja-формат "QMS Ticket Thermal" (hooks.py, jinja)
+# та сирий ESC/POS-рендер для термопринтерів кіоску.
+
+# ESC/POS (Epson-сумісні принтери, 80 мм, шрифт A)
+ESCPOS_LINE_WIDTH = 48
+# Кодова сторінка з українськими літерами: ESC t 46 - WPC1251
+ESCPOS_CODEPAGE = 46
+ESCPOS_ENCODING = "cp1251"
+
+ESC = b"\x1b"
+GS = b"\x1d"
+ESCPOS_INIT = ESC + b"@"
+ESCPOS_ALIGN_CENTER = ESC + b"a\x01"
+ESCPOS_BOLD_ON = ESC + b"E\x01"
+ESCPOS_BOLD_OFF = ESC + b"E\x00"
+ESCPOS_CUT = GS + b"V\x42\x03"  # подача на 3 рядки та часткове відрізання
+
+
+def get_ticket_print_context(ticket) -> dict:
+    """
+    Усе, що потрібно для друку талону, одним словником. `ticket` - документ
+    QMS Ticket або його ім'я.
+    """
+    if isinstance(ticket, str):
+        ticket = frappe.get_doc("QMS Ticket", ticket)
+
+    office = get_office_context(ticket.office)
+
+    number = ticket.ticket_number or ""
+    issued = ticket.issue_time or ticket.creation
+    people_ahead = None
+    if ticket.status == "Waiting" and ticket.service:
+        people_ahead = live_queue.queue_position(ticket.office, ticket.service, ticket.name)
+
+    return {
+        "org_name": office.organization_name or "",
+        "office_name": office.office_name or ticket.office,
+        "address": office.address or "",
+        "display_number": number.split("-")[-1] if "-" in number else number,
+        "service_name": ticket.service_name or ticket.service,
+        "date": format_date(issued, "dd.MM.yyyy"),
+        "time": format_time(issued, "HH:mm:ss"),
+        "people_ahead": people_ahead,
+        "estimated_wait_time_mins": ticket.estimated_wait_time_mins or 0,
+    }
+
+
+def render_escpos(context: dict) -> bytes:
+    """Сирий потік ESC/POS для термопринтера: без HTML, PDF та шрифтів браузера."""
+    out = bytearray(ESCPOS_INIT)
+    out += ESC + b"t" + bytes([ESCPOS_CODEPAGE])
+    out += ESCPOS_ALIGN_CENTER
+
+    def line(text="", size=0, bold=False):
+        nonlocal out
+        out += GS + b"!" + bytes([size])
+        if bold:
+            out += ESCPOS_BOLD_ON
+        out += text.encode(ESCPOS_ENCODING, errors="replace") + b"\n"
+        if bold:
+            out += ESCPOS_BOLD_OFF
+
+    if context["org_name"]:
+        line(context["org_name"], bold=True)
+    line(context["office_name"], bold=True)
+    if context["address"]:
+        line(context["address"])
+    line("-" * ESCPOS_LINE_WIDTH)
+
+    line("ВАШ НОМЕР:", bold=True)
+    # GS ! 0x33 - учетверена ширина та висота
+    line(context["display_number"] or "???", size=0x33, bold=True)
+    line(context["service_name"], size=0x01, bold=True)
+    line()
+    line(f"Дата: {context['date']}")
+    line(f"Час: {context['time']}")
+
+    if context["people_ahead"] is not None:
+        line(f"Осіб у черзі перед вами: {context['people_ahead']}")
+    if context["estimated_wait_time_mins"] > 0:
+        line(f"Орієнтовний час очікування: ~{context['estimated_wait_time_mins']} хв")
+
+    line("-" * ESCPOS_LINE_WIDTH)
+    line("Будь ласка, очікуйте на виклик.")
+    line("Слідкуйте за інформацією на табло.")
+    out += ESCPOS_CUT
+    return bytes(out)
+
+
+def render_ticket_escpos(ticket) -> bytes:
+    return render_escpos(get_ticket_print_context(ticket))
@@ -0,0 +1,193 @@
+import math
+
+import frappe
+from frappe.utils import add_days, cint, flt, get_datetime, getdate, time_diff_in_seconds
+
+from qms_cherga.qms_cherga.doctype.qms_slot_reservation.qms_slot_reservation import get_slot_capacity
+from qms_cherga.qms_cherga.doctype.qms_ticket_archive.qms_ticket_archive import history_table
+from qms_cherga.utils import live_queue
+
+# Оцінка часу очікування: черга перед відвідувачем * EWMA тривалості обслуговування
+# послуги / кількість операторів на зміні з навичкою. Усі три величини беруться
+# з кешованого стану (Redis), тож оцінка - O(1) і без запитів до БД на гарячому шляху.
+#
+# Оператор на зміні - активний оператор з навичкою, закріплений за активною точкою
+# обслуговування офісу (QMS Service Point.assigned_operator). Офіси без закріплених
+# точок рахують усіх активних операторів з навичкою (місткість слоту).
+EWMA_ALPHA = 0.2
+EWMA_CACHE_KEY = "qms_service_ewma_mins"
+ON_SHIFT_CACHE_KEY = "qms_on_shift_operators"
+DEFAULT_SERVICE_MINS = 15
+
+
+def ewma(previous, value: float, alpha: float = EWMA_ALPHA) -> float:
+    return value if previous is None else alpha * value + (1 - alpha) * previous
+
+
+def predict_wait_mins(ahead: int, service_mins: float, operators: int) -> int:
+    """Хвилини до виклику: усі, хто попереду, обслуговуються паралельно `operators` вікнами."""
+    if ahead <= 0:
+        return 0
+    return math.ceil(ahead * service_mins / max(operators, 1))
+
+
+def _ewma_field(office: str, service: str) -> str:
+    return f"{office}::{service}"
+
+
+def get_service_mins(office: str, service: str) -> float:
+    """EWMA тривалості обслуговування; до першого завершеного талону - avg_duration_mins послуги."""
+    value = frappe.cache().hget(EWMA_CACHE_KEY, _ewma_field(office, service))
+    if value is not None:
+        return flt(value)
+    return cint(frappe.get_cached_value("QMS Service", service, "avg_duration_mins")) or DEFAULT_SERVICE_MINS
+
+
+def record_service_time(office: str, service: str, minutes: float):
+    """Оновлює EWMA після завершення обслуговування (викликається після коміту)."""
+    field = _ewma_field(office, service)
+    previous = frappe.cache().hget(EWMA_CACHE_KEY, field)
+    frappe.cache().hset(EWMA_CACHE_KEY, field, ewma(None if previous is None else flt(previous), minutes))
+
+
+def get_on_shift_operators(office: str, service: str) -> int:
+    """Кешована кількість операторів на зміні з навичкою для послуги."""
+    count = frappe.cache().hget(
+        ON_SHIFT_CACHE_KEY, _ewma_field(office, service), generator=lambda: _count_on_shift_operators(office, service)
+    )
+    return cint(count) or get_slot_capacity(office, service)
+
+
+def _count_on_shift_operators(office: str, service: str) -> int:
+    return int(
+        frappe.db.sql(
+            """
+            SELECT COUNT(DISTINCT operator.name)
+            FROM `tabQMS Service Point` point
+            JOIN `tabQMS Operator` operator ON operator.user = point.assigned_operator
+            JOIN `tabQMS Operator Skill` skill
+                ON skill.parent = operator.name AND skill.parenttype = 'QMS Operator'
+            WHERE point.office = %(office)s
+                AND point.is_active = 1
+                AND operator.is_active = 1
+                AND skill.service = %(service)s
+            """,
+            {"office": office, "service": service},
+        )[0][0]
+    )
+
+
+def clear_operator_cache():
+    """Скидає кеш операторів на зміні зараз і після коміту (зміни операторів чи точок)."""
+
+    def _clear():
+        frappe.cache().delete_value(ON_SHIFT_CACHE_KEY)
+
+    _clear()
+    frappe.db.after_commit.add(_clear)
+
+
+def estimate_wait(office: str, service: str) -> dict:
+    """
+    Оцінка для нового талону: {"people_ahead", "estimated_wait_time_mins"}.
+    Черга - ZCARD Redis-черги послуги, оператори - кешована кількість операторів на зміні.
+    """
+    ahead = live_queue.queue_length(office, service)
+    minutes = predict_wait_mins(ahead, get_service_mins(office, service), get_on_shift_operators(office, service))
+    return {"people_ahead": ahead, "estimated_wait_time_mins": minutes}
+
+
+# --- Офлайн-оцінка точності ---
+# bench --site <site> execute qms_cherga.utils.wait_predictor.evaluate --kwargs "{'from_date': '2025-04-01'}"
+
+# Порядок подій з однаковою міткою часу: завершення оновлює EWMA до прогнозу,
+# а талон, виданий і викликаний одночасно, спершу потрапляє в чергу
+_EVENT_ORDER = {"complete": 0, "issue": 1, "call": 2}
+
+
+def evaluate(from_date: str, to_date: str | None = None, office: str | None = None,
+             alpha: float = EWMA_ALPHA) -> dict:
+    """
+    Прогоняє історичні талони через той самий предиктор, що й видача талону,
+    і порівнює прогноз з фактичним actual_wait_time_mins.
+    """
+    # Гарячі та архівні талони разом (подання qms_ticket_history)
+    history = history_table()
+    query = (
+        frappe.qb.from_(history)
+        .select(history.office, history.service, history.operator, history.issue_time, history.call_time,
+                history.start_service_time, history.completion_time)
+        .where((history.issue_time >= get_datetime(from_date)) & history.call_time.isnotnull())
+        .orderby(history.issue_time)
+    )
+    if to_date:
+        # Дата без часу - включно з усім днем, як "between" у frappe.get_all
+        if len(str(to_date)) <= 10:
+            query = query.where(history.issue_time < get_datetime(add_days(to_date, 1)))
+        else:
+            query = query.where(history.issue_time <= get_datetime(to_date))
+    if office:
+        query = query.where(history.office == office)
+
+    tickets = query.run(as_dict=True)
+    defaults = dict(frappe.get_all("QMS Service", fields=["name", "avg_duration_mins"], as_list=True))
+    return replay(tickets, defaults, alpha)
+
+
+def replay(tickets: list, default_mins: dict | None = None, alpha: float = EWMA_ALPHA) -> dict:
+    """
+    Хронологічне відтворення черги: видача - прогноз і +1 до черги, виклик - -1,
+    завершення - оновлення EWMA. Кількість вікон - різні оператори, що обслуговували
+    послугу в офісі цього дня (наближення активних операторів з навичкою).
+    """
+    default_mins = default_mins or {}
+    operators = {}
+    events = []
+    for ticket in tickets:
+        key = (ticket["office"], ticket["service"])
+        issued = get_datetime(ticket["issue_time"])
+        if ticket.get("operator"):
+            operators.setdefault((*key, getdate(issued)), set()).add(ticket["operator"])
+        events.append((issued, _EVENT_ORDER["issue"], "issue", ticket))
+        if ticket.get("call_time"):
+            events.append((get_datetime(ticket["call_time"]), _EVENT_ORDER["call"], "call", ticket))
+        if ticket.get("completion_time"):
+            events.append((get_datetime(ticket["completion_time"]), _EVENT_ORDER["complete"], "complete", ticket))
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    queues, averages, errors = {}, {}, []
+    for moment, _order, kind, ticket in events:
+        key = (ticket["office"], ticket["service"])
+        if kind == "issue":
+            if ticket.get("call_time"):
+                service_mins = averages.get(key) or cint(default_mins.get(ticket["service"])) or DEFAULT_SERVICE_MINS
+                windows = len(operators.get((*key, getdate(moment)), ()))
+                predicted = predict_wait_mins(queues.get(key, 0), service_mins, windows)
+                actual = time_diff_in_seconds(ticket["call_time"], ticket["issue_time"]) / 60
+                errors.append(predicted - actual)
+            queues[key] = queues.get(key, 0) + 1
+        elif kind == "call":
+            queues[key] = max(queues.get(key, 0) - 1, 0)
+        else:
+            started = ticket.get("start_service_time") or ticket.get("call_time")
+            if started:
+                minutes = max(time_diff_in_seconds(ticket["completion_time"], started) / 60, 0)
+                averages[key] = ewma(averages.get(key), minutes, alpha)
+
+    return summarize_errors(errors)
+
+
+def summarize_errors(errors: list) -> dict:
+    """MAE, RMSE, зсув (прогноз - факт) та 90-й перцентиль абсолютної похибки, хвилини."""
+    if not errors:
+        return {"n": 0, "mae": None, "rmse": None, "bias": None, "p90_abs": None}
+
+    absolute = sorted(abs(error) for error in errors)
+    n = len(errors)
+    return {
+        "n": n,
+        "mae": round(sum(absolute) / n, 2),
+        "rmse": round(math.sqrt(sum(error * error for error in errors) / n), 2),
+        "bias": round(sum(errors) / n, 2),
+        "p90_abs": round(absolute[min(math.ceil(0.9 * n) - 1, n - 1)], 2),
+    }